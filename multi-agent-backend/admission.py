@@ -0,0 +1,181 @@
+"""
+Admission control in front of the model.
+
+Two independent guards:
+
+- RateLimiter: a token bucket per user_id; requests beyond the rate are
+  rejected with 429 before any work is done.
+- AdmissionController: caps concurrent model calls. Requests over the cap
+  wait in a bounded FIFO queue; when the queue is full, or a request has
+  waited longer than max_wait, it is rejected with 503.
+
+Both raise AdmissionRejected carrying the HTTP status and a Retry-After hint.
+
+Both are per process. With SESSION_BACKEND=sqlite (several gunicorn workers)
+the rate limiter is sqlite_sessions.SQLiteRateLimiter instead, whose buckets
+are shared by every worker; the model-call cap stays per worker, since it
+protects that worker's threads and connections.
+"""
+
+import collections
+import logging
+import os
+import threading
+import time
+from typing import Any, Deque, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """Request refused by admission control"""
+
+    def __init__(self, reason: str, status: int, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.status = status
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    """Per-key token buckets: `rate` tokens per second, up to `burst` saved"""
+
+    def __init__(self, rate: float, burst: float, idle_prune_seconds: float = 600.0):
+        self.rate = rate
+        self.burst = burst
+        self.idle_prune_seconds = idle_prune_seconds
+        self._buckets: Dict[str, list] = {}
+        self._lock = threading.Lock()
+        self._last_prune = time.monotonic()
+        self.rejected = 0
+
+    def check(self, key: str):
+        """Take one token for key or raise AdmissionRejected (429)"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [self.burst, now]
+            tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if tokens < 1.0:
+                bucket[0] = tokens
+                self.rejected += 1
+                raise AdmissionRejected("rate_limited", 429, (1.0 - tokens) / self.rate)
+            bucket[0] = tokens - 1.0
+
+            if now - self._last_prune > self.idle_prune_seconds:
+                # A bucket idle this long has refilled; dropping it loses nothing
+                cutoff = now - self.idle_prune_seconds
+                self._buckets = {k: b for k, b in self._buckets.items() if b[1] > cutoff}
+                self._last_prune = now
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rate_per_minute": round(self.rate * 60, 2),
+            "burst": self.burst,
+            "tracked_users": len(self._buckets),
+            "rejected": self.rejected
+        }
+
+
+class Slot:
+    """A granted model-call slot; release() is idempotent"""
+
+    def __init__(self, controller: "AdmissionController"):
+        self._controller = controller
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._controller._release()
+
+    def __enter__(self) -> "Slot":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+class AdmissionController:
+    """Concurrency limit for model calls with a bounded FIFO wait queue"""
+
+    def __init__(self, max_concurrent: int = 16, max_queue: int = 64, max_wait: float = 10.0):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._queue: Deque[object] = collections.deque()
+        self._recent_waits: Deque[float] = collections.deque(maxlen=1000)
+        self.counters = {"admitted": 0, "queued": 0, "rejected_queue_full": 0, "rejected_timeout": 0}
+
+    def acquire(self) -> Slot:
+        """Wait for a free slot in FIFO order or raise AdmissionRejected (503)"""
+        start = time.monotonic()
+        with self._cond:
+            if self._in_flight < self.max_concurrent and not self._queue:
+                return self._grant(start)
+
+            if len(self._queue) >= self.max_queue:
+                self.counters["rejected_queue_full"] += 1
+                raise AdmissionRejected("queue_full", 503, self.max_wait)
+
+            ticket = object()
+            self._queue.append(ticket)
+            self.counters["queued"] += 1
+            deadline = start + self.max_wait
+            try:
+                while not (self._queue[0] is ticket and self._in_flight < self.max_concurrent):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.counters["rejected_timeout"] += 1
+                        raise AdmissionRejected("queue_timeout", 503, self.max_wait)
+                    self._cond.wait(remaining)
+            finally:
+                self._queue.remove(ticket)
+                # The new head may be able to run now
+                self._cond.notify_all()
+            return self._grant(start)
+
+    def _grant(self, start: float) -> Slot:
+        self._in_flight += 1
+        self.counters["admitted"] += 1
+        self._recent_waits.append(time.monotonic() - start)
+        return Slot(self)
+
+    def _release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            waits = sorted(self._recent_waits)
+            return {
+                "in_flight": self._in_flight,
+                "max_concurrent": self.max_concurrent,
+                "queue_depth": len(self._queue),
+                "max_queue": self.max_queue,
+                "wait_ms_avg": round(1000 * sum(waits) / len(waits), 2) if waits else 0.0,
+                "wait_ms_p95": round(1000 * waits[int(len(waits) * 0.95) - 1], 2) if len(waits) >= 20 else None,
+                **self.counters
+            }
+
+
+def from_env():
+    """(RateLimiter, AdmissionController) configured from the environment"""
+    rate = float(os.getenv("USER_RATE_PER_MINUTE", "20")) / 60.0
+    burst = float(os.getenv("USER_RATE_BURST", "5"))
+    if os.getenv("SESSION_BACKEND", "memory").lower() == "sqlite":
+        from sqlite_sessions import SQLiteRateLimiter, get_database
+        limiter = SQLiteRateLimiter(get_database(), rate=rate, burst=burst)
+    else:
+        limiter = RateLimiter(rate=rate, burst=burst)
+    controller = AdmissionController(
+        max_concurrent=int(os.getenv("MAX_CONCURRENT_MODEL_CALLS", "16")),
+        max_queue=int(os.getenv("MODEL_QUEUE_SIZE", "64")),
+        max_wait=float(os.getenv("MODEL_QUEUE_MAX_WAIT", "10"))
+    )
+    return limiter, controller
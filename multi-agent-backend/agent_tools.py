@@ -0,0 +1,115 @@
+"""
+Function tools exposed to the support agent.
+
+Kept separate from main so offline jobs (see triage.py) can use the knowledge
+base search in worker processes without building the agent, runner and
+async runtime.
+"""
+
+import asyncio
+import json
+
+from google.adk.tools.tool_context import ToolContext
+
+from escalation import EscalationDispatcher
+from knowledge_base import KnowledgeBase
+from vector_index import VectorIndex
+
+
+class SimplifiedAgentTools:
+    """Simplified tools that don't make additional API calls"""
+    
+    def __init__(self, kb: KnowledgeBase = None, dispatcher: EscalationDispatcher = None):
+        self.kb = kb or KnowledgeBase.from_env()
+        self.vectors = VectorIndex.for_knowledge_base(self.kb)
+        self.dispatcher = dispatcher or EscalationDispatcher.from_env()
+    
+    def search_knowledge_base(self, category: str) -> str:
+        """Search knowledge base for solutions. Accepts a category name or the customer's own words"""
+        return json.dumps(self.lookup(category))
+    
+    def lookup(self, category: str, rank_categories: bool = False) -> dict:
+        """search_knowledge_base's result as a dict
+        
+        The vector index is only scanned when BM25 finds nothing, or when rank_categories
+        asks for categories ranked by vector similarity: a scan is a product with the whole
+        matrix, while a BM25 hit costs well under a millisecond.
+        """
+        matches = self.kb.search(category, top_k=3)
+        vector_hits = []
+        if self.vectors is not None and (rank_categories or not matches):
+            vector_hits = self.vectors.search(category, top_k=50)
+        
+        if not matches and vector_hits:
+            # No shared words (typos, paraphrases): fall back to character n-gram similarity
+            matches = [
+                dict(self.kb.articles[doc_id], score=round(score, 4))
+                for doc_id, score in vector_hits[:3]
+            ]
+        
+        if not matches:
+            # Partial category names ("bill", "connectivity issues") still map to a category
+            query = category.lower()
+            for key, doc_ids in self.kb.categories.items():
+                if key in query or query in key:
+                    matches = [dict(self.kb.articles[doc_ids[0]], score=0.0)]
+                    break
+        
+        if matches:
+            best = matches[0]
+            if vector_hits:
+                categories = VectorIndex.rank_categories(self.kb, vector_hits)
+            else:
+                categories = [{"category": m["category"], "score": m["score"]} for m in matches]
+            return {
+                "category": best["category"],
+                "solutions": best["solutions"],
+                "found": True,
+                "categories": categories,
+                "articles": [
+                    {"id": m["id"], "title": m["title"], "category": m["category"], "score": m["score"]}
+                    for m in matches
+                ]
+            }
+        
+        return {
+            "category": "general",
+            "solutions": ["Please describe your issue in more detail"],
+            "found": False
+        }
+    
+    async def escalate_to_human(
+        self, 
+        reason: str, 
+        customer_message: str,
+        tool_context: ToolContext
+    ) -> str:
+        """Escalate issue to human agent"""
+        # ADK runs tools on the shared event loop, and the dispatcher may wait on
+        # the SQLite write lock, so its work runs on a thread
+        return await asyncio.to_thread(
+            self._escalate, tool_context.session.id, tool_context.user_id, reason, customer_message
+        )
+    
+    def _escalate(self, session_id: str, user_id: str, reason: str, customer_message: str) -> str:
+        ticket = self.dispatcher.escalate(
+            session_id=session_id,
+            user_id=user_id,
+            reason=reason,
+            message=customer_message
+        )
+        
+        if ticket.agent_id:
+            return json.dumps({
+                "status": ticket.status,
+                "ticket_id": ticket.ticket_id,
+                "agent_id": ticket.agent_id,
+                "message": "Connected to human agent"
+            })
+        
+        return json.dumps({
+            "status": ticket.status,
+            "ticket_id": ticket.ticket_id,
+            "queue_depth": self.dispatcher.stats()["queued"],
+            "message": "All human agents are busy; the customer is in the queue"
+        })
@@ -1,31 +1,41 @@
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, request, jsonify, Response, stream_with_context, g
 from flask_cors import CORS
 import uuid
 import json
+import math
+import time
 from datetime import datetime
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 import logging
 import sys
 import os
 import warnings
 import threading
+import asyncio
+import contextvars
+import hmac
+import itertools
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 warnings.filterwarnings("ignore", category=RuntimeWarning)
-warnings.filterwarnings("ignore", message=".*Event loop is closed.*")
 
 if sys.platform == 'win32':
-    import asyncio
     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
   
-from main import get_runner, get_agent, get_session_service
-
-try:
-    from google.genai.types import Part, Content
-    USE_GENAI_TYPES = True
-    print(" Google Genai types imported successfully")
-except ImportError:
-    USE_GENAI_TYPES = False
-    print(" Could not import google.genai.types")
+import main
+from main import get_runner, get_agent, get_session_service, get_runtime, get_tools, get_context_budget, get_dispatcher
+from fast_path import FastPathRouter
+from response_cache import ResponseCache, message_key
+from single_flight import SingleFlight
+import admission
+from admission import AdmissionRejected
+import metrics
+from session_store import SessionRecord, create_session_store, isoformat
+from escalation import OPEN_STATUSES, DispatchError, Ticket
+from model_transport import reset_deadline, set_deadline
+from circuit_breaker import BreakerCall, CircuitBreaker, CircuitOpen, degraded_response
+from transcript_archive import TranscriptArchive, TranscriptReader
 
 logging.basicConfig(
     level=logging.INFO,
@@ -38,30 +48,593 @@ logging.getLogger("httpx").setLevel(logging.CRITICAL)
 logging.getLogger("anyio").setLevel(logging.CRITICAL)
 logging.getLogger("asyncio").setLevel(logging.CRITICAL)
 
-app = Flask(__name__)
-CORS(app)
+# Routes live on a blueprint so create_app() can build the Flask app; the runner,
+# agent and knowledge base are fetched from main on use and built on first use
+api = Blueprint("api", __name__)
+
+# The knowledge base is only built when the fast path first needs it
+fast_path = FastPathRouter.from_env(lambda query: get_tools().search_knowledge_base(query))
+response_cache = ResponseCache.from_env()
+model_breaker = CircuitBreaker.from_env()
+# Written by a background thread started in start_process_services()
+transcripts = TranscriptArchive.from_env()
+in_flight = SingleFlight()
+context_budget = get_context_budget()
+dispatcher = get_dispatcher()
+rate_limiter, model_admission = admission.from_env()
+
+active_sessions = create_session_store()
+
+if model_breaker:
+    metrics.registry.gauge(
+        "support_model_circuit_state", "Model circuit breaker state (0 closed, 1 half-open, 2 open)",
+        callback=lambda: ("closed", "half_open", "open").index(model_breaker.state)
+    )
+
+
+def drop_adk_session(session_id: str, record: SessionRecord, reason: str):
+    """Delete the ADK copy of a session when the Flask side removes it"""
+    get_runtime().run(get_session_service().delete_session(
+        app_name="multi_agent_support",
+        user_id=record.user_id,
+        session_id=session_id
+    ))
+    logger.info(f"ADK session {session_id[:8]}... removed ({reason})")
+
+
+def utf8_length(text: str) -> int:
+    return len(text.encode("utf-8"))
+
+
+def history_bytes(record: SessionRecord) -> int:
+    return sum(utf8_length(message.content) for message in record.history)
+
+
+def forget_history_bytes(session_id: str, record: SessionRecord, reason: str):
+    metrics.HISTORY_BYTES.dec(history_bytes(record))
+
+
+active_sessions.on_remove(drop_adk_session)
+if active_sessions.shared:
+    # Other processes add and remove history too, so report the database's running total
+    metrics.HISTORY_BYTES.callback = active_sessions.history_bytes
+else:
+    active_sessions.on_remove(forget_history_bytes)
+if context_budget:
+    active_sessions.on_remove(context_budget.forget)
+active_sessions.on_remove(dispatcher.cancel_session)
+if transcripts:
+    active_sessions.on_remove(
+        lambda session_id, record, reason: transcripts.append_end(session_id, record.user_id, reason,
+                                                                  record.message_count)
+    )
+
+
+def track_escalation(ticket: Ticket):
+    """Mirror a ticket's state onto its chat session; a resolved or cancelled ticket leaves it "none" again"""
+    def set_status(session: SessionRecord):
+        session.escalation_status = ticket.status if ticket.status in OPEN_STATUSES else "none"
+    active_sessions.update(ticket.session_id, set_status)
+
+
+dispatcher.on_change(track_escalation)
+
+metrics.registry.gauge("support_active_sessions", "Sessions currently held", callback=lambda: len(active_sessions))
+metrics.registry.gauge("support_model_queue_depth", "Requests waiting for a model-call slot",
+                       callback=lambda: model_admission.stats()["queue_depth"])
+
+
+
+FALLBACK_RESPONSE = "I apologize, but I encountered an issue processing your request. Could you please try rephrasing your question?"
+
+# Longest a history long-poll (?wait=) may hold a request thread
+HISTORY_MAX_WAIT = float(os.getenv("HISTORY_LONG_POLL_MAX", "30"))
+# Long-polls allowed to wait at once in this process. Kept below the request
+# threads (GUNICORN_THREADS, 8) so waiters never take all of them; past it,
+# ?wait= returns the current page at once and the client polls again
+HISTORY_MAX_WAITERS = int(os.getenv("HISTORY_LONG_POLL_MAX_WAITERS", "4"))
+history_waiters = threading.BoundedSemaphore(HISTORY_MAX_WAITERS)
+
+# Deadline for model calls made while serving a request; clients may ask for
+# less (never more) with an X-Request-Timeout header, in seconds
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT_SECONDS", "60"))
+
+# /api/chat/batch limits
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "5000"))
+BATCH_PARALLELISM = int(os.getenv("BATCH_PARALLELISM", "8"))
+BATCH_MAX_PARALLELISM = int(os.getenv("BATCH_MAX_PARALLELISM", "32"))
+
+# Endpoints exposing other users' conversations (transcripts, escalation
+# tickets) or changing the human agent roster need an X-Admin-Token header
+# matching ADMIN_TOKEN; while it is unset they are refused
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# Records returned by one /api/chat/transcript request
+TRANSCRIPT_MAX_RECORDS = int(os.getenv("TRANSCRIPT_MAX_RECORDS", "1000"))
+
+
+def admin_denied() -> Optional[tuple]:
+    """Error response for a request without the admin token, None when it has it"""
+    if not ADMIN_TOKEN:
+        return jsonify({"error": "Admin endpoints are disabled; set ADMIN_TOKEN"}), 403
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', '').encode(), ADMIN_TOKEN.encode()):
+        return jsonify({"error": "A valid X-Admin-Token header is required"}), 401
+    return None
+
+
+def check_session(session_id: str, user_id: str) -> bool:
+    """Look up a session, recovering it if unknown. False if it belongs to another user"""
+    session = active_sessions.get(session_id)
+    if session is None:
+        logger.warning(f"Session {session_id} not found, attempting recovery...")
+        
+        try:
+            with metrics.SESSION_CREATE_SECONDS.time():
+                get_runtime().run(get_session_service().create_session(
+                    app_name="multi_agent_support",
+                    user_id=user_id,
+                    session_id=session_id
+                ))
+            logger.info(f"ADK session registered during recovery: {session_id}")
+        except Exception as recovery_error:
+            logger.warning(f"Session recovery warning: {recovery_error}")
+        
+        session = SessionRecord(user_id, recovered=True)
+        active_sessions[session_id] = session
+        logger.info(f"Session {session_id} recovered")
+    
+    return session.user_id == user_id
+
+
+def ensure_session(session_id: str, user_id: str):
+    """Look up a session, recovering it if unknown. Returns an error response or None"""
+    if not check_session(session_id, user_id):
+        return jsonify({
+            "error": "Invalid user_id for this session"
+        }), 403
+    
+    return None
+
+
+def build_message(message: str):
+    """Wrap user text in the message object expected by the runner"""
+    try:
+        from google.genai.types import Part, Content
+        return Content(
+            role="user",
+            parts=[Part(text=message)]
+        )
+    except ImportError:
+        pass
+    
+    class SimpleMessage:
+        def __init__(self, text):
+            self.role = "user"
+            self.parts = [type('Part', (), {'text': text})()]
+    return SimpleMessage(message)
+
+
+def append_adk_turn(session_id: str, user_id: str, message: str, agent_response_text: str):
+    """Mirror a turn answered without the runner into the ADK session so the model keeps the context"""
+    try:
+        from google.genai.types import Part, Content
+        from google.adk.events import Event
+        from google.adk.sessions.base_session_service import GetSessionConfig
+    except ImportError:
+        return
+    session_service = get_session_service()
+    
+    async def append():
+        session = await session_service.get_session(
+            app_name="multi_agent_support",
+            user_id=user_id,
+            session_id=session_id,
+            config=GetSessionConfig(num_recent_events=0)
+        )
+        if session is None:
+            return
+        invocation_id = f"local-{uuid.uuid4().hex[:12]}"
+        await session_service.append_event(session, Event(
+            invocation_id=invocation_id,
+            author="user",
+            content=build_message(message)
+        ))
+        await session_service.append_event(session, Event(
+            invocation_id=invocation_id,
+            author=get_agent().name,
+            content=Content(role="model", parts=[Part(text=agent_response_text)])
+        ))
+    
+    try:
+        get_runtime().run(append())
+    except Exception as e:
+        logger.warning(f"Could not mirror turn into ADK session {session_id[:8]}...: {e}")
+
+
+def extract_response_text(final_response) -> str:
+    """Pull the reply text out of a runner event"""
+    agent_response_text = ""
+    if not final_response:
+        logger.warning("No final response received from agent")
+        return agent_response_text
+    
+    try:
+        logger.info(f"Response type: {type(final_response)}")
+        
+        if hasattr(final_response, 'content'):
+            content = final_response.content
+            if hasattr(content, 'parts') and content.parts:
+                text_parts = []
+                for part in content.parts:
+                    if hasattr(part, 'text') and part.text:
+                        text_parts.append(str(part.text))
+                agent_response_text = ' '.join(text_parts)
+            elif isinstance(content, str):
+                agent_response_text = content
+            elif hasattr(content, 'text'):
+                agent_response_text = str(content.text)
+        
+        if not agent_response_text and hasattr(final_response, 'response'):
+            agent_response_text = str(final_response.response)
+        
+        if not agent_response_text and hasattr(final_response, 'agent_response'):
+            agent_response_text = str(final_response.agent_response)
+        
+        if not agent_response_text and hasattr(final_response, 'text'):
+            agent_response_text = str(final_response.text)
+        
+        if agent_response_text:
+            agent_response_text = agent_response_text.strip()
+            logger.info(f"Extracted response: {agent_response_text[:100]}...")
+        else:
+            logger.warning(f"Could not extract text from response")
+            
+    except Exception as extract_error:
+        logger.error(f"Error extracting response text: {extract_error}")
+        agent_response_text = ""
+    
+    return agent_response_text
+
+
+def record_turn(session_id: str, message: str, agent_response_text: str,
+                served_by: str = "llm", tools_used: List[str] = None) -> Dict[str, Any]:
+    """Append a completed turn to the session and build the response metadata"""
+    escalation_status = dispatcher.status_for_session(session_id)
+    now = time.time()
+    
+    def append_turn(session: SessionRecord):
+        if escalation_status != "none":
+            session.escalation_status = escalation_status
+        session.message_count += 1
+        session.last_activity = now
+        session.add_message("user", message, now)
+        session.add_message("agent", agent_response_text, now)
+    
+    session = active_sessions.update(session_id, append_turn)
+    metrics.TURNS.inc(served_by)
+    if session is not None and not active_sessions.shared:
+        metrics.HISTORY_BYTES.inc(utf8_length(message) + utf8_length(agent_response_text))
+    if transcripts:
+        # Queued in memory only; the archive's writer thread does the disk I/O
+        transcripts.append_turn(session_id, session.user_id if session is not None else "", message,
+                                agent_response_text, served_by, now)
+    if session is None:
+        # Evicted while the agent was answering; the reply is still returned to the caller
+        logger.warning(f"Session {session_id[:8]}... was evicted before its turn was recorded")
+        session = SessionRecord("")
+    
+    metadata = {
+        "tools_used": tools_used or [],
+        "escalation_status": escalation_status,
+        "served_by": served_by
+    }
+    if model_breaker:
+        metadata["circuit_breaker"] = model_breaker.state
+    
+    return {
+        "metadata": metadata,
+        "message_count": session.message_count
+    }
+
+
+def count_tool_calls(event):
+    """Count function calls the model requested in a runner event"""
+    content = getattr(event, 'content', None)
+    for part in getattr(content, 'parts', None) or []:
+        function_call = getattr(part, 'function_call', None)
+        if function_call is not None:
+            metrics.TOOL_CALLS.inc(getattr(function_call, 'name', None) or "unknown")
+
+
+def run_agent(session_id: str, user_id: str, message: str, call=None, on_event=None) -> str:
+    """Run one turn through the ADK runner and return the reply text (or the fallback)
+    
+    `call`, a circuit breaker grant, is told whether the model call failed and how long it took.
+    With `on_event`, the runner streams partial replies and every event is passed to it as it arrives.
+    """
+    final_response = None
+    event_count = 0
+    failed = False
+    run_kwargs = stream_run_kwargs() if on_event else {}
+    start = time.perf_counter()
+    
+    try:
+        for response_event in get_runtime().iterate(get_runner().run_async(
+            user_id=user_id,
+            session_id=session_id,
+            new_message=build_message(message),
+            **run_kwargs
+        )):
+            if event_count == 0:
+                metrics.RUNNER_FIRST_EVENT_SECONDS.observe(time.perf_counter() - start)
+            event_count += 1
+            if on_event is not None:
+                on_event(response_event)
+            if getattr(response_event, 'partial', False):
+                continue
+            final_response = response_event
+            count_tool_calls(response_event)
+            logger.info(f"Event #{event_count}: {type(response_event).__name__}")
+        
+        logger.info(f"Collected {event_count} response events. Using final event for response extraction.")
+        
+    except Exception as e:
+        failed = True
+        metrics.ERRORS.inc("runner")
+        logger.warning(f"Exception during runner execution: {e}")
+    
+    if call is not None:
+        call.record(ok=not failed, seconds=time.perf_counter() - start)
+    metrics.RUNNER_SECONDS.observe(time.perf_counter() - start)
+    metrics.EVENTS_PER_TURN.observe(event_count)
+    
+    with metrics.EXTRACTION_SECONDS.time():
+        agent_response_text = extract_response_text(final_response)
+    
+    if not agent_response_text or len(agent_response_text.strip()) == 0:
+        agent_response_text = FALLBACK_RESPONSE
+        metrics.FALLBACK_RESPONSES.inc()
+        logger.warning("Using fallback response message")
+    
+    return agent_response_text
+
+
+def turn_response(session_id: str, agent_response_text: str, turn: Dict[str, Any]):
+    """JSON reply for a completed turn"""
+    return jsonify({
+        "agent_response": agent_response_text,
+        "session_id": session_id,
+        "timestamp": datetime.now().isoformat(),
+        "metadata": turn["metadata"],
+        "message_count": turn["message_count"]
+    }), 200
+
+
+def rejection_response(rejected: AdmissionRejected):
+    """429/503 reply with a Retry-After header"""
+    logger.warning(f"Request rejected by admission control: {rejected.reason}")
+    response = jsonify({
+        "error": "Too many requests" if rejected.status == 429 else "Service busy, please retry",
+        "reason": rejected.reason
+    })
+    response.headers["Retry-After"] = str(max(1, math.ceil(rejected.retry_after)))
+    return response, rejected.status
+
+
+def breaker_call() -> Optional[BreakerCall]:
+    """Circuit breaker grant for one model call (raises CircuitOpen); None when the breaker is off"""
+    return model_breaker.acquire() if model_breaker else None
+
+
+def admitted_run_agent(session_id: str, user_id: str, message: str, on_event=None) -> str:
+    """run_agent once the circuit breaker lets the call through and a model-call slot is free"""
+    with breaker_call() or nullcontext() as call, model_admission.acquire():
+        return run_agent(session_id, user_id, message, call, on_event)
+
+
+def degraded_answer(session_id: str, user_id: str, message: str):
+    """Answer from the knowledge base alone while the model circuit is open; returns (reply text, turn)"""
+    agent_response_text = degraded_response(json.loads(get_tools().search_knowledge_base(message)))
+    append_adk_turn(session_id, user_id, message, agent_response_text)
+    turn = record_turn(
+        session_id, message, agent_response_text,
+        served_by="degraded", tools_used=["search_knowledge_base"]
+    )
+    return agent_response_text, turn
+
+
+def answer_message(session_id: str, user_id: str, message: str, on_event=None):
+    """Answer one customer message through the fast path, cache or model, and record the turn
+    
+    Returns (reply text, turn). Raises AdmissionRejected when no model slot is available.
+    on_event sees the runner's events when this call is the one that runs the model.
+    While the model circuit is open, the answer comes from the knowledge base alone.
+    """
+    session = active_sessions.get(session_id)
+    escalated = getattr(session, "escalation_status", "none") in OPEN_STATUSES
+    # Canned answers (fast path) and answers shared between sessions (cached or
+    # coalesced) were written for a conversation with no history, so only
+    # opening messages of sessions not waiting for a human get them
+    opening = session is not None and session.message_count == 0 and not session.recovered
+    
+    routed = fast_path.route(message) if fast_path and opening and not escalated else None
+    if routed:
+        agent_response_text = routed["agent_response"]
+        append_adk_turn(session_id, user_id, message, agent_response_text)
+        turn = record_turn(
+            session_id, message, agent_response_text,
+            served_by="fast_path", tools_used=["search_knowledge_base"]
+        )
+        turn["metadata"]["fast_path"] = {"category": routed["category"], "confidence": routed["confidence"]}
+        return agent_response_text, turn
+    
+    kb_version = get_tools().kb.version
+    key = message_key(message, kb_version) if opening and not escalated else None
+    
+    if response_cache and key:
+        response_cache.check_kb_version(kb_version)
+        cached = response_cache.get(key)
+        if cached:
+            logger.info(f"Response cache hit for session {session_id[:8]}...")
+            append_adk_turn(session_id, user_id, message, cached)
+            return cached, record_turn(session_id, message, cached, served_by="cache")
+    
+    try:
+        if key:
+            (agent_response_text, leader_session_id), shared = in_flight.do(
+                key, lambda: (admitted_run_agent(session_id, user_id, message, on_event), session_id)
+            )
+        else:
+            agent_response_text, shared = admitted_run_agent(session_id, user_id, message, on_event), False
+    except CircuitOpen:
+        return degraded_answer(session_id, user_id, message)
+    
+    if shared:
+        # The model answered another session; give this one the same turn
+        append_adk_turn(session_id, user_id, message, agent_response_text)
+        if dispatcher.status_for_session(leader_session_id) != "none":
+            # That answer escalated, so this customer needs a ticket of their own
+            dispatcher.escalate(session_id, user_id, "Same request as an escalated conversation", message)
+    
+    turn = record_turn(session_id, message, agent_response_text, served_by="coalesced" if shared else "llm")
+    
+    if (response_cache and key and not shared and agent_response_text != FALLBACK_RESPONSE
+            and turn["metadata"]["escalation_status"] == "none"):
+        response_cache.put(key, agent_response_text)
+    
+    return agent_response_text, turn
+
 
-runner = get_runner()
-agent = get_agent()
-session_service = get_session_service()
+def create_sessions(user_ids: List[str]) -> List[str]:
+    """Open one session per user id, registering all of them with ADK in a single runtime call"""
+    session_ids = [str(uuid.uuid4()) for _ in user_ids]
+    session_service = get_session_service()
+    
+    async def register_all():
+        return await asyncio.gather(*(
+            session_service.create_session(app_name="multi_agent_support", user_id=user_id, session_id=session_id)
+            for user_id, session_id in zip(user_ids, session_ids)
+        ), return_exceptions=True)
+    
+    for user_id, session_id, result in zip(user_ids, session_ids, get_runtime().run(register_all())):
+        if isinstance(result, Exception):
+            logger.warning(f"ADK session registration warning: {result}")
+        active_sessions[session_id] = SessionRecord(user_id)
+    return session_ids
 
-active_sessions: Dict[str, Dict[str, Any]] = {}
 
-print("Flask API initialized with ADK Runner")
+def run_batch_item(index: int, item_id: Any, session_id: str, user_id: str, message: str,
+                   timeout: Optional[float] = None) -> Dict[str, Any]:
+    """Answer one batch item; failures are reported in the result, never raised
+    
+    The item's user is rate limited like a single message, and its model calls
+    get `timeout` seconds from when the item starts.
+    """
+    result = {"index": index, "id": item_id, "session_id": session_id, "user_id": user_id}
+    token = set_deadline(timeout)
+    try:
+        rate_limiter.check(user_id)
+        agent_response_text, turn = answer_message(session_id, user_id, message)
+        result.update(status="ok", agent_response=agent_response_text, metadata=turn["metadata"])
+    except AdmissionRejected as rejected:
+        result.update(status="error", error=rejected.reason, retry_after=rejected.retry_after)
+    except Exception as e:
+        metrics.ERRORS.inc("batch_item")
+        logger.warning(f"Batch item {index} failed: {e}")
+        result.update(status="error", error=str(e))
+    finally:
+        reset_deadline(token)
+    return result
+
+
+def stream_run_kwargs() -> Dict[str, Any]:
+    """Runner options for token streaming, when this ADK version supports it"""
+    try:
+        from google.adk.agents.run_config import RunConfig, StreamingMode
+    except ImportError:
+        return {}
+    return {"run_config": RunConfig(streaming_mode=StreamingMode.SSE)}
 
 
-@app.route('/health', methods=['GET'])
+def runner_stats() -> Dict[str, Any]:
+    if not main.is_built():
+        return {"mode": "not started"}
+    runner = get_runner()
+    return runner.stats() if hasattr(runner, "stats") else {"mode": "live"}
+
+
+def model_transport_stats() -> Dict[str, Any]:
+    if not main.is_built():
+        return {"status": "not started"}
+    transport = main.get_model_transport()
+    return transport.stats() if transport else {"enabled": False}
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format a Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@api.before_app_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    start_process_services()
+    timeout = REQUEST_TIMEOUT
+    try:
+        timeout = min(timeout, float(request.headers.get('X-Request-Timeout', timeout)))
+    except ValueError:
+        pass
+    g.request_timeout = timeout
+    g.deadline_token = set_deadline(timeout)
+
+
+@api.teardown_app_request
+def clear_request_deadline(error):
+    token = g.pop("deadline_token", None)
+    if token is not None:
+        reset_deadline(token)
+
+
+@api.after_app_request
+def record_request_latency(response):
+    start = getattr(g, "request_start", None)
+    if start is not None:
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint, str(response.status_code))
+    return response
+
+
+@api.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus text exposition of request and agent metrics"""
+    return Response(metrics.registry.render(), mimetype="text/plain; version=0.0.4")
+
+
+@api.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
+    degraded = model_breaker is not None and model_breaker.state != "closed"
     return jsonify({
-        "status": "healthy",
+        "status": "degraded" if degraded else "healthy",
         "service": "Hybrid Multi-Agent Support System",
         "timestamp": datetime.now().isoformat(),
-        "active_sessions": len(active_sessions)
+        "active_sessions": len(active_sessions),
+        "session_store": active_sessions.stats(),
+        "routing": fast_path.counters if fast_path else {"fast_path": "disabled"},
+        "response_cache": response_cache.stats() if response_cache else {"enabled": False},
+        "single_flight": in_flight.stats(),
+        "admission": model_admission.stats(),
+        "rate_limit": rate_limiter.stats(),
+        "escalations": dispatcher.stats(),
+        "context_budget": context_budget.stats() if context_budget else {"enabled": False},
+        "runner": runner_stats(),
+        "model_transport": model_transport_stats(),
+        "circuit_breaker": model_breaker.stats() if model_breaker else {"enabled": False},
+        "transcripts": transcripts.stats() if transcripts else {"enabled": False}
     }), 200
 
 
-@app.route('/api/chat/start', methods=['POST'])
+@api.route('/api/chat/start', methods=['POST'])
 def start_chat():
     """Initialize a new chat session"""
     try:
@@ -71,27 +644,17 @@ def start_chat():
         user_id = data.get('user_id', str(uuid.uuid4()))
     
         try:
-            import asyncio
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            try:
-                loop.run_until_complete(session_service.create_session(
+            with metrics.SESSION_CREATE_SECONDS.time():
+                get_runtime().run(get_session_service().create_session(
                     app_name="multi_agent_support",
                     user_id=user_id,
                     session_id=session_id
                 ))
-                logger.info(f"ADK session registered: {session_id}")
-            finally:
-                loop.close()
+            logger.info(f"ADK session registered: {session_id}")
         except Exception as session_error:
             logger.warning(f"ADK session registration warning: {session_error}")
         
-        active_sessions[session_id] = {
-            "user_id": user_id,
-            "created_at": datetime.now().isoformat(),
-            "message_count": 0,
-            "conversation_history": []
-        }
+        active_sessions[session_id] = SessionRecord(user_id)
         
         logger.info(f"New session created: {session_id} for user: {user_id}")
         
@@ -103,6 +666,7 @@ def start_chat():
         }), 201
         
     except Exception as e:
+        metrics.ERRORS.inc("start_chat")
         logger.error(f"Error creating session: {str(e)}")
         import traceback
         traceback.print_exc()
@@ -112,7 +676,7 @@ def start_chat():
         }), 500
 
 
-@app.route('/api/chat/message', methods=['POST'])
+@api.route('/api/chat/message', methods=['POST'])
 def send_message():
     """Send a message to the support agent"""
     try:
@@ -131,174 +695,285 @@ def send_message():
                 "required": ["session_id", "user_id", "message"]
             }), 400
         
-        if session_id not in active_sessions:
-            logger.warning(f"Session {session_id} not found, attempting recovery...")
-            
-            try:
-                import asyncio
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                try:
-                    loop.run_until_complete(session_service.create_session(
-                        app_name="multi_agent_support",
-                        user_id=user_id,
-                        session_id=session_id
-                    ))
-                    logger.info(f"ADK session registered during recovery: {session_id}")
-                finally:
-                    loop.close()
-            except Exception as recovery_error:
-                logger.warning(f"Session recovery warning: {recovery_error}")
-            
-            active_sessions[session_id] = {
-                "user_id": user_id,
-                "created_at": datetime.now().isoformat(),
-                "message_count": 0,
-                "conversation_history": [],
-                "recovered": True
-            }
-            logger.info(f"Session {session_id} recovered")
+        rate_limiter.check(user_id)
         
-        if active_sessions[session_id]["user_id"] != user_id:
-            return jsonify({
-                "error": "Invalid user_id for this session"
-            }), 403
+        session_error = ensure_session(session_id, user_id)
+        if session_error:
+            return session_error
         
         logger.info(f"Processing message for session {session_id[:8]}...: {message[:50]}...")
         
-        if USE_GENAI_TYPES:
-            message_obj = Content(
-                role="user",
-                parts=[Part(text=message)]
-            )
-        else:
-            class SimpleMessage:
-                def __init__(self, text):
-                    self.role = "user"
-                    self.parts = [type('Part', (), {'text': text})()]
-            message_obj = SimpleMessage(message)
+        agent_response_text, turn = answer_message(session_id, user_id, message)
+        
+        logger.info(f"✅ Response generated for session {session_id[:8]}...")
         
+        return turn_response(session_id, agent_response_text, turn)
+        
+    except AdmissionRejected as rejected:
+        return rejection_response(rejected)
+    except Exception as e:
+        metrics.ERRORS.inc("send_message")
+        logger.error(f"Error processing message: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({
+            "error": "Failed to process message",
+            "details": str(e)
+        }), 500
+
+
+@api.route('/api/chat/message/stream', methods=['POST'])
+def stream_message():
+    """Send a message and stream the agent reply as Server-Sent Events"""
+    data = request.json
+    
+    if not data:
+        return jsonify({"error": "Request body is required"}), 400
+    
+    session_id = data.get('session_id')
+    user_id = data.get('user_id')
+    message = data.get('message')
+    
+    if not all([session_id, user_id, message]):
+        return jsonify({
+            "error": "Missing required fields",
+            "required": ["session_id", "user_id", "message"]
+        }), 400
+    
+    try:
+        rate_limiter.check(user_id)
+    except AdmissionRejected as rejected:
+        return rejection_response(rejected)
+    
+    session_error = ensure_session(session_id, user_id)
+    if session_error:
+        return session_error
+    
+    try:
+        call = breaker_call()
+    except CircuitOpen:
+        agent_response_text, turn = degraded_answer(session_id, user_id, message)
+        return Response(sse_event("done", {
+            "agent_response": agent_response_text,
+            "session_id": session_id,
+            "timestamp": datetime.now().isoformat(),
+            "metadata": turn["metadata"],
+            "message_count": turn["message_count"]
+        }), mimetype='text/event-stream', headers={"Cache-Control": "no-cache"})
+    
+    try:
+        slot = model_admission.acquire()
+    except AdmissionRejected as rejected:
+        if call:
+            call.release()
+        return rejection_response(rejected)
+    
+    logger.info(f"Streaming message for session {session_id[:8]}...: {message[:50]}...")
+    
+    def generate():
         final_response = None
-        responses = []
+        event_count = 0
+        failed = False
+        run_kwargs = stream_run_kwargs()
+        start = time.perf_counter()
         
         try:
-            for response_event in runner.run(
+            for response_event in get_runtime().iterate(get_runner().run_async(
                 user_id=user_id,
                 session_id=session_id,
-                new_message=message_obj
-            ):
-                responses.append(response_event)
-                logger.info(f"Event #{len(responses)}: {type(response_event).__name__}")
+                new_message=build_message(message),
+                **run_kwargs
+            )):
+                if event_count == 0:
+                    metrics.RUNNER_FIRST_EVENT_SECONDS.observe(time.perf_counter() - start)
+                event_count += 1
+                
+                if getattr(response_event, 'partial', False):
+                    content = getattr(response_event, 'content', None)
+                    parts = getattr(content, 'parts', None) or []
+                    text = ''.join(str(part.text) for part in parts if getattr(part, 'text', None))
+                    if text:
+                        yield sse_event("delta", {"text": text})
+                    continue
+                
+                final_response = response_event
+                count_tool_calls(response_event)
+                text = extract_response_text(response_event)
+                yield sse_event("event", {
+                    "index": event_count,
+                    "type": type(response_event).__name__,
+                    "author": getattr(response_event, 'author', None),
+                    "text": text
+                })
             
-            final_response = responses[-1] if responses else None
-            logger.info(f"Collected {len(responses)} response events. Using final event for response extraction.")
+            logger.info(f"Streamed {event_count} response events for session {session_id[:8]}...")
             
         except Exception as e:
-            logger.warning(f"Exception during runner execution: {e}")
-            final_response = responses[-1] if responses else None
+            failed = True
+            metrics.ERRORS.inc("runner")
+            logger.warning(f"Exception during streaming runner execution: {e}")
+            yield sse_event("error", {"error": "Agent execution failed", "details": str(e)})
+        finally:
+            slot.release()
+            if call:
+                call.record(ok=not failed, seconds=time.perf_counter() - start)
+            metrics.RUNNER_SECONDS.observe(time.perf_counter() - start)
+            metrics.EVENTS_PER_TURN.observe(event_count)
         
-        agent_response_text = ""
-        if final_response:
-            try:
-                logger.info(f"Response type: {type(final_response)}")
-                
-                if hasattr(final_response, 'content'):
-                    content = final_response.content
-                    if hasattr(content, 'parts') and content.parts:
-                        text_parts = []
-                        for part in content.parts:
-                            if hasattr(part, 'text') and part.text:
-                                text_parts.append(str(part.text))
-                        agent_response_text = ' '.join(text_parts)
-                    elif isinstance(content, str):
-                        agent_response_text = content
-                    elif hasattr(content, 'text'):
-                        agent_response_text = str(content.text)
-                
-                if not agent_response_text and hasattr(final_response, 'response'):
-                    agent_response_text = str(final_response.response)
-                
-                if not agent_response_text and hasattr(final_response, 'agent_response'):
-                    agent_response_text = str(final_response.agent_response)
-                
-                if not agent_response_text and hasattr(final_response, 'text'):
-                    agent_response_text = str(final_response.text)
-                
-                if agent_response_text:
-                    agent_response_text = agent_response_text.strip()
-                    logger.info(f"Extracted response: {agent_response_text[:100]}...")
-                else:
-                    logger.warning(f"Could not extract text from response")
-                    
-            except Exception as extract_error:
-                logger.error(f"Error extracting response text: {extract_error}")
-                agent_response_text = ""
-        else:
-            logger.warning("No final response received from agent")
+        with metrics.EXTRACTION_SECONDS.time():
+            agent_response_text = extract_response_text(final_response)
         
-        if not agent_response_text or len(agent_response_text.strip()) == 0:
-            agent_response_text = "I apologize, but I encountered an issue processing your request. Could you please try rephrasing your question?"
+        if not agent_response_text:
+            agent_response_text = FALLBACK_RESPONSE
+            metrics.FALLBACK_RESPONSES.inc()
             logger.warning("Using fallback response message")
         
-        active_sessions[session_id]["message_count"] += 1
-        active_sessions[session_id]["last_activity"] = datetime.now().isoformat()
-        active_sessions[session_id]["conversation_history"].append({
-            "role": "user",
-            "content": message,
-            "timestamp": datetime.now().isoformat()
-        })
-        active_sessions[session_id]["conversation_history"].append({
-            "role": "agent",
-            "content": agent_response_text,
-            "timestamp": datetime.now().isoformat()
-        })
-        message_count = active_sessions[session_id]["message_count"]
+        turn = record_turn(session_id, message, agent_response_text)
         
-        metadata = {
-            "tools_used": [],
-            "escalation_status": "none"
-        }
-        
-        if "escalat" in agent_response_text.lower():
-            metadata["escalation_status"] = "pending"
-        
-        logger.info(f"✅ Response generated for session {session_id[:8]}...")
-        
-        return jsonify({
+        yield sse_event("done", {
             "agent_response": agent_response_text,
             "session_id": session_id,
             "timestamp": datetime.now().isoformat(),
-            "metadata": metadata,
-            "message_count": message_count
-        }), 200
+            "metadata": turn["metadata"],
+            "message_count": turn["message_count"]
+        })
+    
+    response = Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
+    # Frees the slot even if the client disconnects before the stream starts
+    response.call_on_close(slot.release)
+    if call:
+        response.call_on_close(call.release)
+    return response
+
+
+@api.route('/api/chat/batch', methods=['POST'])
+def batch_messages():
+    """Answer many messages at once, streaming one NDJSON line per item as each finishes
+    
+    Body: {"items": [{"user_id"?, "message", "id"?}, ...], "parallelism"?}
+    Each item gets a new session. Result lines carry the item's index and id, and a
+    failed item (including one over its user's rate limit) yields an error line
+    without affecting the others. A final {"done": true, ...} line summarises the batch.
+    Items run with the request's context variables, each with the request timeout
+    counted from its own start.
+    """
+    data = request.json or {}
+    items = data.get('items')
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "items must be a non-empty list"}), 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({"error": f"At most {BATCH_MAX_ITEMS} items per batch"}), 413
+    try:
+        parallelism = int(data.get('parallelism', BATCH_PARALLELISM))
+    except (TypeError, ValueError):
+        return jsonify({"error": "parallelism must be an integer"}), 400
+    parallelism = max(1, min(parallelism, BATCH_MAX_PARALLELISM))
+    
+    rejected, accepted = [], []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not isinstance(item.get('message'), str) or not item['message'].strip():
+            rejected.append({"index": index, "id": item.get('id') if isinstance(item, dict) else None,
+                             "status": "error", "error": "message is required"})
+        else:
+            accepted.append((index, item.get('id'), str(item.get('user_id') or uuid.uuid4()), item['message']))
+    
+    session_ids = create_sessions([user_id for _, _, user_id, _ in accepted])
+    logger.info(f"Batch of {len(items)} items ({len(rejected)} invalid), parallelism {parallelism}")
+    # Captured now: the streamed body is generated after the request context is torn down
+    context = contextvars.copy_context()
+    timeout = g.get("request_timeout", REQUEST_TIMEOUT)
+    
+    def generate():
+        start = time.perf_counter()
+        counts = {"ok": 0, "error": len(rejected)}
+        for line in rejected:
+            yield json.dumps(line) + "\n"
         
-    except Exception as e:
-        logger.error(f"Error processing message: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return jsonify({
-            "error": "Failed to process message",
-            "details": str(e)
-        }), 500
+        pool = ThreadPoolExecutor(max_workers=parallelism, thread_name_prefix="batch")
+        try:
+            futures = [
+                pool.submit(context.copy().run, run_batch_item, index, item_id, session_id, user_id, message,
+                            timeout)
+                for (index, item_id, user_id, message), session_id in zip(accepted, session_ids)
+            ]
+            for future in as_completed(futures):
+                result = future.result()
+                counts[result["status"]] += 1
+                yield json.dumps(result) + "\n"
+        finally:
+            # Client gone: drop the items that have not started
+            pool.shutdown(wait=False, cancel_futures=True)
+        
+        yield json.dumps({
+            "done": True,
+            "items": len(items),
+            **counts,
+            "elapsed_seconds": round(time.perf_counter() - start, 3)
+        }) + "\n"
+    
+    return Response(generate(), mimetype='application/x-ndjson', headers={"X-Accel-Buffering": "no"})
 
 
-@app.route('/api/chat/history/<session_id>', methods=['GET'])
+@api.route('/api/chat/history/<session_id>', methods=['GET'])
 def get_chat_history(session_id):
-    """Get conversation history for a session"""
+    """Get conversation history for a session
+    
+    Query parameters (all optional; without them the whole history is returned):
+        after  - only messages with seq greater than this cursor
+        limit  - at most this many messages
+        wait   - long-poll: block up to this many seconds until a message after the cursor exists
+                 (answered at once when HISTORY_LONG_POLL_MAX_WAITERS requests already wait)
+    
+    Responses carry an ETag; a matching If-None-Match gets 304 Not Modified.
+    """
     try:
-        if session_id not in active_sessions:
+        after = request.args.get('after', 0, type=int)
+        limit = request.args.get('limit', None, type=int)
+        wait = request.args.get('wait', 0.0, type=float)
+        if after < 0 or (limit is not None and limit < 1) or wait < 0:
+            return jsonify({"error": "after and wait must be >= 0, limit >= 1"}), 400
+        
+        session = active_sessions.get(session_id)
+        if session is not None and wait > 0 and session.history_length <= after and \
+                history_waiters.acquire(blocking=False):
+            try:
+                session = active_sessions.wait_for(
+                    session_id, lambda record: record.history_length > after, min(wait, HISTORY_MAX_WAIT)
+                )
+            finally:
+                history_waiters.release()
+        if session is None:
             return jsonify({"error": "Session not found"}), 404
         
-        session_data = active_sessions[session_id].copy()
+        # History only grows, so its length identifies this session's state
+        etag = f"{int(session.created_at * 1000)}-{session.history_length}"
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+            return response
         
-        return jsonify({
+        messages = session.messages_after(after, limit)
+        next_after = after + len(messages)
+        response = jsonify({
             "session_id": session_id,
-            "user_id": session_data["user_id"],
-            "conversation_history": session_data.get("conversation_history", []),
-            "message_count": session_data.get("message_count", 0),
-            "created_at": session_data.get("created_at"),
-            "last_activity": session_data.get("last_activity")
-        }), 200
+            "user_id": session.user_id,
+            "conversation_history": messages,
+            "message_count": session.message_count,
+            "created_at": isoformat(session.created_at),
+            "last_activity": isoformat(session.last_activity),
+            "next_after": next_after,
+            "has_more": next_after < session.history_length
+        })
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "private, no-cache"
+        return response, 200
         
     except Exception as e:
         logger.error(f"Error fetching history: {str(e)}")
@@ -308,7 +983,40 @@ def get_chat_history(session_id):
         }), 500
 
 
-@app.route('/api/chat/end/<session_id>', methods=['POST'])
+@api.route('/api/chat/transcript/<session_id>', methods=['GET'])
+def get_transcript(session_id):
+    """Archived transcript of a session, including sessions that have ended
+    
+    Reads the archive on disk, so it is meant for support staff and audits, not the chat UI,
+    and requires the admin token (X-Admin-Token).
+    Query parameters: since, until (unix seconds), limit (default and at most
+    TRANSCRIPT_MAX_RECORDS). When "truncated" is true, ask again with since set to the
+    last record's ts.
+    """
+    denied = admin_denied()
+    if denied:
+        return denied
+    if not transcripts:
+        return jsonify({"error": "Transcript archive is disabled"}), 404
+    since = request.args.get('since', None, type=float)
+    until = request.args.get('until', None, type=float)
+    limit = request.args.get('limit', TRANSCRIPT_MAX_RECORDS, type=int)
+    if not 1 <= limit <= TRANSCRIPT_MAX_RECORDS:
+        return jsonify({"error": f"limit must be between 1 and {TRANSCRIPT_MAX_RECORDS}"}), 400
+    # Sealed segments are skipped or seeked into by their index; reading stops after limit + 1 records
+    scan = TranscriptReader(transcripts.directory).scan(session_id, since, until)
+    records = list(itertools.islice(scan, limit + 1))
+    if not records:
+        return jsonify({"error": "No archived transcript for this session"}), 404
+    return jsonify({
+        "session_id": session_id,
+        "records": records[:limit],
+        "count": min(len(records), limit),
+        "truncated": len(records) > limit
+    }), 200
+
+
+@api.route('/api/chat/end/<session_id>', methods=['POST'])
 def end_chat(session_id):
     """End a chat session"""
     try:
@@ -317,8 +1025,8 @@ def end_chat(session_id):
         
         session_data = active_sessions[session_id]
         summary = {
-            "total_messages": session_data.get("message_count", 0),
-            "duration": session_data.get("created_at"),
+            "total_messages": session_data.message_count,
+            "duration": isoformat(session_data.created_at),
             "ended_at": datetime.now().isoformat()
         }
         del active_sessions[session_id]
@@ -339,24 +1047,53 @@ def end_chat(session_id):
         }), 500
 
 
-@app.route('/api/sessions/active', methods=['GET'])
+@api.route('/api/sessions/active', methods=['GET'])
 def get_active_sessions():
-    """Get all active sessions (admin endpoint)"""
+    """List active sessions, one page at a time (admin endpoint)
+    
+    Query parameters (all optional):
+        user_id      - sessions of one user
+        escalation   - escalation status, e.g. "queued" or "claimed"
+        idle_minutes - only sessions with no activity for at least this long
+        order        - "desc" (most recently active first, default) or "asc"
+        limit        - page size, default 100, at most 1000
+        cursor       - next_cursor from the previous page
+    """
     try:
+        order = request.args.get('order', 'desc')
+        limit = request.args.get('limit', 100, type=int)
+        idle_minutes = request.args.get('idle_minutes', None, type=float)
+        if order not in ("asc", "desc") or not 1 <= limit <= 1000:
+            return jsonify({"error": "order must be asc or desc, limit between 1 and 1000"}), 400
+        
+        try:
+            page, next_cursor = active_sessions.query(
+                user_id=request.args.get('user_id'),
+                escalation_status=request.args.get('escalation'),
+                idle_seconds=idle_minutes * 60 if idle_minutes is not None else None,
+                order=order,
+                cursor=request.args.get('cursor'),
+                limit=limit
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
         sessions_list = [
             {
                 "session_id": sid,
-                "user_id": data["user_id"],
-                "message_count": data.get("message_count", 0),
-                "created_at": data.get("created_at"),
-                "last_activity": data.get("last_activity")
+                "user_id": data.user_id,
+                "message_count": data.message_count,
+                "escalation_status": data.escalation_status,
+                "created_at": isoformat(data.created_at),
+                "last_activity": isoformat(data.last_activity)
             }
-            for sid, data in active_sessions.items()
+            for sid, data in page
         ]
         
         return jsonify({
-            "active_sessions": len(sessions_list),
+            "active_sessions": len(active_sessions),
             "sessions": sessions_list,
+            "next_cursor": next_cursor,
             "timestamp": datetime.now().isoformat()
         }), 200
         
@@ -368,7 +1105,99 @@ def get_active_sessions():
         }), 500
 
 
-@app.errorhandler(404)
+@api.route('/api/escalations', methods=['GET'])
+def list_escalations():
+    """Dispatcher totals and the tickets waiting for an agent, in dispatch order"""
+    denied = admin_denied()
+    if denied:
+        return denied
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 1000)
+    return jsonify({
+        "stats": dispatcher.stats(),
+        "waiting": dispatcher.waiting(limit),
+        "timestamp": datetime.now().isoformat()
+    }), 200
+
+
+@api.route('/api/escalations/<ticket_id>', methods=['GET'])
+def get_escalation(ticket_id):
+    """One open ticket"""
+    denied = admin_denied()
+    if denied:
+        return denied
+    ticket = dispatcher.get(ticket_id)
+    if ticket is None:
+        return jsonify({"error": "Ticket not found"}), 404
+    return jsonify(ticket.to_dict()), 200
+
+
+@api.route('/api/escalations/claim', methods=['POST'])
+def claim_escalation():
+    """An agent takes a ticket: {"agent_id", "ticket_id"?}; without ticket_id, the next in the queue"""
+    denied = admin_denied()
+    if denied:
+        return denied
+    data = request.json or {}
+    if not data.get('agent_id'):
+        return jsonify({"error": "agent_id is required"}), 400
+    ticket = dispatcher.claim(data['agent_id'], data.get('ticket_id'))
+    logger.info(f"Ticket {ticket.ticket_id} claimed by {ticket.agent_id}")
+    return jsonify(ticket.to_dict()), 200
+
+
+@api.route('/api/escalations/<ticket_id>/release', methods=['POST'])
+def release_escalation(ticket_id):
+    """An agent finishes a ticket: {"agent_id", "resolved": true}, or hands it back with resolved false"""
+    denied = admin_denied()
+    if denied:
+        return denied
+    data = request.json or {}
+    if not data.get('agent_id'):
+        return jsonify({"error": "agent_id is required"}), 400
+    ticket = dispatcher.release(data['agent_id'], ticket_id, resolved=bool(data.get('resolved', True)))
+    logger.info(f"Ticket {ticket_id} released by {data['agent_id']} ({ticket.status})")
+    return jsonify(ticket.to_dict()), 200
+
+
+@api.route('/api/agents', methods=['GET'])
+def list_agents():
+    """Human agents and their current load"""
+    denied = admin_denied()
+    if denied:
+        return denied
+    return jsonify({"agents": dispatcher.agents()}), 200
+
+
+@api.route('/api/agents', methods=['POST'])
+def register_agent():
+    """Add a human agent or change their capacity: {"agent_id", "name"?, "capacity"?}"""
+    denied = admin_denied()
+    if denied:
+        return denied
+    data = request.json or {}
+    capacity = data.get('capacity', 3)
+    if not isinstance(capacity, int) or isinstance(capacity, bool):
+        return jsonify({"error": "capacity must be an integer"}), 400
+    agent = dispatcher.register_agent(data.get('agent_id'), data.get('name'), capacity)
+    return jsonify(agent.to_dict()), 201
+
+
+@api.route('/api/agents/<agent_id>', methods=['DELETE'])
+def remove_agent(agent_id):
+    """Take a human agent offline; their tickets return to the queue"""
+    denied = admin_denied()
+    if denied:
+        return denied
+    dispatcher.remove_agent(agent_id)
+    return jsonify({"message": f"Agent {agent_id} removed"}), 200
+
+
+@api.app_errorhandler(DispatchError)
+def dispatch_error(error):
+    return jsonify({"error": error.reason}), error.status
+
+
+@api.app_errorhandler(404)
 def not_found(error):
     return jsonify({
         "error": "Endpoint not found",
@@ -376,7 +1205,7 @@ def not_found(error):
     }), 404
 
 
-@app.errorhandler(500)
+@api.app_errorhandler(500)
 def internal_error(error):
     return jsonify({
         "error": "Internal server error",
@@ -384,6 +1213,78 @@ def internal_error(error):
     }), 500
 
 
+_services_pid = None
+_services_lock = threading.Lock()
+
+
+def start_process_services():
+    """Start this process's background threads; runs again in a process forked after they started"""
+    global _services_pid
+    if _services_pid == os.getpid():
+        return
+    with _services_lock:
+        if _services_pid != os.getpid():
+            active_sessions.start_sweeper()
+            if transcripts:
+                transcripts.start()
+            _services_pid = os.getpid()
+
+
+def open_model_connection():
+    """Make one cheap model API call so the HTTP client's connection pool is open before traffic"""
+    model = get_agent().model
+    client = getattr(model, "api_client", None)
+    if client is None or not isinstance(getattr(model, "model", None), str):
+        return
+    
+    async def fetch_model():
+        return await client.aio.models.get(model=model.model)
+    
+    try:
+        start = time.perf_counter()
+        get_runtime().run(fetch_model(), timeout=10)
+        logger.info(f"Model connection opened in {(time.perf_counter() - start) * 1000:.0f} ms")
+    except Exception as e:
+        logger.warning(f"Model connection warm-up failed: {e}")
+
+
+def warm_up(connect: bool = True):
+    """Build this process's knowledge base, agent, runner and runtime ahead of the first request
+    
+    Call it after fork (e.g. gunicorn's post_fork hook) so nothing with threads
+    or sockets is inherited from a parent. With connect, also opens the model's
+    HTTP connection.
+    """
+    start = time.perf_counter()
+    start_process_services()
+    get_tools()
+    get_runner()
+    if connect:
+        open_model_connection()
+    logger.info(f"Process {os.getpid()} warmed up in {time.perf_counter() - start:.2f}s")
+
+
+def create_app(config: Dict[str, Any] = None) -> Flask:
+    """Build the Flask app
+    
+    Cheap to call: the agent, runner and knowledge base are built on first use,
+    per process. Set WARMUP in config (or APP_WARMUP=1) to build them, and open
+    the model connection, before returning.
+    """
+    flask_app = Flask(__name__)
+    flask_app.config["WARMUP"] = os.getenv("APP_WARMUP", "0") == "1"
+    flask_app.config.update(config or {})
+    CORS(flask_app)
+    flask_app.register_blueprint(api)
+    
+    if flask_app.config["WARMUP"]:
+        warm_up()
+    return flask_app
+
+
+app = create_app()
+
+
 if __name__ == '__main__':
     print("\n" + "="*60)
     print("FLASK API SERVER STARTING")
@@ -392,19 +1293,33 @@ if __name__ == '__main__':
     print("Endpoints:")
     print("   POST   /api/chat/start")
     print("   POST   /api/chat/message")
-    print("   GET    /api/chat/history/<session_id>")
+    print("   POST   /api/chat/message/stream")
+    print("   POST   /api/chat/batch")
+    print("   GET    /api/chat/history/<session_id>?after=&limit=&wait=")
+    print("   GET    /api/chat/transcript/<session_id>?since=&until=&limit=  (X-Admin-Token)")
     print("   POST   /api/chat/end/<session_id>")
-    print("   GET    /api/sessions/active")
+    print("   GET    /api/sessions/active?user_id=&escalation=&idle_minutes=&cursor=")
+    print("   GET    /api/escalations  GET /api/escalations/<ticket_id>  (X-Admin-Token)")
+    print("   POST   /api/escalations/claim  (X-Admin-Token)")
+    print("   POST   /api/escalations/<ticket_id>/release  (X-Admin-Token)")
+    print("   GET    /api/agents  POST /api/agents  DELETE /api/agents/<agent_id>  (X-Admin-Token)")
     print("   GET    /health")
+    print("   GET    /metrics")
+    print("   WS     ws://localhost:5001  (auth once, then messages, deltas, escalations)")
     print("="*60)
     print("Configuration:")
-    print("   - Event loop policy: WindowsSelectorEventLoop")
+    print("   - Event loop: single long-lived runtime thread")
+    print(f"   - Sessions: max {active_sessions.max_sessions}, idle TTL {active_sessions.idle_ttl:.0f}s")
     print("   - Runtime warnings: SUPPRESSED")
     print("   - Debug mode: OFF (production)")
-    print("Note: Event loop cleanup errors may appear")
-    print("   (These are harmless and don't affect functionality)")
     print("="*60 + "\n")
     
+    if os.getenv("WS_ENABLED", "1") == "1":
+        # ws_server does `import app`; make that this module rather than a second copy of it
+        sys.modules.setdefault("app", sys.modules[__name__])
+        from ws_server import ChatSocketServer
+        ChatSocketServer.from_env().start_in_thread()
+    
     app.run(
         host='0.0.0.0',
         port=5000,
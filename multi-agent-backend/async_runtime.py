@@ -0,0 +1,115 @@
+"""
+Long-lived asyncio runtime for the ADK runner and session service.
+
+A single event loop runs on a dedicated daemon thread for the lifetime of the
+process. Flask handlers (which are synchronous) submit coroutines to it instead
+of creating and closing a fresh event loop on every request. Submitted work
+runs with the caller's context variables (e.g. the request's model deadline).
+"""
+
+import asyncio
+import contextvars
+import logging
+import queue
+import threading
+from typing import Any, AsyncIterator, Awaitable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+_STREAM_DONE = object()
+
+
+def _with_caller_context(coro: Awaitable[Any]) -> Awaitable[Any]:
+    """Wrap coro so it runs with a copy of the calling thread's context variables"""
+    context = contextvars.copy_context()
+
+    async def bound():
+        for var, value in context.items():
+            var.set(value)
+        return await coro
+    return bound()
+
+
+class AsyncRuntime:
+    """Owns one event loop running forever on a background thread"""
+
+    def __init__(self, name: str = "adk-async-runtime"):
+        self.loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run_loop, name=name, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(self._ready.set)
+        self.loop.run_forever()
+
+    def run(self, coro: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+        """Run a coroutine on the runtime loop and block until it finishes"""
+        future = asyncio.run_coroutine_threadsafe(_with_caller_context(coro), self.loop)
+        try:
+            return future.result(timeout)
+        except Exception:
+            future.cancel()
+            raise
+
+    def iterate(self, agen: AsyncIterator[Any], max_buffer: int = 64) -> Iterator[Any]:
+        """Consume an async generator on the runtime loop from a synchronous caller"""
+        items: "queue.Queue[Any]" = queue.Queue(maxsize=max_buffer)
+        closed = threading.Event()
+
+        def put_blocking(item):
+            # Runs in the default executor so a slow consumer never stalls the loop
+            while not closed.is_set():
+                try:
+                    items.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+
+        async def put(item):
+            try:
+                items.put_nowait(item)
+            except queue.Full:
+                await self.loop.run_in_executor(None, put_blocking, item)
+
+        async def pump():
+            try:
+                async for item in agen:
+                    await put(item)
+            except Exception as e:
+                await put(_StreamError(e))
+            finally:
+                await put(_STREAM_DONE)
+
+        future = asyncio.run_coroutine_threadsafe(_with_caller_context(pump()), self.loop)
+        try:
+            while True:
+                item = items.get()
+                if item is _STREAM_DONE:
+                    break
+                if isinstance(item, _StreamError):
+                    raise item.error
+                yield item
+        finally:
+            closed.set()
+            if not future.done():
+                future.cancel()
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the loop and wait for the runtime thread to exit"""
+        if self.loop.is_closed():
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+        if not self._thread.is_alive():
+            self.loop.close()
+        logger.info("Async runtime stopped")
+
+
+class _StreamError:
+    """Carries an exception raised inside an async generator across threads"""
+
+    def __init__(self, error: BaseException):
+        self.error = error
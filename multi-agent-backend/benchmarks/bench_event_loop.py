@@ -0,0 +1,91 @@
+"""
+Benchmark: per-request event loop vs. the long-lived AsyncRuntime
+
+Drives ADK session creation (the work /api/chat/start does) from a pool of
+request threads, first with a fresh event loop per call (the old behaviour)
+and then through the shared runtime loop, and reports requests/sec.
+
+Usage:
+    python benchmarks/bench_event_loop.py --requests 5000 --concurrency 32
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.adk.sessions import InMemorySessionService
+from async_runtime import AsyncRuntime
+
+
+def create_with_new_loop(session_service):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_until_complete(session_service.create_session(
+            app_name="bench",
+            user_id="bench_user",
+            session_id=str(uuid.uuid4())
+        ))
+    finally:
+        loop.close()
+
+
+def create_with_runtime(session_service, runtime):
+    runtime.run(session_service.create_session(
+        app_name="bench",
+        user_id="bench_user",
+        session_id=str(uuid.uuid4())
+    ))
+
+
+def run_scenario(name, fn, total, concurrency):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda _: fn(), range(total)))
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} {total / elapsed:>10.0f} req/s   ({elapsed:.2f}s for {total} requests)")
+    return total / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"EVENT LOOP BENCHMARK ({args.requests} requests, {args.concurrency} threads)")
+    print("=" * 60)
+
+    legacy_service = InMemorySessionService()
+    before = run_scenario(
+        "new loop per request",
+        lambda: create_with_new_loop(legacy_service),
+        args.requests,
+        args.concurrency
+    )
+
+    runtime = AsyncRuntime()
+    try:
+        shared_service = InMemorySessionService()
+        after = run_scenario(
+            "shared AsyncRuntime",
+            lambda: create_with_runtime(shared_service, runtime),
+            args.requests,
+            args.concurrency
+        )
+    finally:
+        runtime.stop()
+
+    print("-" * 60)
+    print(f"Speedup: {after / before:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
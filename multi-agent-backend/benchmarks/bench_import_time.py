@@ -0,0 +1,118 @@
+"""
+Benchmark: import time of the API module
+
+Runs `python -X importtime -c "import app"` in fresh interpreters and reports
+the median cumulative import time of app, the top-level packages that cost
+the most, and, for comparison, how long warm_up() then takes to build the
+knowledge base, agent and runner that are no longer built at import.
+
+Results can be saved with --save and checked against a saved run with
+--baseline; the exit status is 1 if import time regressed by more than
+--max-regression.
+
+Usage:
+    python benchmarks/bench_import_time.py --runs 5 --save import_time.json
+    python benchmarks/bench_import_time.py --baseline import_time.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run(code: str, importtime: bool = False) -> Tuple[float, str]:
+    env = dict(os.environ)
+    env.setdefault("GOOGLE_API_KEY", "benchmark")
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", code]
+    start = time.perf_counter()
+    result = subprocess.run(command, cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True)
+    return time.perf_counter() - start, result.stderr
+
+
+def parse_importtime(stderr: str) -> Dict[str, Tuple[int, int]]:
+    """module -> (self us, cumulative us)"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="packages to list")
+    parser.add_argument("--no-warm-up", action="store_true", help="skip timing warm_up()")
+    parser.add_argument("--save", help="write the results as JSON")
+    parser.add_argument("--baseline", help="JSON from an earlier --save to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed slowdown vs baseline")
+    args = parser.parse_args()
+
+    import_ms, wall_ms = [], []
+    package_ms = defaultdict(list)
+    for _ in range(args.runs):
+        wall, stderr = run("import app", importtime=True)
+        modules = parse_importtime(stderr)
+        import_ms.append(modules["app"][1] / 1000)
+        wall_ms.append(wall * 1000)
+        totals = defaultdict(int)
+        for name, (self_us, _) in modules.items():
+            totals[name.split(".")[0]] += self_us
+        for package, total in totals.items():
+            package_ms[package].append(total / 1000)
+
+    results = {
+        "import_app_ms": round(statistics.median(import_ms), 1),
+        "interpreter_wall_ms": round(statistics.median(wall_ms), 1),
+        "packages_ms": {
+            package: round(statistics.median(times), 1)
+            for package, times in sorted(package_ms.items(), key=lambda item: -statistics.median(item[1]))[:args.top]
+        }
+    }
+    if not args.no_warm_up:
+        code = ("import time, app; start = time.perf_counter(); app.warm_up(connect=False); "
+                "print((time.perf_counter() - start) * 1000)")
+        samples = [float(subprocess.run(
+            [sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True,
+            env=dict(os.environ, GOOGLE_API_KEY=os.getenv("GOOGLE_API_KEY", "benchmark")), check=True
+        ).stdout.strip().splitlines()[-1]) for _ in range(max(1, args.runs // 2))]
+        results["warm_up_ms"] = round(statistics.median(samples), 1)
+
+    print("=" * 60)
+    print(f"IMPORT TIME (median of {args.runs} fresh interpreters)")
+    print("=" * 60)
+    print(f"import app:              {results['import_app_ms']:>8.1f} ms")
+    print(f"interpreter + import:    {results['interpreter_wall_ms']:>8.1f} ms")
+    if "warm_up_ms" in results:
+        print(f"warm_up() afterwards:    {results['warm_up_ms']:>8.1f} ms")
+    print("\nSlowest top-level packages (self time, all imports):")
+    for package, ms in results["packages_ms"].items():
+        print(f"  {package:<28} {ms:>8.1f} ms")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved to {args.save}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        change = results["import_app_ms"] / baseline["import_app_ms"] - 1
+        print(f"\nvs baseline: {baseline['import_app_ms']:.1f} ms -> {results['import_app_ms']:.1f} ms ({change:+.0%})")
+        if change > args.max_regression:
+            print(f"Import time regressed by more than {args.max_regression:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
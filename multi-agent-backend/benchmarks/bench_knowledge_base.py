@@ -0,0 +1,85 @@
+"""
+Benchmark: knowledge base indexing and BM25 lookup latency
+
+Builds a synthetic corpus of support articles and times index construction
+and per-query search latency.
+
+Usage:
+    python benchmarks/bench_knowledge_base.py --articles 100000 --queries 2000
+"""
+
+import argparse
+import itertools
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from knowledge_base import KnowledgeBase, DEFAULT_CATEGORIES
+
+VOCABULARY = (
+    "router modem wifi signal cable outage slow speed latency password reset "
+    "invoice refund charge payment card subscription plan upgrade downgrade "
+    "crash freeze login update install cache sync notification battery "
+    "token endpoint quota timeout webhook certificate dns firewall account"
+).split()
+
+
+def zipf_vocabulary(size):
+    """Support words plus synthetic product/error terms, most frequent first"""
+    words = VOCABULARY + [f"term{i}" for i in range(size - len(VOCABULARY))]
+    cum_weights = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(len(words))))
+    return words, cum_weights
+
+
+def synthetic_articles(count, words, cum_weights, seed=7):
+    rng = random.Random(seed)
+    categories = list(DEFAULT_CATEGORIES) + ["account", "security", "hardware", "shipping"]
+    for i in range(count):
+        picked = rng.choices(words, cum_weights=cum_weights, k=31)
+        yield {
+            "id": f"kb-{i:06d}",
+            "category": rng.choice(categories),
+            "title": " ".join(picked[:3]),
+            "solutions": [f"Check {w}" for w in picked[3:6]],
+            "body": " ".join(picked[6:])
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--articles", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--vocabulary", type=int, default=50000)
+    parser.add_argument("--top-k", type=int, default=3)
+    args = parser.parse_args()
+
+    words, cum_weights = zipf_vocabulary(args.vocabulary)
+
+    start = time.perf_counter()
+    kb = KnowledgeBase(synthetic_articles(args.articles, words, cum_weights))
+    build_s = time.perf_counter() - start
+
+    rng = random.Random(11)
+    queries = [" ".join(rng.choices(words, cum_weights=cum_weights, k=rng.randint(1, 4))) for _ in range(args.queries)]
+    latencies = []
+    for query in queries:
+        t0 = time.perf_counter()
+        kb.search(query, top_k=args.top_k)
+        latencies.append((time.perf_counter() - t0) * 1000)
+
+    latencies.sort()
+    print("=" * 60)
+    print(f"KNOWLEDGE BASE BENCHMARK ({len(kb)} articles)")
+    print("=" * 60)
+    print(f"Index build:  {build_s:.2f}s")
+    print(f"Query p50:    {statistics.median(latencies):.3f} ms")
+    print(f"Query p95:    {latencies[int(len(latencies) * 0.95) - 1]:.3f} ms")
+    print(f"Query p99:    {latencies[int(len(latencies) * 0.99) - 1]:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""
+Offline load test of the Flask API with a fake LLM
+
+Swaps the Gemini model on the support agent for benchmarks/fake_llm.FakeLlm,
+serves app.py on a local port with Werkzeug's threaded server and drives it
+with concurrent HTTP clients. Everything runs on this machine; no API key or
+network access is needed.
+
+Scenarios:
+    new_sessions   start a session, send one message, end it
+    long_chats     keep sessions open and send many turns to each
+    escalations    messages that ask for a human, so the model calls escalate_to_human
+
+Reports p50/p95/p99 latency, requests/sec and RSS growth per scenario.
+
+Usage:
+    python benchmarks/bench_load.py --concurrency 32 --requests 500 --llm-latency 0.2
+"""
+
+import argparse
+import itertools
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Measure the model path itself unless asked otherwise; set before app is imported
+os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+os.environ.setdefault("USER_RATE_PER_MINUTE", "1000000")
+os.environ.setdefault("USER_RATE_BURST", "1000000")
+
+import requests
+
+TOPICS = [
+    "my internet keeps dropping", "I was charged twice on my invoice", "the app crashes on launch",
+    "api requests return 401", "router lights are blinking red", "payment method was declined",
+    "app will not sync my data", "webhook deliveries are failing"
+]
+ESCALATION_MESSAGES = [
+    "I need to talk to a human about this", "please let me speak to a manager",
+    "escalate this to a person right now"
+]
+
+
+def rss_mb() -> float:
+    """Current resident set size of this process in MB"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Client:
+    """One keep-alive HTTP connection per worker thread"""
+
+    _local = threading.local()
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+
+    @property
+    def http(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def post(self, path: str, payload=None):
+        response = self.http.post(self.base_url + path, json=payload or {}, timeout=120)
+        response.raise_for_status()
+        return response.json()
+
+    def start(self, user_id: str) -> str:
+        return self.post("/api/chat/start", {"user_id": user_id})["session_id"]
+
+    def message(self, session_id: str, user_id: str, text: str):
+        return self.post("/api/chat/message", {"session_id": session_id, "user_id": user_id, "message": text})
+
+    def end(self, session_id: str):
+        return self.post(f"/api/chat/end/{session_id}")
+
+
+def new_session_flow(client: Client, i: int):
+    user_id = f"load-user-{i}"
+    session_id = client.start(user_id)
+    client.message(session_id, user_id, f"{TOPICS[i % len(TOPICS)]} (ticket {i})")
+    client.end(session_id)
+
+
+def make_long_chat_flow(client: Client, sessions: int, turns_per_request: int = 1):
+    users = [f"long-user-{i}" for i in range(sessions)]
+    session_ids = [client.start(user_id) for user_id in users]
+    locks = [threading.Lock() for _ in range(sessions)]
+    counter = itertools.count()
+
+    def flow(i: int):
+        idx = i % sessions
+        # A real client never sends two turns of one conversation at once
+        with locks[idx]:
+            for _ in range(turns_per_request):
+                turn = next(counter)
+                client.message(session_ids[idx], users[idx], f"{TOPICS[turn % len(TOPICS)]} (turn {turn})")
+
+    return flow
+
+
+def escalation_flow(client: Client, i: int):
+    user_id = f"escalation-user-{i}"
+    session_id = client.start(user_id)
+    client.message(session_id, user_id, f"{ESCALATION_MESSAGES[i % len(ESCALATION_MESSAGES)]} (ticket {i})")
+    client.end(session_id)
+
+
+def run_scenario(name: str, flow, total: int, concurrency: int):
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def timed(i):
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            flow(i)
+        except Exception:
+            with lock:
+                errors += 1
+            return
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            latencies.append(elapsed)
+
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(timed, range(total)))
+    elapsed = time.perf_counter() - start
+    rss_after = rss_mb()
+
+    latencies.sort()
+
+    def pct(p):
+        return latencies[max(0, int(len(latencies) * p) - 1)] if latencies else float("nan")
+
+    print(
+        f"{name:<14} {total / elapsed:>8.1f} flows/s  "
+        f"p50 {statistics.median(latencies) if latencies else float('nan'):>8.1f} ms  "
+        f"p95 {pct(0.95):>8.1f} ms  p99 {pct(0.99):>8.1f} ms  "
+        f"errors {errors:>4}  RSS {rss_before:.0f} -> {rss_after:.0f} MB ({rss_after - rss_before:+.1f})"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500, help="Flows per scenario")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Fake first-token latency (s)")
+    parser.add_argument("--token-latency", type=float, default=0.002, help="Fake per-token latency (s)")
+    parser.add_argument("--long-sessions", type=int, default=16, help="Sessions reused by long_chats")
+    parser.add_argument("--keep-shortcuts", action="store_true",
+                        help="Leave the fast path and response cache on (off by default)")
+    parser.add_argument("--port", type=int, default=5099)
+    args = parser.parse_args()
+
+    if not args.keep_shortcuts:
+        os.environ.setdefault("FAST_PATH_ENABLED", "0")
+        os.environ.setdefault("RESPONSE_CACHE_ENABLED", "0")
+    os.environ.setdefault("MAX_CONCURRENT_MODEL_CALLS", str(args.concurrency))
+    os.environ.setdefault("MODEL_QUEUE_SIZE", str(args.concurrency * 4))
+
+    import logging
+    import warnings
+    logging.disable(logging.WARNING)
+    warnings.filterwarnings("ignore", category=UserWarning)
+
+    import main as support
+    from fake_llm import FakeLlm
+    support.support_agent.model = FakeLlm(first_token_latency=args.llm_latency, token_latency=args.token_latency)
+
+    import app as api
+    from werkzeug.serving import make_server
+
+    server = make_server("127.0.0.1", args.port, api.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = Client(f"http://127.0.0.1:{args.port}")
+
+    print("=" * 100)
+    print(f"OFFLINE LOAD TEST ({args.requests} flows/scenario, {args.concurrency} clients, "
+          f"fake LLM {args.llm_latency * 1000:.0f} ms first token)")
+    print("=" * 100)
+    try:
+        run_scenario("new_sessions", lambda i: new_session_flow(client, i), args.requests, args.concurrency)
+        run_scenario("long_chats", make_long_chat_flow(client, args.long_sessions), args.requests,
+                     min(args.concurrency, args.long_sessions))
+        run_scenario("escalations", lambda i: escalation_flow(client, i), args.requests, args.concurrency)
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
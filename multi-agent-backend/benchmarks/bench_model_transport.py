@@ -0,0 +1,175 @@
+"""
+Benchmark: model HTTP transport against a local mock Gemini server
+
+Sends the same generateContent load through google-genai clients built three
+ways and reports latency percentiles and how many TCP connections the server
+saw:
+
+    default         genai's own HTTP client
+    pooled          ModelTransport, keep-alive pool
+    pooled+hedge    ModelTransport with hedging at the recent p95
+
+The mock answers in --latency seconds, except --slow-fraction of calls which
+take --slow-latency, so hedging has a tail to cut. It then checks that an
+expired deadline fails fast, and with --through-app, runs chat turns through
+the Flask app with GEMINI_BASE_URL pointed at the mock and prints the pool
+gauges from /metrics.
+
+Usage:
+    python benchmarks/bench_model_transport.py --requests 1000 --concurrency 16
+    python benchmarks/bench_model_transport.py --through-app 50
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_gemini import MockGemini  # noqa: E402
+
+MODEL = "gemini-2.5-flash"
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def drive(client, requests: int, concurrency: int) -> List[float]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await client.aio.models.generate_content(model=MODEL, contents="My internet keeps dropping")
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return latencies
+
+
+def run_scenario(name: str, mock: MockGemini, args, transport=None) -> Dict[str, float]:
+    from google import genai
+    from google.genai import types
+
+    if transport is None:
+        client = genai.Client(api_key="benchmark", http_options=types.HttpOptions(base_url=mock.base_url))
+    else:
+        client = transport.genai_client(api_key="benchmark", base_url=mock.base_url)
+    before = dict(mock.counters)
+    start = time.perf_counter()
+    latencies = asyncio.run(drive(client, args.requests, args.concurrency))
+    elapsed = time.perf_counter() - start
+    row = {
+        "p50": percentile(latencies, 0.50) * 1000,
+        "p95": percentile(latencies, 0.95) * 1000,
+        "p99": percentile(latencies, 0.99) * 1000,
+        "mean": statistics.mean(latencies) * 1000,
+        "rps": len(latencies) / elapsed,
+        "connections": mock.counters["connections"] - before["connections"],
+        "server_requests": mock.counters["requests"] - before["requests"]
+    }
+    print(f"{name:<14} p50 {row['p50']:>7.1f} ms  p95 {row['p95']:>7.1f} ms  p99 {row['p99']:>7.1f} ms  "
+          f"{row['rps']:>7.1f} req/s  {row['connections']:>4} connections  "
+          f"{row['server_requests']:>6} server requests")
+    if transport is not None and transport.hedge:
+        stats = transport.stats()
+        print(f"{'':<14} hedged {stats['hedged']} ({stats['hedged'] / max(1, stats['requests']):.1%}), "
+              f"hedge answered first {stats['hedge_won']}, p95 used {stats['p95_seconds']}s")
+    return row
+
+
+def check_deadline(mock: MockGemini):
+    from model_transport import DeadlineExceeded, ModelTransport, reset_deadline, set_deadline
+
+    transport = ModelTransport(http2=False)
+    client = transport.genai_client(api_key="benchmark", base_url=mock.base_url)
+    slow_fraction, mock.slow_fraction = mock.slow_fraction, 1.0
+
+    async def call():
+        token = set_deadline(0.2)
+        try:
+            await client.aio.models.generate_content(model=MODEL, contents="hello")
+        finally:
+            reset_deadline(token)
+
+    start = time.perf_counter()
+    try:
+        asyncio.run(call())
+        outcome = "completed (deadline not enforced!)"
+    except DeadlineExceeded:
+        outcome = "DeadlineExceeded"
+    mock.slow_fraction = slow_fraction
+    print(f"Deadline 200 ms vs {mock.slow_latency * 1000:.0f} ms reply: {outcome} "
+          f"after {(time.perf_counter() - start) * 1000:.0f} ms")
+
+
+def through_app(mock: MockGemini, turns: int, concurrency: int):
+    os.environ["GEMINI_BASE_URL"] = mock.base_url
+    os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+    os.environ.setdefault("FAST_PATH_ENABLED", "0")
+    os.environ.setdefault("RESPONSE_CACHE_ENABLED", "0")
+    os.environ.setdefault("USER_RATE_BURST", "1000000")
+
+    import logging
+    logging.disable(logging.WARNING)
+    import app as api
+
+    client = api.app.test_client()
+
+    def turn(i: int) -> float:
+        session_id = client.post("/api/chat/start", json={"user_id": f"user-{i}"}).get_json()["session_id"]
+        start = time.perf_counter()
+        reply = client.post("/api/chat/message", json={
+            "session_id": session_id, "user_id": f"user-{i}", "message": f"Question number {i} about my account"
+        }).get_json()
+        assert reply["agent_response"] != api.FALLBACK_RESPONSE, reply
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        latencies = list(pool.map(turn, range(turns)))
+    print(f"Through app: {turns} turns, p50 {percentile(latencies, 0.5) * 1000:.1f} ms, "
+          f"p95 {percentile(latencies, 0.95) * 1000:.1f} ms")
+    for line in client.get("/metrics").get_data(as_text=True).splitlines():
+        if line.startswith(("support_model_pool", "support_model_requests_in_flight", "support_model_http_seconds_count")):
+            print(f"  {line}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--slow-fraction", type=float, default=0.05)
+    parser.add_argument("--slow-latency", type=float, default=1.0)
+    parser.add_argument("--pool-size", type=int, default=16)
+    parser.add_argument("--through-app", type=int, default=0, metavar="TURNS",
+                        help="also run this many chat turns through the Flask app")
+    args = parser.parse_args()
+
+    from model_transport import ModelTransport
+
+    mock = MockGemini(latency=args.latency, slow_fraction=args.slow_fraction,
+                      slow_latency=args.slow_latency).start()
+    print("=" * 100)
+    print(f"MODEL TRANSPORT ({args.requests} requests, {args.concurrency} concurrent, mock "
+          f"{args.latency * 1000:.0f} ms / {args.slow_fraction:.0%} at {args.slow_latency * 1000:.0f} ms)")
+    print("=" * 100)
+    run_scenario("default", mock, args)
+    run_scenario("pooled", mock, args, ModelTransport(pool_size=args.pool_size, http2=False))
+    run_scenario("pooled+hedge", mock, args, ModelTransport(pool_size=args.pool_size, http2=False, hedge=True))
+    check_deadline(mock)
+    if args.through_app:
+        through_app(mock, args.through_app, min(args.concurrency, 8))
+    mock.stop()
+
+
+if __name__ == "__main__":
+    main()
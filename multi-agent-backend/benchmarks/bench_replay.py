@@ -0,0 +1,98 @@
+"""
+Replay recorded runner event streams through /api/chat/message
+
+Takes a recording made with RUNNER_MODE=record (see event_replay.py) and
+sends every recorded user message back through send_message, with the
+recorded events standing in for the model. Reports throughput and latency,
+and checks that the reply extracted from each replayed stream is the text of
+its final recorded event, which catches regressions in response extraction.
+
+Usage:
+    RUNNER_MODE=record python app.py          # capture some traffic first
+    python benchmarks/bench_replay.py runner_events.jsonl --speed 0 --concurrency 16
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def expected_reply(turn) -> str:
+    """Text of the last non-partial recorded event, as a client would see it"""
+    for recorded in reversed(turn["events"]):
+        event = recorded["event"]
+        if event.get("partial"):
+            continue
+        parts = (event.get("content") or {}).get("parts") or []
+        return " ".join(str(part["text"]) for part in parts if part.get("text")).strip()
+    return ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recording", help="File written by RUNNER_MODE=record")
+    parser.add_argument("--speed", type=float, default=0, help="1 = original timing, 0 = as fast as possible")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--repeat", type=int, default=1, help="Play the recording this many times")
+    args = parser.parse_args()
+
+    os.environ["RUNNER_MODE"] = "replay"
+    os.environ["RUNNER_RECORDING"] = args.recording
+    os.environ["REPLAY_SPEED"] = str(args.speed)
+    os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+    # Every turn should reach the replayed runner
+    os.environ.setdefault("FAST_PATH_ENABLED", "0")
+    os.environ.setdefault("RESPONSE_CACHE_ENABLED", "0")
+    os.environ.setdefault("USER_RATE_PER_MINUTE", "1000000")
+    os.environ.setdefault("USER_RATE_BURST", "1000000")
+    os.environ.setdefault("MAX_CONCURRENT_MODEL_CALLS", str(args.concurrency))
+
+    import logging
+    logging.disable(logging.WARNING)
+
+    from event_replay import read_recording
+    import app as api
+
+    turns = [turn for turn in read_recording(args.recording) if turn.get("message")] * args.repeat
+    client = api.app.test_client()
+    latencies = []
+    mismatches = []
+
+    def play(index: int):
+        turn = turns[index]
+        user_id = f"replay-{index}"
+        session_id = client.post("/api/chat/start", json={"user_id": user_id}).get_json()["session_id"]
+        start = time.perf_counter()
+        reply = client.post("/api/chat/message", json={
+            "session_id": session_id, "user_id": user_id, "message": turn["message"]
+        }).get_json().get("agent_response", "")
+        latencies.append((time.perf_counter() - start) * 1000)
+        expected = expected_reply(turn)
+        if expected and reply != expected:
+            mismatches.append((turn["message"], expected, reply))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(play, range(len(turns))))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print("=" * 60)
+    print(f"REPLAY ({len(turns)} turns, speed {args.speed or 'max'}, {args.concurrency} threads)")
+    print("=" * 60)
+    if latencies:
+        print(f"Throughput:  {len(turns) / elapsed:.1f} turns/s")
+        print(f"Latency p50: {latencies[len(latencies) // 2]:.1f} ms")
+        print(f"Latency p99: {latencies[max(0, int(len(latencies) * 0.99) - 1)]:.1f} ms")
+    print(f"Extraction mismatches: {len(mismatches)}")
+    for message, expected, reply in mismatches[:5]:
+        print(f"  {message[:40]!r}: expected {expected[:40]!r}, got {reply[:40]!r}")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmark: memory per session, dict-of-dicts vs SessionStore records
+
+Fills a session table with N sessions of T turns each in the old layout
+(a dict per session and per message, three ISO-8601 strings per turn) and in
+session_store's layout (__slots__ SessionRecord / Message with epoch floats),
+each in a fresh subprocess, and reports resident memory per session. Message
+text is drawn from a small shared pool, so the numbers are the per-session
+and per-message overhead on top of the text itself.
+
+Usage:
+    python benchmarks/bench_session_memory.py --sessions 100000 --turns 20
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TEXTS = [f"customer message variant {i}: my connection keeps dropping" for i in range(64)]
+
+
+def rss_bytes() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def build_dicts(sessions: int, turns: int):
+    table = {}
+    for i in range(sessions):
+        history = []
+        session = {
+            "user_id": f"user-{i}",
+            "created_at": datetime.now().isoformat(),
+            "message_count": 0,
+            "conversation_history": history
+        }
+        for t in range(turns):
+            session["message_count"] += 1
+            session["last_activity"] = datetime.now().isoformat()
+            history.append({"role": "user", "content": TEXTS[t % 64], "timestamp": datetime.now().isoformat()})
+            history.append({"role": "agent", "content": TEXTS[-t % 64], "timestamp": datetime.now().isoformat()})
+        table[str(uuid.uuid4())] = session
+    return table
+
+
+def build_records(sessions: int, turns: int):
+    from session_store import SessionRecord, SessionStore
+
+    table = SessionStore(max_sessions=sessions)
+    for i in range(sessions):
+        record = SessionRecord(f"user-{i}")
+        for t in range(turns):
+            now = time.time()
+            record.message_count += 1
+            record.last_activity = now
+            record.add_message("user", TEXTS[t % 64], now)
+            record.add_message("agent", TEXTS[-t % 64], now)
+        table[str(uuid.uuid4())] = record
+    return table
+
+
+def measure(layout: str, sessions: int, turns: int):
+    build = build_dicts if layout == "dict" else build_records
+    before = rss_bytes()
+    start = time.perf_counter()
+    table = build(sessions, turns)
+    elapsed = time.perf_counter() - start
+    print(f"{rss_bytes() - before} {elapsed:.2f} {len(table)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=100000)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--layout", choices=["dict", "record"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.layout:
+        measure(args.layout, args.sessions, args.turns)
+        return
+
+    print("=" * 60)
+    print(f"SESSION TABLE MEMORY ({args.sessions} sessions x {args.turns} turns)")
+    print("=" * 60)
+    results = {}
+    for layout, label in (("dict", "dict of dicts"), ("record", "SessionStore records")):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--layout", layout,
+             "--sessions", str(args.sessions), "--turns", str(args.turns)],
+            check=True, capture_output=True, text=True
+        ).stdout.split()
+        grown, elapsed = int(output[0]), float(output[1])
+        results[layout] = grown
+        print(f"{label:<22} {grown / args.sessions:>8.0f} bytes/session  "
+              f"{grown / (1024 * 1024):>8.1f} MB total  built in {elapsed:.1f}s")
+    print(f"Reduction: {results['dict'] / max(1, results['record']):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Benchmark: transcript archive appends and reads
+
+Appends --records chat turns from --threads threads (standing in for request
+threads) to a TranscriptArchive in a scratch directory, and reports:
+
+- how long append_turn() takes on the calling thread (what a request pays);
+- how long until everything is on disk, and how many fsyncs it took (group
+  commit batches many records per fsync);
+- the same for a synchronous writer that writes and fsyncs each record under
+  a lock before returning, for comparison.
+
+Segments are kept small (--segment-kb) so the run rotates and seals many of
+them; then it times reading one session's transcript, a time range and the
+whole archive through TranscriptReader.
+
+Usage:
+    python benchmarks/bench_transcript_archive.py --records 20000 --threads 16
+    python benchmarks/bench_transcript_archive.py --no-fsync
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from transcript_archive import TranscriptArchive, TranscriptReader  # noqa: E402
+
+REPLY = ("I understand you're having an internet issue. Here's how to fix it:\n\n"
+         "1. Restart your router\n2. Check cable connections\n3. Run a speed test\n\n"
+         "This should take about 5 minutes.")
+
+
+class SyncWriter:
+    """Write and fsync every record before returning, one writer at a time"""
+
+    def __init__(self, path: str, fsync: bool):
+        self.file = open(path, "ab")
+        self.fsync = fsync
+        self.lock = threading.Lock()
+        self.fsyncs = 0
+
+    def append_turn(self, session_id: str, user_id: str, message: str, reply: str, served_by: str):
+        line = json.dumps({"ts": time.time(), "type": "turn", "session_id": session_id, "user_id": user_id,
+                           "message": message, "reply": reply, "served_by": served_by},
+                          separators=(",", ":")).encode() + b"\n"
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+            if self.fsync:
+                os.fsync(self.file.fileno())
+                self.fsyncs += 1
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def drive(append: Callable, records: int, threads: int, sessions: int) -> List[float]:
+    per_thread = records // threads
+    latencies: List[List[float]] = [[] for _ in range(threads)]
+
+    def worker(t: int):
+        own = latencies[t]
+        for i in range(per_thread):
+            n = t * per_thread + i
+            start = time.perf_counter()
+            append(f"session-{n % sessions:05d}", f"user-{n % sessions:05d}", f"Message {n}: my internet keeps dropping",
+                   REPLY, "llm")
+            own.append(time.perf_counter() - start)
+
+    pool = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return [latency for own in latencies for latency in own]
+
+
+def report(name: str, latencies: List[float], durable_seconds: float, fsyncs: int):
+    print(f"{name:<12} append p50 {percentile(latencies, 0.5) * 1e6:>8.1f} us  "
+          f"p99 {percentile(latencies, 0.99) * 1e6:>8.1f} us  max {max(latencies) * 1e3:>7.2f} ms  "
+          f"all durable {durable_seconds:>6.2f}s ({len(latencies) / durable_seconds:>8,.0f}/s)  {fsyncs:>6} fsyncs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--segment-kb", type=int, default=256)
+    parser.add_argument("--no-fsync", action="store_true")
+    args = parser.parse_args()
+    fsync = not args.no_fsync
+
+    directory = tempfile.mkdtemp(prefix="transcripts-")
+    try:
+        print("=" * 100)
+        print(f"TRANSCRIPT ARCHIVE ({args.records} records, {args.threads} threads, fsync {'on' if fsync else 'off'})")
+        print("=" * 100)
+
+        sync = SyncWriter(os.path.join(directory, "sync.log"), fsync)
+        start = time.perf_counter()
+        latencies = drive(sync.append_turn, args.records, args.threads, args.sessions)
+        report("synchronous", latencies, time.perf_counter() - start, sync.fsyncs)
+        sync.file.close()
+
+        archive = TranscriptArchive(os.path.join(directory, "archive"), segment_bytes=args.segment_kb * 1024,
+                                    fsync=fsync)
+        archive.start()
+        start = time.perf_counter()
+        latencies = drive(archive.append_turn, args.records, args.threads, args.sessions)
+        archive.flush()
+        report("write-behind", latencies, time.perf_counter() - start, archive.counters["fsyncs"])
+        archive.close()
+        stats = archive.stats()
+        print(f"{'':<12} {stats['batches']} batches, {stats['written'] / max(1, stats['batches']):.0f} records "
+              f"per batch on average, {stats['segments_sealed']} segments sealed, {stats['dropped']} dropped")
+
+        reader = TranscriptReader(archive.directory)
+        segments = reader.segments()
+        first, last = segments[0]["index"]["first_ts"], segments[-1]["index"]["last_ts"]
+        print(f"\nReads over {len(segments)} segments:")
+        timings = [
+            ("one session", lambda: list(reader.scan(session_id="session-00042"))),
+            ("middle 10%", lambda: list(reader.scan(since=first + 0.45 * (last - first),
+                                                    until=first + 0.55 * (last - first)))),
+            ("everything", lambda: list(reader.scan()))
+        ]
+        for name, read in timings:
+            start = time.perf_counter()
+            records = read()
+            print(f"  {name:<12} {len(records):>7} records in {(time.perf_counter() - start) * 1000:>8.1f} ms")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark: hashed n-gram vector index build, mmap load and query latency
+
+Builds the vector index for a synthetic knowledge base, saves it to a temporary
+directory, reopens it through mmap (what the backend does at startup) and
+times free-text queries scored with one matrix-vector product each.
+
+Usage:
+    python benchmarks/bench_vector_index.py --articles 100000 --queries 500
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from knowledge_base import KnowledgeBase
+from vector_index import VectorIndex
+from bench_knowledge_base import synthetic_articles, zipf_vocabulary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--articles", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--vocabulary", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=2048)
+    args = parser.parse_args()
+
+    words, cum_weights = zipf_vocabulary(args.vocabulary)
+    kb = KnowledgeBase(synthetic_articles(args.articles, words, cum_weights))
+
+    start = time.perf_counter()
+    index = VectorIndex.build(kb, dim=args.dim)
+    build_s = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as tmp:
+        prefix = os.path.join(tmp, "kb_vectors")
+        index.save(prefix)
+        del index
+
+        start = time.perf_counter()
+        index = VectorIndex.load(prefix)
+        load_ms = (time.perf_counter() - start) * 1000
+
+        rng = random.Random(11)
+        queries = [
+            " ".join(rng.choices(words, cum_weights=cum_weights, k=rng.randint(2, 8)))
+            for _ in range(args.queries)
+        ]
+        latencies = []
+        for query in queries:
+            t0 = time.perf_counter()
+            index.search(query, top_k=50)
+            latencies.append((time.perf_counter() - t0) * 1000)
+        del index
+
+    latencies.sort()
+    print("=" * 60)
+    print(f"VECTOR INDEX BENCHMARK ({len(kb)} articles, dim {args.dim})")
+    print("=" * 60)
+    print(f"Index build:  {build_s:.2f}s")
+    print(f"mmap load:    {load_ms:.2f} ms")
+    print(f"Query p50:    {statistics.median(latencies):.3f} ms")
+    print(f"Query p95:    {latencies[int(len(latencies) * 0.95) - 1]:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
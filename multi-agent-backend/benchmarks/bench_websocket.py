@@ -0,0 +1,160 @@
+"""
+Benchmark: idle and active WebSocket chat connections
+
+Starts ws_server in a child process with FakeLlm as the model (no API key or
+network needed), then from this process:
+
+1. opens --connections authenticated connections, each with its own session,
+   and reports how long that took and the server's resident memory and
+   thread count before and after;
+2. keeps them idle for --idle-seconds with protocol pings every
+   --ping-interval seconds, then counts how many are still open;
+3. sends one message on --turns of them at once and reports time to the
+   first streamed delta and to the full reply.
+
+Usage:
+    python benchmarks/bench_websocket.py --connections 10000 --idle-seconds 30
+    python benchmarks/bench_websocket.py --connections 1000 --turns 200
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import time
+import uuid
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def serve(port: int, ping_interval: float, sessions: int, ready):
+    os.environ.update({
+        "GOOGLE_API_KEY": os.getenv("GOOGLE_API_KEY", "benchmark"),
+        "WS_PORT": str(port),
+        "WS_PING_INTERVAL": str(ping_interval),
+        "SESSION_MAX": str(sessions),
+        "FAST_PATH_ENABLED": "0",
+        "RESPONSE_CACHE_ENABLED": "0",
+        "USER_RATE_BURST": "1000000"
+    })
+    import logging
+    logging.disable(logging.WARNING)
+
+    import main
+    from fake_llm import FakeLlm
+    from ws_server import ChatSocketServer
+
+    main.support_agent.model = FakeLlm(first_token_latency=0.3, token_latency=0.01)
+    server = ChatSocketServer.from_env()
+    server.start_in_thread()
+    ready.set()
+    while True:
+        time.sleep(3600)
+
+
+def process_status(pid: int) -> Dict[str, float]:
+    status = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("VmRSS", "Threads"):
+                status[key] = float(value.split()[0])
+    return {"rss_mb": status.get("VmRSS", 0) / 1024, "threads": int(status.get("Threads", 0))}
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+async def open_connection(url: str, semaphore: asyncio.Semaphore):
+    from websockets.asyncio.client import connect
+
+    async with semaphore:
+        ws = await connect(url, ping_interval=None, max_queue=None)
+        await ws.send(json.dumps({"type": "auth", "session_id": str(uuid.uuid4()), "user_id": f"user-{uuid.uuid4().hex[:8]}"}))
+        ready = json.loads(await ws.recv())
+        assert ready["type"] == "ready", ready
+        return ws
+
+
+async def turn(ws, index: int) -> Dict[str, float]:
+    start = time.perf_counter()
+    first_delta = None
+    await ws.send(json.dumps({"type": "message", "id": index, "message": f"Question {index}: my app crashes on start"}))
+    while True:
+        frame = json.loads(await ws.recv())
+        if frame["type"] == "delta" and first_delta is None:
+            first_delta = time.perf_counter() - start
+        if frame["type"] in ("reply", "error"):
+            return {"first_delta": first_delta, "reply": time.perf_counter() - start, "ok": frame["type"] == "reply"}
+
+
+async def run(args, server_pid: int):
+    url = f"ws://127.0.0.1:{args.port}"
+    baseline = process_status(server_pid)
+
+    start = time.perf_counter()
+    semaphore = asyncio.Semaphore(args.connect_concurrency)
+    connections = await asyncio.gather(*(open_connection(url, semaphore) for _ in range(args.connections)))
+    connect_seconds = time.perf_counter() - start
+    loaded = process_status(server_pid)
+
+    print("=" * 60)
+    print(f"WEBSOCKET CONNECTIONS ({args.connections} authenticated)")
+    print("=" * 60)
+    print(f"Connect + auth:        {connect_seconds:>8.2f} s ({args.connections / connect_seconds:,.0f}/s)")
+    print(f"Server RSS:            {baseline['rss_mb']:>8.1f} MB -> {loaded['rss_mb']:.1f} MB "
+          f"({(loaded['rss_mb'] - baseline['rss_mb']) * 1024 / args.connections:.1f} KB per connection)")
+    print(f"Server threads:        {baseline['threads']:>8} -> {loaded['threads']}")
+
+    if args.idle_seconds:
+        await asyncio.sleep(args.idle_seconds)
+        open_count = sum(1 for ws in connections if ws.state.name == "OPEN")
+        print(f"Open after {args.idle_seconds:.0f}s idle:  {open_count:>8} "
+              f"(server pings every {args.ping_interval:.0f}s)")
+
+    if args.turns:
+        start = time.perf_counter()
+        results = await asyncio.gather(*(turn(ws, i) for i, ws in enumerate(connections[:args.turns])))
+        elapsed = time.perf_counter() - start
+        deltas = [r["first_delta"] for r in results if r["first_delta"] is not None]
+        replies = [r["reply"] for r in results if r["ok"]]
+        print(f"\n{args.turns} concurrent turns in {elapsed:.2f}s, {len(replies)} replies")
+        print(f"First delta:           p50 {percentile(deltas, 0.5) * 1000:>7.1f} ms  "
+              f"p95 {percentile(deltas, 0.95) * 1000:>7.1f} ms")
+        print(f"Full reply:            p50 {percentile(replies, 0.5) * 1000:>7.1f} ms  "
+              f"p95 {percentile(replies, 0.95) * 1000:>7.1f} ms")
+        print(f"Server threads:        {process_status(server_pid)['threads']:>8}")
+
+    await asyncio.gather(*(ws.close() for ws in connections))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connections", type=int, default=10000)
+    parser.add_argument("--idle-seconds", type=float, default=30)
+    parser.add_argument("--ping-interval", type=float, default=10)
+    parser.add_argument("--turns", type=int, default=100)
+    parser.add_argument("--connect-concurrency", type=int, default=200)
+    parser.add_argument("--port", type=int, default=8770)
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    ready = context.Event()
+    server = context.Process(target=serve, args=(args.port, args.ping_interval, args.connections + 1000, ready),
+                             daemon=True)
+    server.start()
+    if not ready.wait(60):
+        sys.exit("WebSocket server did not start")
+    try:
+        asyncio.run(run(args, server.pid))
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
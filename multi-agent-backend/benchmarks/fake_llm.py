@@ -0,0 +1,104 @@
+"""
+Local stand-in for the Gemini model, for offline benchmarks.
+
+FakeLlm is an ADK BaseLlm, so it drops into the real LlmAgent/Runner and
+exercises the same tool-calling and session code paths as Gemini:
+
+- a new customer message is answered with a search_knowledge_base call
+  (or escalate_to_human if it asks for a person),
+- a tool result is answered with a numbered-steps reply, streamed in
+  token-sized chunks when the runner asks for SSE streaming.
+
+Latency is simulated with asyncio.sleep so it costs no CPU.
+"""
+
+import asyncio
+import json
+import random
+import re
+from typing import AsyncGenerator
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+ESCALATION_RE = re.compile(r"\b(human|person|manager|supervisor|escalate)\b", re.IGNORECASE)
+
+
+class FakeLlm(BaseLlm):
+    """Deterministic, configurable fake of a tool-calling chat model"""
+
+    model: str = "fake-llm"
+    first_token_latency: float = 0.3
+    token_latency: float = 0.01
+    tokens_per_chunk: int = 4
+    use_tools: bool = True
+    jitter: float = 0.1
+
+    @classmethod
+    def supported_models(cls):
+        return [r"fake-llm.*"]
+
+    async def _sleep(self, seconds: float):
+        if seconds > 0:
+            await asyncio.sleep(seconds * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        await self._sleep(self.first_token_latency)
+
+        last = llm_request.contents[-1] if llm_request.contents else None
+        parts = (last.parts if last else None) or []
+        tool_result = next((p.function_response for p in parts if p.function_response), None)
+        user_text = " ".join(p.text for p in parts if p.text)
+
+        if tool_result is None and self.use_tools:
+            if ESCALATION_RE.search(user_text):
+                call = types.FunctionCall(
+                    name="escalate_to_human",
+                    args={"reason": "Customer asked for a person", "customer_message": user_text}
+                )
+            else:
+                call = types.FunctionCall(name="search_knowledge_base", args={"category": user_text})
+            yield LlmResponse(content=types.Content(role="model", parts=[types.Part(function_call=call)]))
+            return
+
+        text = self._answer(tool_result, user_text)
+        if stream:
+            tokens = text.split(" ")
+            for i in range(0, len(tokens), self.tokens_per_chunk):
+                await self._sleep(self.token_latency * self.tokens_per_chunk)
+                chunk = " ".join(tokens[i:i + self.tokens_per_chunk]) + " "
+                yield LlmResponse(
+                    content=types.Content(role="model", parts=[types.Part(text=chunk)]),
+                    partial=True
+                )
+        else:
+            await self._sleep(self.token_latency * len(text.split(" ")))
+        yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=text)]))
+
+    def _answer(self, tool_result, user_text: str) -> str:
+        if tool_result is None:
+            return f"Thanks for reaching out about: {user_text[:80]}. Could you share a bit more detail?"
+
+        response = tool_result.response or {}
+        payload = response.get("result", response)
+        if isinstance(payload, str):
+            try:
+                payload = json.loads(payload)
+            except ValueError:
+                payload = {}
+
+        if tool_result.name == "escalate_to_human":
+            return "I'm escalating this to a human agent who will be with you shortly."
+
+        steps = payload.get("solutions") or ["Please describe your issue in more detail"]
+        numbered = "\n".join(f"{i}. {step}" for i, step in enumerate(steps, start=1))
+        category = payload.get("category", "general")
+        article = "an" if category[:1] in "aeiou" else "a"
+        return (
+            f"I understand you're having {article} {category} issue. Here's how to fix it:\n\n"
+            f"{numbered}\n\nThis should take about 5 minutes."
+        )
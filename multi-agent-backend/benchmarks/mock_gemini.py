@@ -0,0 +1,148 @@
+"""
+Local stand-in for the Gemini API, for exercising the model transport offline.
+
+Serves the three calls the agent makes, over HTTP/1.1 keep-alive:
+
+    POST /v1beta/models/<model>:generateContent
+    POST /v1beta/models/<model>:streamGenerateContent?alt=sse
+    GET  /v1beta/models/<model>
+
+Each generation sleeps for `latency` seconds, except a `slow_fraction` of
+them which take `slow_latency` (a heavy tail for hedging to cut off). The
+reply is a fixed text. Counts requests and distinct client connections.
+
+Usage:
+    python benchmarks/mock_gemini.py --port 8765 --latency 0.05 --slow-fraction 0.05
+    GEMINI_BASE_URL=http://127.0.0.1:8765 python app.py
+"""
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY = ("I understand you're having an issue. Here's how to fix it:\n\n"
+         "1. Restart the device\n2. Check your settings\n3. Try again\n\n"
+         "This should take about 5 minutes.")
+
+
+def generation(text: str) -> dict:
+    return {
+        "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP", "index": 0}],
+        "usageMetadata": {"promptTokenCount": 100, "candidatesTokenCount": 40, "totalTokenCount": 140},
+        "modelVersion": "mock-gemini"
+    }
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 drops connections when a whole pool connects at once
+    request_queue_size = 1024
+
+    def handle_error(self, request, client_address):
+        # A cancelled hedge or an expired deadline closes the connection mid-reply
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+
+class MockGemini:
+    """Threaded HTTP server answering like the Gemini API"""
+
+    def __init__(self, port: int = 0, latency: float = 0.05, slow_fraction: float = 0.0,
+                 slow_latency: float = 1.0, seed: int = 7):
+        self.latency = latency
+        self.slow_fraction = slow_fraction
+        self.slow_latency = slow_latency
+        self.random = random.Random(seed)
+        self.counters = {"requests": 0, "connections": 0, "slow": 0}
+        self._lock = threading.Lock()
+        self.server = _Server(("127.0.0.1", port), self._handler())
+        self.port = self.server.server_address[1]
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self._thread = threading.Thread(target=self.server.serve_forever, name="mock-gemini", daemon=True)
+
+    def start(self) -> "MockGemini":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _delay(self) -> float:
+        with self._lock:
+            self.counters["requests"] += 1
+            slow = self.random.random() < self.slow_fraction
+            if slow:
+                self.counters["slow"] += 1
+        return self.slow_latency if slow else self.latency
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out as separate writes; without this, Nagle plus
+            # the client's delayed ACK adds ~40 ms to every reply on a reused connection
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with mock._lock:
+                    mock.counters["connections"] += 1
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, payload: dict, status: int = 200):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                name = self.path.split("?")[0].split("/models/", 1)[-1]
+                self._send_json({"name": f"models/{name}", "displayName": "Mock Gemini"})
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                time.sleep(mock._delay())
+                if ":streamGenerateContent" in self.path:
+                    body = f"data: {json.dumps(generation(REPLY))}\r\n\r\n".encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/event-stream")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                elif ":generateContent" in self.path:
+                    self._send_json(generation(REPLY))
+                else:
+                    self._send_json({"error": {"code": 404, "message": "not found", "status": "NOT_FOUND"}}, 404)
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--slow-fraction", type=float, default=0.0)
+    parser.add_argument("--slow-latency", type=float, default=1.0)
+    args = parser.parse_args()
+
+    mock = MockGemini(args.port, args.latency, args.slow_fraction, args.slow_latency).start()
+    print(f"Mock Gemini listening on {mock.base_url}")
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        mock.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+Circuit breaker around model calls, with a knowledge-base-only degraded mode.
+
+When Gemini is failing (429/503 after genai's retries, deadlines) or slow,
+every turn used to wait through the full retry backoff and then return the
+generic fallback. The breaker watches model calls over a sliding window:
+
+- closed: calls go through. Once the window holds at least min_calls and the
+  share of failed calls reaches failure_rate, or the share slower than
+  slow_seconds reaches slow_rate, it opens;
+- open: calls are refused at once with CircuitOpen, and the caller answers
+  from the knowledge base instead (degraded_response). After open_seconds it
+  goes half-open;
+- half-open: up to half_open_probes calls at a time are let through as
+  trials. That many successes in a row close it again; any failed or slow
+  trial reopens it.
+
+Like admission control, a granted call is a context manager; a call that
+ends without record() (e.g. rejected by the admission queue) just frees its
+trial slot.
+"""
+
+import collections
+import logging
+import os
+import threading
+import time
+from typing import Any, Deque, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+DEGRADED_FOUND = (
+    "Our assistant is temporarily unavailable, so here are the standard steps for {category} issues:\n\n"
+    "{steps}\n\n"
+    "If this doesn't solve it, please reply again in a few minutes and I'll take a closer look."
+)
+DEGRADED_NOT_FOUND = (
+    "Our assistant is temporarily unavailable and I couldn't find a standard fix for this. "
+    "Please try again in a few minutes, or ask to speak with a support specialist."
+)
+
+
+class CircuitOpen(Exception):
+    """The breaker is refusing model calls"""
+
+    def __init__(self, retry_after: float):
+        super().__init__("model circuit open")
+        self.retry_after = retry_after
+
+
+def degraded_response(result: Dict[str, Any]) -> str:
+    """Templated reply from a search_knowledge_base result"""
+    if not result.get("found"):
+        return DEGRADED_NOT_FOUND
+    steps = "\n".join(f"{i}. {step}" for i, step in enumerate(result["solutions"], start=1))
+    return DEGRADED_FOUND.format(category=result["category"], steps=steps)
+
+
+class BreakerCall:
+    """A model call the breaker let through; record() reports how it went"""
+
+    def __init__(self, breaker: "CircuitBreaker", probe: bool):
+        self._breaker = breaker
+        self.probe = probe
+        self._done = False
+
+    def record(self, ok: bool, seconds: float):
+        if not self._done:
+            self._done = True
+            self._breaker._record(self.probe, ok, seconds)
+
+    def release(self):
+        if not self._done:
+            self._done = True
+            self._breaker._release(self.probe)
+
+    def __enter__(self) -> "BreakerCall":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+class CircuitBreaker:
+    """Sliding-window error-rate and latency breaker"""
+
+    def __init__(self, window_seconds: float = 60.0, min_calls: int = 10, failure_rate: float = 0.5,
+                 slow_seconds: float = 15.0, slow_rate: float = 0.5, open_seconds: float = 30.0,
+                 half_open_probes: int = 3):
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_seconds = slow_seconds
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self._lock = threading.Lock()
+        # (finished at, failed, slow)
+        self._window: Deque[Tuple[float, bool, bool]] = collections.deque()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self.counters = {"opened": 0, "closed": 0, "rejected": 0, "failures": 0, "slow_calls": 0}
+
+    @classmethod
+    def from_env(cls) -> Optional["CircuitBreaker"]:
+        """CIRCUIT_BREAKER_ENABLED=0 turns the breaker off"""
+        if os.getenv("CIRCUIT_BREAKER_ENABLED", "1") == "0":
+            return None
+        return cls(
+            window_seconds=float(os.getenv("CIRCUIT_WINDOW_SECONDS", "60")),
+            min_calls=int(os.getenv("CIRCUIT_MIN_CALLS", "10")),
+            failure_rate=float(os.getenv("CIRCUIT_FAILURE_RATE", "0.5")),
+            slow_seconds=float(os.getenv("CIRCUIT_SLOW_SECONDS", "15")),
+            slow_rate=float(os.getenv("CIRCUIT_SLOW_RATE", "0.5")),
+            open_seconds=float(os.getenv("CIRCUIT_OPEN_SECONDS", "30")),
+            half_open_probes=int(os.getenv("CIRCUIT_HALF_OPEN_PROBES", "3"))
+        )
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def _current_state(self, now: float) -> str:
+        if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probe_successes = 0
+            logger.info("Model circuit half-open; sending trial requests")
+        return self._state
+
+    def acquire(self) -> BreakerCall:
+        """Let a model call through or raise CircuitOpen"""
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            if state == CLOSED:
+                return BreakerCall(self, probe=False)
+            if state == HALF_OPEN and self._probes_in_flight < self.half_open_probes:
+                self._probes_in_flight += 1
+                return BreakerCall(self, probe=True)
+            self.counters["rejected"] += 1
+            retry_after = self.open_seconds - (now - self._opened_at) if state == OPEN else 1.0
+            raise CircuitOpen(max(1.0, retry_after))
+
+    def _release(self, probe: bool):
+        if probe:
+            with self._lock:
+                self._probes_in_flight -= 1
+
+    def _record(self, probe: bool, ok: bool, seconds: float):
+        slow = seconds >= self.slow_seconds
+        with self._lock:
+            now = time.monotonic()
+            self.counters["failures"] += 0 if ok else 1
+            self.counters["slow_calls"] += 1 if slow else 0
+            if probe:
+                self._probes_in_flight -= 1
+                if self._state != HALF_OPEN:
+                    return
+                if not ok or slow:
+                    self._open(now, "trial request failed" if not ok else f"trial request took {seconds:.1f}s")
+                    return
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_probes:
+                    self._state = CLOSED
+                    self._window.clear()
+                    self.counters["closed"] += 1
+                    logger.info("Model circuit closed after successful trial requests")
+                return
+
+            self._window.append((now, not ok, slow))
+            self._prune(now)
+            if self._state != CLOSED or len(self._window) < self.min_calls:
+                return
+            calls = len(self._window)
+            failures = sum(1 for _, failed, _ in self._window if failed)
+            slow_calls = sum(1 for _, _, was_slow in self._window if was_slow)
+            if failures / calls >= self.failure_rate:
+                self._open(now, f"{failures}/{calls} model calls failed")
+            elif slow_calls / calls >= self.slow_rate:
+                self._open(now, f"{slow_calls}/{calls} model calls took over {self.slow_seconds:.0f}s")
+
+    def _prune(self, now: float):
+        cutoff = now - self.window_seconds
+        while self._window and self._window[0][0] < cutoff:
+            self._window.popleft()
+
+    def _open(self, now: float, reason: str):
+        self._state = OPEN
+        self._opened_at = now
+        self._probe_successes = 0
+        self.counters["opened"] += 1
+        logger.warning(f"Model circuit opened ({reason}); answering from the knowledge base "
+                       f"for {self.open_seconds:.0f}s")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            self._prune(now)
+            calls = len(self._window)
+            return {
+                "state": state,
+                "window_calls": calls,
+                "window_failure_rate": round(sum(1 for _, f, _ in self._window if f) / calls, 3) if calls else 0.0,
+                "window_slow_rate": round(sum(1 for _, _, s in self._window if s) / calls, 3) if calls else 0.0,
+                "open_for_seconds": round(max(0.0, self.open_seconds - (now - self._opened_at)), 1)
+                if state == OPEN else 0.0,
+                "probes_in_flight": self._probes_in_flight,
+                **self.counters
+            }
@@ -0,0 +1,199 @@
+"""
+Context-window budgeting for the support agent.
+
+ADK replays the whole session into every model request, so without a limit
+the prompt grows with each turn. ContextBudget runs as the agent's
+before_model_callback and rewrites the request:
+
+- the last `keep_turns` turns (a customer message plus the tool calls and
+  replies that answered it) are sent verbatim;
+- older turns are folded into a short rolling summary that is appended to
+  the system instruction. Summaries are built locally, one line per turn,
+  and cached per session so each turn is only summarised once;
+- if the verbatim turns still exceed `max_tokens`, the oldest of them are
+  folded too, and the oldest summary lines are dropped last.
+
+Token counts are estimated at ~4 characters per token.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4
+SUMMARY_HEADER = "Summary of the earlier conversation (oldest first):"
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def content_tokens(content) -> int:
+    total = 0
+    for part in getattr(content, "parts", None) or []:
+        if getattr(part, "text", None):
+            total += estimate_tokens(part.text)
+        call = getattr(part, "function_call", None)
+        if call is not None:
+            total += estimate_tokens(f"{call.name}{json.dumps(call.args or {}, default=str)}")
+        result = getattr(part, "function_response", None)
+        if result is not None:
+            total += estimate_tokens(f"{result.name}{json.dumps(result.response or {}, default=str)}")
+    return total
+
+
+def _first_sentence(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    sentence = _SENTENCE_END.split(text, maxsplit=1)[0]
+    return sentence if len(sentence) <= limit else sentence[:limit - 3].rstrip() + "..."
+
+
+def _is_customer_message(content) -> bool:
+    parts = getattr(content, "parts", None) or []
+    return getattr(content, "role", None) == "user" and any(getattr(p, "text", None) for p in parts) \
+        and not any(getattr(p, "function_response", None) for p in parts)
+
+
+def split_turns(contents: List[Any]) -> List[List[Any]]:
+    """Group contents into turns, each starting at a customer message"""
+    turns: List[List[Any]] = []
+    for content in contents:
+        if not turns or _is_customer_message(content):
+            turns.append([])
+        turns[-1].append(content)
+    return turns
+
+
+def summarize_turn(turn: List[Any], line_chars: int = 160) -> str:
+    """One line: what the customer asked, which tools ran, how the agent answered"""
+    customer, reply, tools = "", "", []
+    for content in turn:
+        for part in getattr(content, "parts", None) or []:
+            call = getattr(part, "function_call", None)
+            if call is not None:
+                args = ", ".join(f"{v}" for v in (call.args or {}).values())[:40]
+                tools.append(f"{call.name}({args})")
+            elif getattr(part, "text", None):
+                if content.role == "user" and not customer:
+                    customer = part.text
+                elif content.role == "model":
+                    reply = part.text
+    line = f"- Customer: {_first_sentence(customer, line_chars)}"
+    if tools:
+        line += f" | Tools: {'; '.join(tools)}"
+    if reply:
+        line += f" | Agent: {_first_sentence(reply, line_chars)}"
+    return line
+
+
+class ContextBudget:
+    """Keeps model requests within a token budget by summarising old turns"""
+
+    def __init__(self, keep_turns: int = 6, max_tokens: int = 6000, cache_sessions: int = 10000):
+        self.keep_turns = max(1, keep_turns)
+        self.max_tokens = max_tokens
+        self.cache_sessions = cache_sessions
+        # session id -> summary lines, one per folded turn in order
+        self._summaries: "OrderedDict[str, List[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"requests": 0, "trimmed": 0, "turns_summarized": 0, "summary_lines_dropped": 0}
+
+    @classmethod
+    def from_env(cls) -> Optional["ContextBudget"]:
+        """CONTEXT_BUDGET_ENABLED=0 disables; CONTEXT_KEEP_TURNS / CONTEXT_MAX_TOKENS tune it"""
+        if os.getenv("CONTEXT_BUDGET_ENABLED", "1") == "0":
+            return None
+        return cls(
+            keep_turns=int(os.getenv("CONTEXT_KEEP_TURNS", "6")),
+            max_tokens=int(os.getenv("CONTEXT_MAX_TOKENS", "6000"))
+        )
+
+    def forget(self, session_id: str, *_):
+        """Drop a session's cached summary (usable as a session store remove listener)"""
+        with self._lock:
+            self._summaries.pop(session_id, None)
+
+    def _summary_lines(self, session_id: str, folded: List[List[Any]]) -> List[str]:
+        with self._lock:
+            lines = self._summaries.get(session_id, [])
+            if session_id in self._summaries:
+                self._summaries.move_to_end(session_id)
+        if len(lines) < len(folded):
+            new_lines = [summarize_turn(turn) for turn in folded[len(lines):]]
+            self.counters["turns_summarized"] += len(new_lines)
+            lines = lines + new_lines
+            with self._lock:
+                self._summaries[session_id] = lines
+                self._summaries.move_to_end(session_id)
+                while len(self._summaries) > self.cache_sessions:
+                    self._summaries.popitem(last=False)
+        return lines[:len(folded)]
+
+    def fit(self, session_id: str, contents: List[Any], fixed_tokens: int = 0) -> Tuple[List[Any], List[str]]:
+        """Return (verbatim contents, summary lines) within the budget"""
+        turns = split_turns(contents)
+        turn_tokens = [sum(content_tokens(c) for c in turn) for turn in turns]
+
+        keep_from = max(0, len(turns) - self.keep_turns)
+        budget = self.max_tokens - fixed_tokens
+        # Always keep the current turn, even if it alone is over budget
+        while keep_from < len(turns) - 1 and sum(turn_tokens[keep_from:]) > budget:
+            keep_from += 1
+
+        if keep_from == 0:
+            return contents, []
+
+        lines = self._summary_lines(session_id, turns[:keep_from])
+        remaining = budget - sum(turn_tokens[keep_from:]) - estimate_tokens(SUMMARY_HEADER)
+        kept_lines: List[str] = []
+        for line in reversed(lines):
+            cost = estimate_tokens(line) + 1
+            if cost > remaining:
+                break
+            kept_lines.append(line)
+            remaining -= cost
+        kept_lines.reverse()
+        dropped = len(lines) - len(kept_lines)
+        if dropped:
+            self.counters["summary_lines_dropped"] += dropped
+            kept_lines.insert(0, f"- ({dropped} earlier turns omitted)")
+
+        verbatim = [content for turn in turns[keep_from:] for content in turn]
+        return verbatim, kept_lines
+
+    def before_model_callback(self, callback_context, llm_request):
+        """ADK hook: trim llm_request.contents in place; never short-circuits the model"""
+        self.counters["requests"] += 1
+        session_id = callback_context.session.id
+        system = getattr(llm_request.config, "system_instruction", None) if llm_request.config else None
+        fixed_tokens = estimate_tokens(system) if isinstance(system, str) else 0
+
+        contents, lines = self.fit(session_id, list(llm_request.contents), fixed_tokens)
+        if lines:
+            self.counters["trimmed"] += 1
+            llm_request.contents = contents
+            llm_request.append_instructions([SUMMARY_HEADER + "\n" + "\n".join(lines)])
+
+        prompt_tokens = fixed_tokens + sum(content_tokens(c) for c in llm_request.contents)
+        if lines:
+            prompt_tokens += estimate_tokens(SUMMARY_HEADER) + sum(estimate_tokens(line) + 1 for line in lines)
+        metrics.PROMPT_TOKENS.observe(prompt_tokens)
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "keep_turns": self.keep_turns,
+            "max_tokens": self.max_tokens,
+            "cached_summaries": len(self._summaries),
+            **self.counters
+        }
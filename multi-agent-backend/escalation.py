@@ -0,0 +1,421 @@
+"""
+Dispatch of escalated conversations to human agents.
+
+EscalationDispatcher keeps a registry of human agents with a ticket capacity
+each, and a priority queue of tickets waiting for one:
+
+- Tickets are ordered by urgency and wait time together. The key is
+  created_at - urgency * aging_seconds, so one point of urgency is worth
+  aging_seconds of waiting and no ticket starves.
+- A new or requeued ticket goes straight to the least-loaded agent
+  (active tickets / capacity) when anyone has room. Agents sit in a heap with
+  lazy invalidation, so picking one is O(log n).
+- Agents claim a ticket (one assigned to them, or the next one in the queue)
+  and release it when resolved or to hand it back.
+
+Listeners registered with on_change() see every ticket state change; app.py
+uses them to keep escalation_status on the chat session current.
+
+ESCALATION_AGENTS seeds the registry ("AGENT-001:3,AGENT-002:5" = id:capacity)
+and ESCALATION_AGING_SECONDS sets the urgency/wait trade-off.
+
+EscalationDispatcher keeps its state in this process. With
+SESSION_BACKEND=sqlite, create_dispatcher() returns
+sqlite_sessions.SQLiteEscalationDispatcher instead, which keeps agents and
+tickets in the shared database, so a ticket claimed on one gunicorn worker
+can be released on another and each agent's capacity is counted once.
+Listeners still only hear about changes made in their own process; other
+processes follow changes_since().
+"""
+
+import heapq
+import itertools
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_AGENTS = "AGENT-001:3,AGENT-002:3,AGENT-003:3"
+
+# Words that push a ticket up the queue, with their weight
+URGENCY_TERMS = {
+    "urgent": 2, "asap": 2, "immediately": 2, "emergency": 3, "outage": 2, "down": 1,
+    "angry": 1, "frustrated": 1, "furious": 2, "unacceptable": 2, "ridiculous": 1,
+    "cancel": 1, "refund": 1, "lawyer": 3, "legal": 2, "complaint": 1,
+}
+MAX_URGENCY = 5
+
+# Ticket states in which a session counts as escalated
+OPEN_STATUSES = ("queued", "assigned", "claimed")
+
+_WORD_RE = re.compile(r"[A-Za-z']+")
+
+
+def urgency(text: str) -> int:
+    """0-5 urgency score from wording, exclamation marks and shouting"""
+    words = _WORD_RE.findall(text)
+    score = sum(URGENCY_TERMS.get(word.lower(), 0) for word in words)
+    if text.count("!") >= 2:
+        score += 1
+    if sum(1 for word in words if len(word) > 2 and word.isupper()) >= 2:
+        score += 1
+    return min(score, MAX_URGENCY)
+
+
+class DispatchError(Exception):
+    """Invalid dispatcher operation, with the HTTP status to report"""
+
+    def __init__(self, reason: str, status: int = 400):
+        super().__init__(reason)
+        self.reason = reason
+        self.status = status
+
+
+class HumanAgent:
+    __slots__ = ("agent_id", "name", "capacity", "tickets", "version")
+
+    def __init__(self, agent_id: str, name: str, capacity: int):
+        self.agent_id = agent_id
+        self.name = name
+        self.capacity = capacity
+        self.tickets: set = set()
+        # Bumped on every load change; heap entries with an older version are stale
+        self.version = 0
+
+    @property
+    def load(self) -> float:
+        return len(self.tickets) / self.capacity if self.capacity > 0 else float("inf")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "agent_id": self.agent_id,
+            "name": self.name,
+            "capacity": self.capacity,
+            "active_tickets": len(self.tickets),
+            "tickets": sorted(self.tickets)
+        }
+
+
+class Ticket:
+    __slots__ = ("ticket_id", "session_id", "user_id", "reason", "message", "urgency", "created_at",
+                 "priority_key", "status", "agent_id", "updated_at")
+
+    def __init__(self, session_id: str, user_id: str, reason: str, message: str, urgency_score: int,
+                 aging_seconds: float):
+        self.ticket_id = f"T-{uuid.uuid4().hex[:12]}"
+        self.session_id = session_id
+        self.user_id = user_id
+        self.reason = reason
+        self.message = message
+        self.urgency = urgency_score
+        self.created_at = time.time()
+        self.priority_key = self.created_at - urgency_score * aging_seconds
+        # queued -> assigned -> claimed -> resolved; cancelled when the customer leaves first
+        self.status = "queued"
+        self.agent_id: Optional[str] = None
+        self.updated_at = self.created_at
+
+    @classmethod
+    def restore(cls, fields: Dict[str, Any]) -> "Ticket":
+        """Rebuild a stored ticket from its fields (one per slot)"""
+        ticket = cls.__new__(cls)
+        for name in cls.__slots__:
+            setattr(ticket, name, fields[name])
+        return ticket
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "ticket_id": self.ticket_id,
+            "session_id": self.session_id,
+            "user_id": self.user_id,
+            "reason": self.reason,
+            "message": self.message,
+            "urgency": self.urgency,
+            "status": self.status,
+            "agent_id": self.agent_id,
+            "waited_seconds": round(time.time() - self.created_at, 1),
+            "created_at": self.created_at,
+            "updated_at": self.updated_at
+        }
+
+
+ChangeListener = Callable[[Ticket], None]
+
+
+class EscalationDispatcher:
+    """Agent registry plus priority queue of escalation tickets"""
+
+    # Whether other processes see this dispatcher's tickets (and should follow changes_since())
+    shared = False
+
+    def __init__(self, aging_seconds: float = 120.0):
+        self.aging_seconds = aging_seconds
+        self._lock = threading.Lock()
+        self._agents: Dict[str, HumanAgent] = {}
+        # (load, version, agent_id); stale entries are skipped when popped
+        self._agent_heap: List[Tuple[float, int, str]] = []
+        # (priority_key, seq, ticket_id) of queued tickets; non-queued ones are skipped when popped
+        self._queue: List[Tuple[float, int, str]] = []
+        self._queued = 0
+        self._seq = itertools.count()
+        self._tickets: Dict[str, Ticket] = {}
+        self._by_session: Dict[str, str] = {}
+        self._listeners: List[ChangeListener] = []
+        self.counters = {"escalated": 0, "assigned": 0, "claimed": 0, "resolved": 0, "requeued": 0,
+                         "cancelled": 0}
+
+    @classmethod
+    def from_env(cls) -> "EscalationDispatcher":
+        dispatcher = cls(aging_seconds=float(os.getenv("ESCALATION_AGING_SECONDS", "120")))
+        for spec in filter(None, (s.strip() for s in os.getenv("ESCALATION_AGENTS", DEFAULT_AGENTS).split(","))):
+            agent_id, _, capacity = spec.partition(":")
+            dispatcher.register_agent(agent_id, capacity=int(capacity or 3))
+        return dispatcher
+
+    def on_change(self, listener: ChangeListener):
+        """Register listener(ticket) called after every ticket state change"""
+        self._listeners.append(listener)
+
+    def _changed(self, tickets: List[Ticket]):
+        # Called outside the lock so listeners may take their own
+        for ticket in tickets:
+            for listener in self._listeners:
+                try:
+                    listener(ticket)
+                except Exception as e:
+                    logger.warning(f"Escalation listener failed for {ticket.ticket_id}: {e}")
+
+    # Agent registry
+
+    def _push_agent(self, agent: HumanAgent):
+        agent.version += 1
+        heapq.heappush(self._agent_heap, (agent.load, agent.version, agent.agent_id))
+        if len(self._agent_heap) > 4 * len(self._agents) + 64:
+            self._agent_heap = [(a.load, a.version, a.agent_id) for a in self._agents.values()]
+            heapq.heapify(self._agent_heap)
+
+    def _least_loaded(self) -> Optional[HumanAgent]:
+        """Agent with the lowest load that still has room, or None"""
+        while self._agent_heap:
+            load, version, agent_id = self._agent_heap[0]
+            agent = self._agents.get(agent_id)
+            if agent is None or agent.version != version:
+                heapq.heappop(self._agent_heap)
+                continue
+            return agent if load < 1.0 else None
+        return None
+
+    def register_agent(self, agent_id: str, name: Optional[str] = None, capacity: int = 3) -> HumanAgent:
+        """Add an agent or change an existing agent's capacity"""
+        if not agent_id or capacity < 0:
+            raise DispatchError("agent_id is required and capacity must be >= 0")
+        with self._lock:
+            agent = self._agents.get(agent_id)
+            if agent is None:
+                agent = self._agents[agent_id] = HumanAgent(agent_id, name or agent_id, capacity)
+            else:
+                agent.capacity = capacity
+                agent.name = name or agent.name
+            self._push_agent(agent)
+            changed = self._dispatch()
+        self._changed(changed)
+        return agent
+
+    def remove_agent(self, agent_id: str):
+        """Take an agent offline; their tickets go back to the queue"""
+        with self._lock:
+            agent = self._agents.pop(agent_id, None)
+            if agent is None:
+                raise DispatchError(f"Unknown agent {agent_id}", 404)
+            changed = []
+            for ticket_id in agent.tickets:
+                ticket = self._tickets[ticket_id]
+                self._enqueue(ticket)
+                self.counters["requeued"] += 1
+                changed.append(ticket)
+            changed.extend(self._dispatch())
+        self._changed(changed)
+
+    def agents(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [agent.to_dict() for agent in self._agents.values()]
+
+    # Tickets
+
+    def _enqueue(self, ticket: Ticket):
+        ticket.status = "queued"
+        ticket.agent_id = None
+        ticket.updated_at = time.time()
+        heapq.heappush(self._queue, (ticket.priority_key, next(self._seq), ticket.ticket_id))
+        self._queued += 1
+
+    def _pop_queued(self) -> Optional[Ticket]:
+        while self._queue:
+            _, _, ticket_id = heapq.heappop(self._queue)
+            ticket = self._tickets.get(ticket_id)
+            if ticket is not None and ticket.status == "queued":
+                self._queued -= 1
+                return ticket
+        return None
+
+    def _assign(self, ticket: Ticket, agent: HumanAgent, status: str):
+        ticket.status = status
+        ticket.agent_id = agent.agent_id
+        ticket.updated_at = time.time()
+        agent.tickets.add(ticket.ticket_id)
+        self._push_agent(agent)
+        self.counters["assigned" if status == "assigned" else "claimed"] += 1
+
+    def _dispatch(self) -> List[Ticket]:
+        """Hand queued tickets to the least-loaded agents while anyone has room"""
+        assigned = []
+        while self._queued:
+            agent = self._least_loaded()
+            if agent is None:
+                break
+            ticket = self._pop_queued()
+            if ticket is None:
+                break
+            self._assign(ticket, agent, "assigned")
+            assigned.append(ticket)
+        return assigned
+
+    def escalate(self, session_id: str, user_id: str, reason: str, message: str) -> Ticket:
+        """Open a ticket for a session, or return its open one"""
+        with self._lock:
+            existing = self._tickets.get(self._by_session.get(session_id, ""))
+            if existing is not None and existing.status in OPEN_STATUSES:
+                return existing
+            ticket = Ticket(session_id, user_id, reason, message, urgency(f"{reason} {message}"),
+                            self.aging_seconds)
+            self._tickets[ticket.ticket_id] = ticket
+            self._by_session[session_id] = ticket.ticket_id
+            self._enqueue(ticket)
+            self.counters["escalated"] += 1
+            changed = [ticket] + [t for t in self._dispatch() if t is not ticket]
+        self._changed(changed)
+        logger.info(f"Escalation {ticket.ticket_id} (urgency {ticket.urgency}) -> {ticket.status} "
+                    f"{ticket.agent_id or ''}".rstrip())
+        return ticket
+
+    def claim(self, agent_id: str, ticket_id: Optional[str] = None) -> Ticket:
+        """Agent takes a ticket: a given one assigned to them or queued, or else the next in the queue"""
+        with self._lock:
+            agent = self._agents.get(agent_id)
+            if agent is None:
+                raise DispatchError(f"Unknown agent {agent_id}", 404)
+            if ticket_id is None:
+                if len(agent.tickets) >= agent.capacity:
+                    raise DispatchError(f"Agent {agent_id} is at capacity", 409)
+                ticket = self._pop_queued()
+                if ticket is None:
+                    raise DispatchError("No tickets waiting", 404)
+                self._assign(ticket, agent, "claimed")
+            else:
+                ticket = self._tickets.get(ticket_id)
+                if ticket is None:
+                    raise DispatchError(f"Unknown ticket {ticket_id}", 404)
+                if ticket.status == "assigned" and ticket.agent_id == agent_id:
+                    ticket.status = "claimed"
+                    ticket.updated_at = time.time()
+                    self.counters["claimed"] += 1
+                elif ticket.status == "queued":
+                    if len(agent.tickets) >= agent.capacity:
+                        raise DispatchError(f"Agent {agent_id} is at capacity", 409)
+                    self._queued -= 1
+                    self._assign(ticket, agent, "claimed")
+                else:
+                    raise DispatchError(f"Ticket {ticket_id} is {ticket.status}", 409)
+        self._changed([ticket])
+        return ticket
+
+    def release(self, agent_id: str, ticket_id: str, resolved: bool = True) -> Ticket:
+        """Agent finishes a ticket (resolved) or hands it back to the queue"""
+        with self._lock:
+            ticket = self._tickets.get(ticket_id)
+            agent = self._agents.get(agent_id)
+            if ticket is None or agent is None:
+                raise DispatchError(f"Unknown ticket {ticket_id} or agent {agent_id}", 404)
+            if ticket.agent_id != agent_id or ticket_id not in agent.tickets:
+                raise DispatchError(f"Ticket {ticket_id} is not held by {agent_id}", 409)
+            agent.tickets.discard(ticket_id)
+            self._push_agent(agent)
+            if resolved:
+                ticket.status = "resolved"
+                ticket.updated_at = time.time()
+                self.counters["resolved"] += 1
+                self._forget(ticket)
+            else:
+                self._enqueue(ticket)
+                self.counters["requeued"] += 1
+            changed = [ticket] + [t for t in self._dispatch() if t is not ticket]
+        self._changed(changed)
+        return ticket
+
+    def _forget(self, ticket: Ticket):
+        self._tickets.pop(ticket.ticket_id, None)
+        if self._by_session.get(ticket.session_id) == ticket.ticket_id:
+            del self._by_session[ticket.session_id]
+
+    def cancel_session(self, session_id: str, *_):
+        """Withdraw a session's ticket if no agent holds it yet (usable as a session store remove listener)"""
+        with self._lock:
+            ticket = self._tickets.get(self._by_session.get(session_id, ""))
+            if ticket is None:
+                return
+            if ticket.status != "queued":
+                # An agent is already on it; they release it as usual
+                return
+            self._queued -= 1
+            ticket.status = "cancelled"
+            ticket.updated_at = time.time()
+            self.counters["cancelled"] += 1
+            self._forget(ticket)
+
+    def status_for_session(self, session_id: str) -> str:
+        """State of the session's open ticket, or "none" """
+        with self._lock:
+            ticket = self._tickets.get(self._by_session.get(session_id, ""))
+            return ticket.status if ticket is not None else "none"
+
+    def get(self, ticket_id: str) -> Optional[Ticket]:
+        with self._lock:
+            return self._tickets.get(ticket_id)
+
+    def waiting(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Queued tickets in dispatch order"""
+        with self._lock:
+            # Skipped entries (claimed out of order, cancelled, requeued twice) are at most the difference
+            entries = heapq.nsmallest(limit + len(self._queue) - self._queued, self._queue)
+            waiting, seen = [], set()
+            for _, _, ticket_id in entries:
+                ticket = self._tickets.get(ticket_id)
+                if ticket is not None and ticket.status == "queued" and ticket_id not in seen:
+                    seen.add(ticket_id)
+                    waiting.append(ticket.to_dict())
+            return waiting[:limit]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            capacity = sum(agent.capacity for agent in self._agents.values())
+            active = sum(len(agent.tickets) for agent in self._agents.values())
+            return {
+                "agents": len(self._agents),
+                "capacity": capacity,
+                "active_tickets": active,
+                "queued": self._queued,
+                **self.counters
+            }
+
+
+def create_dispatcher() -> EscalationDispatcher:
+    """Build the dispatcher for SESSION_BACKEND: in this process, or in the shared SQLite database"""
+    if os.getenv("SESSION_BACKEND", "memory").lower() == "sqlite":
+        from sqlite_sessions import SQLiteEscalationDispatcher
+        return SQLiteEscalationDispatcher.from_env()
+    return EscalationDispatcher.from_env()
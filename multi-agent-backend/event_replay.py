@@ -0,0 +1,231 @@
+"""
+Record and replay of ADK runner event streams.
+
+RUNNER_MODE selects what get_runner() hands to the app:
+
+- "live" (default): the ADK Runner as is.
+- "record": the live runner, and every turn's event stream is also appended
+  to RUNNER_RECORDING as one JSON line: the session, the user message and
+  each event with its offset from the start of the turn.
+- "replay": no model at all. Turns are answered by playing back recorded
+  streams, matched on the user message (recordings are reused round-robin
+  when a message was never recorded). REPLAY_SPEED=1 keeps the original
+  timing, 2 plays twice as fast, 0 plays as fast as possible.
+
+A recording path ending in .gz is written as appended gzip members.
+Recorded turns are handed to a writer thread, so the runtime's event loop
+never waits on the file; a turn that arrives while RECORDING_MAX_PENDING
+turns are still unwritten is dropped and counted.
+"""
+
+import asyncio
+import atexit
+import gzip
+import itertools
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import zlib
+from collections import defaultdict
+from typing import Any, AsyncGenerator, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    from google.adk.events import Event
+except ImportError:
+    Event = None
+
+
+def _open(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def message_text(new_message) -> str:
+    """User text of the Content passed to run_async"""
+    parts = getattr(new_message, "parts", None) or []
+    return " ".join(str(part.text) for part in parts if getattr(part, "text", None))
+
+
+def serialize_event(event) -> Optional[Dict[str, Any]]:
+    if hasattr(event, "model_dump"):
+        return event.model_dump(mode="json", exclude_none=True, by_alias=True)
+    return None
+
+
+def read_recording(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield recorded turns in file order, skipping a truncated last line
+
+    A .gz file cut off mid-member (the recording process was killed) ends at
+    the last complete turn.
+    """
+    line_number = 0
+    try:
+        with _open(path, "r") as f:
+            for line_number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    logger.warning(f"Skipping unreadable line {line_number} of {path}")
+    except (EOFError, gzip.BadGzipFile, zlib.error) as e:
+        logger.warning(f"{path} is truncated after line {line_number} ({e}); stopping there")
+
+
+class _RunnerProxy:
+    """Forwards everything but run_async to the wrapped runner"""
+
+    def __init__(self, runner):
+        self.runner = runner
+
+    def __getattr__(self, name):
+        return getattr(self.runner, name)
+
+
+class RecordingRunner(_RunnerProxy):
+    """Live runner that appends each turn's event stream to a file"""
+
+    def __init__(self, runner, path: str, max_pending: int = 1000):
+        super().__init__(runner)
+        self.path = path
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._pending: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max_pending)
+        self._writer_pid: Optional[int] = None
+        self.recorded = 0
+        self.dropped = 0
+
+    async def run_async(self, *, user_id: str, session_id: str, new_message, **kwargs) -> AsyncGenerator[Any, None]:
+        start = time.perf_counter()
+        events: List[Dict[str, Any]] = []
+        try:
+            async for event in self.runner.run_async(
+                user_id=user_id, session_id=session_id, new_message=new_message, **kwargs
+            ):
+                data = serialize_event(event)
+                if data is not None:
+                    events.append({"t": round(time.perf_counter() - start, 4), "event": data})
+                yield event
+        finally:
+            # Partial streams are kept too; they are what a failing turn looked like
+            self._write({
+                "session_id": session_id,
+                "user_id": user_id,
+                "message": message_text(new_message),
+                "recorded_at": time.time(),
+                "duration": round(time.perf_counter() - start, 4),
+                "events": events
+            })
+
+    def _write(self, turn: Dict[str, Any]):
+        """Queue a turn for the writer thread; called on the event loop, so it never blocks"""
+        self._start_writer()
+        try:
+            self._pending.put_nowait(turn)
+        except queue.Full:
+            self.dropped += 1
+            logger.warning(f"Runner recording is {self.max_pending} turns behind; dropping a turn")
+
+    def _start_writer(self):
+        if self._writer_pid == os.getpid():
+            return
+        with self._lock:
+            if self._writer_pid == os.getpid():
+                return
+            # After a fork the parent's queue and writer thread are not ours
+            self._pending = queue.Queue(maxsize=self.max_pending)
+            threading.Thread(target=self._drain, name="runner-recorder", daemon=True).start()
+            self._writer_pid = os.getpid()
+            atexit.register(self.flush)
+
+    def _drain(self):
+        pending = self._pending
+        while True:
+            turns = [pending.get()]
+            while True:
+                try:
+                    turns.append(pending.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with _open(self.path, "a") as f:
+                    f.write("".join(json.dumps(turn, separators=(",", ":")) + "\n" for turn in turns))
+                self.recorded += len(turns)
+            except OSError as e:
+                logger.warning(f"Could not record runner events to {self.path}: {e}")
+            finally:
+                for _ in turns:
+                    pending.task_done()
+
+    def flush(self):
+        """Block until every queued turn is written"""
+        if self._writer_pid == os.getpid():
+            self._pending.join()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"mode": "record", "path": self.path, "recorded": self.recorded, "dropped": self.dropped,
+                "pending": self._pending.qsize()}
+
+
+class ReplayRunner(_RunnerProxy):
+    """Stands in for the runner and plays recorded event streams back"""
+
+    def __init__(self, runner, turns: List[Dict[str, Any]], speed: float = 1.0):
+        super().__init__(runner)
+        if not turns:
+            raise ValueError("Replay needs at least one recorded turn")
+        if Event is None:
+            raise RuntimeError("google-adk is required to rebuild recorded events")
+        self.speed = speed
+        self._turns = turns
+        by_message: Dict[str, List[int]] = defaultdict(list)
+        for index, turn in enumerate(turns):
+            by_message[turn.get("message", "")].append(index)
+        self._by_message = {message: itertools.cycle(indexes) for message, indexes in by_message.items()}
+        self._any = itertools.cycle(range(len(turns)))
+        self._lock = threading.Lock()
+        self.counters = {"matched": 0, "unmatched": 0}
+
+    def _pick(self, message: str) -> Dict[str, Any]:
+        with self._lock:
+            indexes = self._by_message.get(message)
+            if indexes is not None:
+                self.counters["matched"] += 1
+            else:
+                self.counters["unmatched"] += 1
+                indexes = self._any
+            return self._turns[next(indexes)]
+
+    async def run_async(self, *, user_id: str, session_id: str, new_message, **kwargs) -> AsyncGenerator[Any, None]:
+        turn = self._pick(message_text(new_message))
+        elapsed = 0.0
+        for recorded in turn["events"]:
+            if self.speed > 0:
+                await asyncio.sleep(max(0.0, recorded["t"] - elapsed) / self.speed)
+                elapsed = recorded["t"]
+            yield Event.model_validate(recorded["event"])
+
+    def stats(self) -> Dict[str, Any]:
+        return {"mode": "replay", "turns": len(self._turns), "speed": self.speed, **self.counters}
+
+
+def wrap_runner(runner):
+    """Apply RUNNER_MODE / RUNNER_RECORDING / REPLAY_SPEED to a runner"""
+    mode = os.getenv("RUNNER_MODE", "live").lower()
+    path = os.getenv("RUNNER_RECORDING", "runner_events.jsonl")
+    if mode == "record":
+        logger.info(f"Recording runner events to {path}")
+        return RecordingRunner(runner, path, int(os.getenv("RECORDING_MAX_PENDING", "1000")))
+    if mode == "replay":
+        speed = float(os.getenv("REPLAY_SPEED", "1"))
+        turns = list(read_recording(path))
+        replay = ReplayRunner(runner, turns, speed)
+        logger.info(f"Replaying {len(turns)} recorded turns from {path} at speed {speed or 'max'}")
+        return replay
+    return runner
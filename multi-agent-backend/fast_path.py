@@ -0,0 +1,168 @@
+"""
+Pre-LLM fast path for routine support questions.
+
+A small rule-based intent classifier maps a customer message onto a knowledge
+base category. When it is confident, the reply is rendered locally from the
+knowledge base in the same numbered-steps format the agent instruction asks
+Gemini for, so the request never reaches the model. Anything ambiguous,
+emotional or asking for a person falls through to the LLM.
+
+Negation is read the way the response cache reads it (contractions spelled
+out, then the word after "not"/"no"/"never"): a negated symptom ("not
+crashing anymore", "no errors") says the problem is gone, so it is dropped
+from the evidence, while any other negated word ("can't connect", "won't
+open") reports a problem.
+
+The router knows nothing about the conversation, so callers only use it for
+a session's opening message.
+"""
+
+import json
+import logging
+import os
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from response_cache import NEGATIONS, spell_out_negations
+
+logger = logging.getLogger(__name__)
+
+# Category -> keyword patterns. Each distinct pattern that matches adds one point
+INTENT_RULES: Dict[str, List[str]] = {
+    "internet": [
+        r"\binternet\b", r"\bwi-?fi\b", r"\brouter\b", r"\bmodem\b", r"\bconnect(ion|ed|ing)?\b",
+        r"\bdisconnect", r"\boffline\b", r"\bbroadband\b", r"\bsignal\b"
+    ],
+    "billing": [
+        r"\bbill(s|ing|ed)?\b", r"\binvoice", r"\bcharge(s|d)?\b", r"\bpayment", r"\bpaid\b",
+        r"\bsubscription", r"\bcredit card\b", r"\bovercharg"
+    ],
+    "app": [
+        r"\bapp\b", r"\bapplication\b", r"\bcrash", r"\bfreez", r"\bcache\b", r"\breinstall",
+        r"\bkeeps closing\b", r"\bwon'?t (open|load)\b"
+    ],
+    "api": [
+        r"\bapi\b", r"\bendpoint", r"\bapi key\b", r"\brate limit", r"\b(401|403|429)\b",
+        r"\bwebhook", r"\bsdk\b"
+    ]
+}
+
+# Words that signal a real problem report rather than small talk
+PROBLEM_PATTERNS = [
+    r"\bnot working\b", r"\bdown\b", r"\bissue", r"\bproblem", r"\bbroken\b", r"\berror",
+    r"\bfail", r"\bslow\b", r"\bcan'?t\b", r"\bcannot\b", r"\bwrong\b", r"\bhelp\b", r"\bstopped\b"
+]
+
+# Symptoms: negating one of these means the problem is gone, not that it exists
+SYMPTOM_PATTERNS = PROBLEM_PATTERNS + [
+    r"\bcrash", r"\bfreez", r"\bdisconnect", r"\boffline\b", r"\bclos(e|es|ed|ing)\b", r"\blag"
+]
+
+# A negation and the word it applies to
+NEGATED_WORD = re.compile(r"\b(?:%s)\s+([a-z0-9'-]+)" % "|".join(sorted(NEGATIONS)))
+
+# Anything that should reach the model (and possibly a human) instead of a template
+FALLTHROUGH_PATTERNS = [
+    r"\bhuman\b", r"\bperson\b", r"\bmanager\b", r"\bsupervisor\b", r"\bescalat", r"\bagent\b",
+    r"\bangry\b", r"\bfurious\b", r"\bfrustrat", r"\bunacceptable\b", r"\bridiculous\b",
+    r"\bcancel", r"\blawyer\b", r"\brefund", r"!!", r"\bagain\b", r"\bstill\b"
+]
+
+# Rough fix time quoted in the reply, per category
+FIX_TIMES = {
+    "internet": "5 minutes",
+    "billing": "a few minutes",
+    "app": "5 minutes",
+    "api": "10 minutes"
+}
+
+MAX_MESSAGE_WORDS = 40
+
+
+def _compile(patterns: List[str]) -> List["re.Pattern"]:
+    return [re.compile(p, re.IGNORECASE) for p in patterns]
+
+
+class FastPathRouter:
+    """Classifies messages and renders knowledge base answers for confident matches"""
+
+    def __init__(self, search: Callable[[str], str], min_confidence: float = 0.75):
+        self.search = search
+        self.min_confidence = min_confidence
+        self._rules = {category: _compile(patterns) for category, patterns in INTENT_RULES.items()}
+        self._problem = _compile(PROBLEM_PATTERNS)
+        self._fallthrough = _compile(FALLTHROUGH_PATTERNS)
+        self._symptoms = _compile(SYMPTOM_PATTERNS)
+        self.counters = {"fast_path": 0, "llm": 0}
+
+    @classmethod
+    def from_env(cls, search: Callable[[str], str]) -> Optional["FastPathRouter"]:
+        """FAST_PATH_ENABLED=0 turns the fast path off; FAST_PATH_MIN_CONFIDENCE tunes it"""
+        if os.getenv("FAST_PATH_ENABLED", "1") == "0":
+            return None
+        return cls(search, min_confidence=float(os.getenv("FAST_PATH_MIN_CONFIDENCE", "0.75")))
+
+    def _read_negations(self, message: str) -> Tuple[str, bool]:
+        """(message without negated symptoms, whether another negation reports a problem)"""
+        negated_failure = False
+
+        def resolve(match: "re.Match") -> str:
+            nonlocal negated_failure
+            word = match.group(1)
+            if any(p.search(word) for p in self._symptoms):
+                return " "
+            negated_failure = True
+            return word
+        return NEGATED_WORD.sub(resolve, spell_out_negations(message)), negated_failure
+
+    def classify(self, message: str) -> Dict[str, Any]:
+        """Return {"category", "confidence"} for the best matching category"""
+        if len(message.split()) > MAX_MESSAGE_WORDS or any(p.search(message) for p in self._fallthrough):
+            return {"category": None, "confidence": 0.0}
+        message, negated_failure = self._read_negations(message)
+
+        scores = {
+            category: sum(1 for pattern in patterns if pattern.search(message))
+            for category, patterns in self._rules.items()
+        }
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        best, best_score = ranked[0]
+        runner_up = ranked[1][1] if len(ranked) > 1 else 0
+        if best_score == 0 or runner_up == best_score:
+            return {"category": None, "confidence": 0.0}
+
+        problem = negated_failure or any(p.search(message) for p in self._problem)
+        # Two category keywords, or one plus a problem word, with no competing category
+        evidence = best_score + (1 if problem else 0)
+        confidence = min(1.0, 0.4 * evidence) * (1.0 if runner_up == 0 else 0.5)
+        return {"category": best, "confidence": round(confidence, 2)}
+
+    def render(self, category: str, solutions: List[str]) -> str:
+        steps = "\n".join(f"{i}. {step}" for i, step in enumerate(solutions, start=1))
+        article = "an" if category[:1] in "aeiou" else "a"
+        return (
+            f"I understand you're having {article} {category} issue. Here's how to fix it:\n\n"
+            f"{steps}\n\n"
+            f"This should take about {FIX_TIMES.get(category, 'a few minutes')}. "
+            "If this doesn't solve it, just let me know and I'll dig deeper."
+        )
+
+    def route(self, message: str) -> Optional[Dict[str, Any]]:
+        """Answer locally if confident, otherwise return None so the caller uses the LLM"""
+        intent = self.classify(message)
+        if intent["category"] is None or intent["confidence"] < self.min_confidence:
+            self.counters["llm"] += 1
+            return None
+
+        result = json.loads(self.search(intent["category"]))
+        if not result.get("found") or result["category"] != intent["category"]:
+            self.counters["llm"] += 1
+            return None
+
+        self.counters["fast_path"] += 1
+        logger.info(f"Fast path answered as '{intent['category']}' (confidence {intent['confidence']})")
+        return {
+            "agent_response": self.render(result["category"], result["solutions"]),
+            "category": result["category"],
+            "confidence": intent["confidence"]
+        }
@@ -0,0 +1,39 @@
+"""
+Gunicorn settings for running the API as several worker processes.
+
+Sessions, per-user rate limits and escalation tickets have to be visible to
+every worker, so the SQLite session backend is used unless SESSION_BACKEND is
+set explicitly:
+
+    gunicorn -c gunicorn.conf.py app:app
+
+The app is preloaded in the master, which is cheap because the agent, runner
+and model client are built lazily. The master builds the knowledge base once
+before forking so workers share its memory; each worker then builds its own
+runner and runtime and opens its model connection in post_fork
+(APP_WARMUP=0 leaves that to the first request).
+"""
+
+import multiprocessing
+import os
+
+os.environ.setdefault("SESSION_BACKEND", "sqlite")
+
+bind = os.getenv("BIND", "0.0.0.0:5000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+timeout = 120
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+
+
+def when_ready(server):
+    if preload_app:
+        from main import get_tools
+        get_tools()
+
+
+def post_fork(server, worker):
+    if preload_app and os.getenv("APP_WARMUP", "1") == "1":
+        import app
+        app.warm_up()
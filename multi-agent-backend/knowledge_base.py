@@ -0,0 +1,250 @@
+"""
+Knowledge base engine with an inverted index and BM25 ranking.
+
+Articles are loaded from a JSON or JSONL file (see KnowledgeBase.load) or fall
+back to the built-in support categories. Each article looks like:
+
+    {"id": "kb-001", "category": "internet", "title": "...",
+     "solutions": ["step 1", "step 2"], "body": "optional free text"}
+"""
+
+import hashlib
+import heapq
+import json
+import logging
+import math
+import os
+import re
+from array import array
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CATEGORIES: Dict[str, List[str]] = {
+    "internet": [
+        "Unplug router for 30 seconds and plug back in",
+        "Check if cables are properly connected",
+        "Restart your device (phone/laptop)",
+        "Contact ISP if issue persists"
+    ],
+    "billing": [
+        "Check your last invoice for charges",
+        "Verify payment method is up to date",
+        "Contact billing department for disputes"
+    ],
+    "app": [
+        "Clear app cache in settings",
+        "Update app to latest version",
+        "Reinstall the application"
+    ],
+    "api": [
+        "Check API key is valid and not expired",
+        "Verify API endpoint URL is correct",
+        "Check rate limits",
+        "Review error logs"
+    ]
+}
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have i in is it its my of on or "
+    "so that the this to was we were will with you your me our not".split()
+)
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+# Category and title terms count more than body text
+CATEGORY_WEIGHT = 3
+TITLE_WEIGHT = 2
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, split on non-alphanumerics and drop stopwords"""
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+class KnowledgeBase:
+    """Inverted index over support articles with precomputed BM25 weights"""
+
+    def __init__(self, articles: Iterable[Dict[str, Any]]):
+        self.articles: List[Dict[str, Any]] = []
+        self.categories: Dict[str, List[int]] = {}
+        self._term_ids: Dict[str, int] = {}
+        # term id -> (doc ids, BM25 weights), compact typed arrays sorted by weight
+        self._postings: List[tuple] = []
+        self.version = ""
+        self._build(articles)
+
+    @classmethod
+    def from_categories(cls, categories: Dict[str, List[str]]) -> "KnowledgeBase":
+        """Build a knowledge base with one article per category"""
+        return cls(
+            {
+                "id": f"kb-{category}",
+                "category": category,
+                "title": f"{category} troubleshooting",
+                "solutions": solutions
+            }
+            for category, solutions in categories.items()
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "KnowledgeBase":
+        """Load articles from a .json (list or {"articles": [...]}) or .jsonl file"""
+        with open(path, "r", encoding="utf-8") as f:
+            if path.endswith(".jsonl"):
+                articles = [json.loads(line) for line in f if line.strip()]
+            else:
+                data = json.load(f)
+                articles = data.get("articles", []) if isinstance(data, dict) else data
+        logger.info(f"Loaded {len(articles)} knowledge base articles from {path}")
+        return cls(articles)
+
+    @classmethod
+    def from_env(cls) -> "KnowledgeBase":
+        """Load from KB_PATH if set, otherwise use the built-in categories"""
+        path = os.getenv("KB_PATH")
+        if path and os.path.exists(path):
+            return cls.load(path)
+        if path:
+            logger.warning(f"KB_PATH {path} not found, using built-in knowledge base")
+        return cls.from_categories(DEFAULT_CATEGORIES)
+
+    def _build(self, articles: Iterable[Dict[str, Any]]):
+        term_freqs: List[Dict[str, int]] = []
+        doc_lengths: List[int] = []
+        digest = hashlib.sha1()
+
+        for article in articles:
+            doc_id = len(self.articles)
+            category = str(article.get("category", "general")).lower()
+            solutions = [str(s) for s in article.get("solutions", [])]
+            record = {
+                "id": str(article.get("id", doc_id)),
+                "category": category,
+                "title": str(article.get("title", "")),
+                "solutions": solutions
+            }
+            self.articles.append(record)
+            self.categories.setdefault(category, []).append(doc_id)
+            digest.update(json.dumps(record, sort_keys=True).encode("utf-8"))
+
+            tf: Dict[str, int] = {}
+            fields = (
+                (category, CATEGORY_WEIGHT),
+                (record["title"], TITLE_WEIGHT),
+                (" ".join(solutions), 1),
+                (str(article.get("body", "")), 1)
+            )
+            length = 0
+            for text, weight in fields:
+                for token in tokenize(text):
+                    tf[token] = tf.get(token, 0) + weight
+                    length += weight
+            term_freqs.append(tf)
+            doc_lengths.append(length)
+
+        n_docs = len(self.articles)
+        avg_len = (sum(doc_lengths) / n_docs) if n_docs else 0.0
+
+        term_ids: Dict[str, int] = {}
+        doc_freq: List[int] = []
+        for tf in term_freqs:
+            for term in tf:
+                tid = term_ids.get(term)
+                if tid is None:
+                    tid = term_ids[term] = len(doc_freq)
+                    doc_freq.append(0)
+                doc_freq[tid] += 1
+        idf = [math.log(1 + (n_docs - df + 0.5) / (df + 0.5)) for df in doc_freq]
+
+        # Forward index (doc -> sorted term ids + weights) in flat arrays for random access,
+        # and impact-ordered postings (term -> docs by descending weight) for early termination
+        postings: List[List[tuple]] = [[] for _ in doc_freq]
+        fwd_offsets = array("I", [0])
+        fwd_terms = array("I")
+        fwd_weights = array("f")
+        for doc_id, tf in enumerate(term_freqs):
+            norm = K1 * (1 - B + B * doc_lengths[doc_id] / avg_len) if avg_len else K1
+            entries = sorted(
+                (term_ids[term], idf[term_ids[term]] * freq * (K1 + 1) / (freq + norm))
+                for term, freq in tf.items()
+            )
+            for tid, weight in entries:
+                fwd_terms.append(tid)
+                fwd_weights.append(weight)
+                # Ordered by the stored (float32) weight, which is what scores are summed from
+                postings[tid].append((fwd_weights[-1], doc_id))
+            fwd_offsets.append(len(fwd_terms))
+
+        self._term_ids = term_ids
+        self._postings = []
+        for plist in postings:
+            # Best weight first, ties by ascending doc id: the order search() ranks results in
+            plist.sort(key=lambda entry: (-entry[0], entry[1]))
+            self._postings.append((array("I", (d for _, d in plist)), array("f", (w for w, _ in plist))))
+        self._fwd_offsets = fwd_offsets
+        self._fwd_terms = fwd_terms
+        self._fwd_weights = fwd_weights
+        self.version = digest.hexdigest()[:12]
+        logger.info(f"Knowledge base indexed: {n_docs} articles, {len(term_ids)} terms, version {self.version}")
+
+    def _score(self, doc_id: int, query_tids: List[int]) -> float:
+        lo = self._fwd_offsets[doc_id]
+        hi = self._fwd_offsets[doc_id + 1]
+        terms = self._fwd_terms
+        score = 0.0
+        for tid in query_tids:
+            i = bisect_left(terms, tid, lo, hi)
+            if i < hi and terms[i] == tid:
+                score += self._fwd_weights[i]
+        return score
+
+    def search(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
+        """Return the top_k articles for a free-text query, best first (ties in article order)"""
+        query_tids = sorted({
+            self._term_ids[t] for t in tokenize(query) if t in self._term_ids
+        })
+        if not query_tids or top_k <= 0:
+            return []
+
+        lists = [self._postings[tid] for tid in query_tids]
+        if len(lists) == 1:
+            doc_ids, weights = lists[0]
+            best = list(zip(weights[:top_k], doc_ids[:top_k]))
+        else:
+            # Threshold algorithm: walk impact-ordered postings in lockstep and stop once
+            # no unseen document can beat the current k-th best score. An unseen document
+            # scoring exactly the threshold could still win a tie on doc id, so the stop is strict
+            heap: List[tuple] = []
+            seen = set()
+            max_depth = max(len(doc_ids) for doc_ids, _ in lists)
+            for depth in range(max_depth):
+                threshold = 0.0
+                for doc_ids, weights in lists:
+                    if depth >= len(doc_ids):
+                        continue
+                    threshold += weights[depth]
+                    doc_id = doc_ids[depth]
+                    if doc_id in seen:
+                        continue
+                    seen.add(doc_id)
+                    entry = (self._score(doc_id, query_tids), -doc_id)
+                    if len(heap) < top_k:
+                        heapq.heappush(heap, entry)
+                    elif entry > heap[0]:
+                        heapq.heapreplace(heap, entry)
+                if len(heap) >= top_k and heap[0][0] > threshold:
+                    break
+            best = [(score, -neg_id) for score, neg_id in sorted(heap, reverse=True)]
+
+        return [
+            dict(self.articles[doc_id], score=round(score, 4))
+            for score, doc_id in best
+        ]
+
+    def __len__(self) -> int:
+        return len(self.articles)
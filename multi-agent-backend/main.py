@@ -1,133 +1,29 @@
 import os
+import threading
+from typing import Any, Dict
 from dotenv import load_dotenv
-from google.genai import types
-from google.adk.agents import LlmAgent
-from google.adk.models.google_llm import Gemini
-from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
-from google.adk.tools.function_tool import FunctionTool
-from google.adk.tools.tool_context import ToolContext
-import json
-from typing import Dict, Any, List
-from datetime import datetime
+from context_window import ContextBudget
+from escalation import create_dispatcher
 
 # Load environment
 load_dotenv()
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-os.environ["GOOGLE_API_KEY"] = GOOGLE_API_KEY
-
-print("✅ Setup and authentication complete.")
-
-# Retry configuration
-retry_config = types.HttpRetryOptions(
-    attempts=3,
-    exp_base=2,
-    initial_delay=1,
-    http_status_codes=[429, 500, 503, 504],
-)
-
-class SimplifiedAgentTools:
-    """Simplified tools that don't make additional API calls"""
-    
-    def __init__(self):
-        self.knowledge_base = {
-            "internet": [
-                "Unplug router for 30 seconds and plug back in",
-                "Check if cables are properly connected",
-                "Restart your device (phone/laptop)",
-                "Contact ISP if issue persists"
-            ],
-            "billing": [
-                "Check your last invoice for charges",
-                "Verify payment method is up to date",
-                "Contact billing department for disputes"
-            ],
-            "app": [
-                "Clear app cache in settings",
-                "Update app to latest version",
-                "Reinstall the application"
-            ],
-            "api": [
-                "Check API key is valid and not expired",
-                "Verify API endpoint URL is correct",
-                "Check rate limits",
-                "Review error logs"
-            ]
-        }
-    
-    def search_knowledge_base(self, category: str) -> str:
-        """Search knowledge base for solutions"""
-        category = category.lower()
-        
-        # Find matching category
-        for key, solutions in self.knowledge_base.items():
-            if key in category or category in key:
-                return json.dumps({
-                    "category": key,
-                    "solutions": solutions,
-                    "found": True
-                })
-        
-        return json.dumps({
-            "category": "general",
-            "solutions": ["Please describe your issue in more detail"],
-            "found": False
-        })
-    
-    def escalate_to_human(
-        self, 
-        reason: str, 
-        customer_message: str,
-        tool_context: ToolContext
-    ) -> str:
-        """Escalate issue to human agent"""
-        
-        if not tool_context.tool_confirmation:
-            tool_context.request_confirmation(
-                hint=f"🚨 Escalation: {reason}\nMessage: '{customer_message}'\n\nAssign to human?",
-                payload={
-                    "reason": reason,
-                    "message": customer_message,
-                    "timestamp": datetime.now().isoformat()
-                }
-            )
-            return json.dumps({
-                "status": "awaiting_confirmation",
-                "message": "Escalating to human agent..."
-            })
-        
-        if tool_context.tool_confirmation.confirmed:
-            agent_id = f"AGENT-{hash(customer_message) % 1000:03d}"
-            return json.dumps({
-                "status": "escalated",
-                "agent_id": agent_id,
-                "message": "Connected to human agent"
-            })
-        
-        return json.dumps({
-            "status": "cancelled",
-            "message": "Continuing with AI assistance"
-        })
-
-# Initialize tools
-tools_instance = SimplifiedAgentTools()
-knowledge_tool = FunctionTool(tools_instance.search_knowledge_base)
-escalate_tool = FunctionTool(func=tools_instance.escalate_to_human)
-
-print("✅ Simplified tools created (2 tools, no extra API calls)")
-
-# Create support agent - SINGLE MODEL ONLY
-support_agent = LlmAgent(
-    model=Gemini(
-        model_id="gemini-2.0-flash-exp",
-        http_retry_options=retry_config
-    ),
-    name="Efficient_Support_Agent",
-    instruction="""You are a helpful customer support agent. Follow this workflow:
+
+# Everything below is built on first use rather than at import, so importing
+# this module (and app) is cheap. The agent, model client, session service,
+# runner and async runtime own threads, sockets and connections, so they are
+# built per process: a process forked after they exist (e.g. a gunicorn
+# worker from a preloaded master) builds its own. The tools, knowledge base,
+# dispatcher and context budget are plain data and are shared.
+_lock = threading.RLock()
+_shared: Dict[str, Any] = {}
+_process: Dict[str, Any] = {}
+_process_pid = None
+
+AGENT_INSTRUCTION = """You are a helpful customer support agent. Follow this workflow:
 
 1. **Understand the issue**: Listen to what the customer needs
 2. **Categorize**: Determine if it's about internet, billing, app, api, or general support
-3. **Search knowledge**: Use search_knowledge_base with the category (e.g., "internet", "billing")
+3. **Search knowledge**: Use search_knowledge_base with the category (e.g., "internet", "billing") or the customer's own description of the problem
 4. **Provide solution**: Give clear, numbered steps from the knowledge base
 5. **Escalate if needed**: If customer is frustrated or issue is complex, use escalate_to_human
 
@@ -140,38 +36,182 @@ RESPONSE FORMAT:
 
 This should take about [time]. [Add escalation note if escalating]"
 
-Be friendly, concise, and helpful. Always use the knowledge base before suggesting escalation.""",
-    tools=[knowledge_tool, escalate_tool]
-)
+Be friendly, concise, and helpful. Always use the knowledge base before suggesting escalation."""
+
+
+def _build_tools():
+    from agent_tools import SimplifiedAgentTools
+
+    tools_instance = SimplifiedAgentTools(dispatcher=get_dispatcher())
+    print("✅ Simplified tools created (2 tools, no extra API calls)")
+    return tools_instance
+
+
+def _build_process_components() -> Dict[str, Any]:
+    from google.genai import types
+    from google.adk.agents import LlmAgent
+    from google.adk.models.google_llm import Gemini
+    from google.adk.runners import Runner
+    from google.adk.sessions import InMemorySessionService
+    from google.adk.tools.function_tool import FunctionTool
+    from async_runtime import AsyncRuntime
+    from event_replay import wrap_runner
+    from model_transport import ModelTransport, install
+
+    print("✅ Setup and authentication complete.")
+
+    # Retry configuration
+    retry_config = types.HttpRetryOptions(
+        attempts=3,
+        exp_base=2,
+        initial_delay=1,
+        http_status_codes=[429, 500, 503, 504],
+    )
+
+    tools_instance = get_tools()
+    knowledge_tool = FunctionTool(tools_instance.search_knowledge_base)
+    escalate_tool = FunctionTool(func=tools_instance.escalate_to_human)
+
+    # Keeps the prompt bounded as conversations grow (None when CONTEXT_BUDGET_ENABLED=0)
+    context_budget = get_context_budget()
+
+    # Pooled keep-alive transport for model calls (None when GEMINI_TRANSPORT=0)
+    model_transport = ModelTransport.from_env()
+    model_kwargs = {}
+    if model_transport is not None:
+        install(model_transport)
+        model_kwargs["client"] = model_transport.genai_client(retry_options=retry_config)
+
+    # Create support agent - SINGLE MODEL ONLY
+    support_agent = LlmAgent(
+        model=Gemini(
+            model_id="gemini-2.0-flash-exp",
+            http_retry_options=retry_config,
+            **model_kwargs
+        ),
+        name="Efficient_Support_Agent",
+        instruction=AGENT_INSTRUCTION,
+        tools=[knowledge_tool, escalate_tool],
+        before_model_callback=context_budget.before_model_callback if context_budget else None
+    )
+
+    print("✅ Efficient support agent created")
+
+    # Create session service and runner
+    if os.getenv("SESSION_BACKEND", "memory").lower() == "sqlite":
+        # Shared with every worker process on this host
+        from sqlite_sessions import SQLiteSessionService
+        session_service = SQLiteSessionService()
+    else:
+        session_service = InMemorySessionService()
+
+    runner = Runner(
+        app_name="multi_agent_support",
+        agent=support_agent,
+        session_service=session_service
+    )
+    # RUNNER_MODE=record|replay captures or plays back event streams (see event_replay)
+    runner = wrap_runner(runner)
+
+    print("✅ ADK Runner initialized")
+
+    # Single long-lived event loop shared by all request threads
+    runtime = AsyncRuntime()
+
+    print("✅ Async runtime started")
+
+    print("\n" + "="*60)
+    print("🚀 EFFICIENT SUPPORT SYSTEM")
+    print("="*60)
+    print("✅ Single Model: gemini-2.0-flash-exp")
+    print("✅ Optimized: 1 API call per message (vs 8)")
+    print("✅ 2 Tools:")
+    print("   1. Knowledge Base Search")
+    print("   2. Human Escalation")
+    print("="*60 + "\n")
+
+    return {
+        "support_agent": support_agent,
+        "model_transport": model_transport,
+        "session_service": session_service,
+        "runner": runner,
+        "runtime": runtime
+    }
+
+
+def _shared_component(name: str, build):
+    component = _shared.get(name)
+    if component is None and name not in _shared:
+        with _lock:
+            if name not in _shared:
+                _shared[name] = build()
+            component = _shared[name]
+    return component
+
+
+def _process_component(name: str):
+    global _process, _process_pid
+    if _process_pid != os.getpid():
+        with _lock:
+            if _process_pid != os.getpid():
+                _process = _build_process_components()
+                _process_pid = os.getpid()
+    return _process[name]
+
+
+def is_built() -> bool:
+    """Whether this process has built its agent and runner yet"""
+    return _process_pid == os.getpid()
 
-print("✅ Efficient support agent created")
 
-# Create session service and runner
-session_service = InMemorySessionService()
+def get_runner():
+    return _process_component("runner")
 
-runner = Runner(
-    app_name="multi_agent_support",
-    agent=support_agent,
-    session_service=session_service
-)
+def get_agent():
+    return _process_component("support_agent")
 
-print("✅ ADK Runner initialized")
+def get_session_service():
+    return _process_component("session_service")
 
-print("\n" + "="*60)
-print("🚀 EFFICIENT SUPPORT SYSTEM")
-print("="*60)
-print("✅ Single Model: gemini-2.0-flash-exp")
-print("✅ Optimized: 1 API call per message (vs 8)")
-print("✅ 2 Tools:")
-print("   1. Knowledge Base Search")
-print("   2. Human Escalation")
-print("="*60 + "\n")
+def get_runtime():
+    return _process_component("runtime")
 
-def get_runner():
-    return runner
+def get_model_transport():
+    return _process_component("model_transport")
 
-def get_agent():
-    return support_agent
+def get_tools():
+    return _shared_component("tools_instance", _build_tools)
 
-def get_session_service():
-    return session_service
\ No newline at end of file
+def get_context_budget():
+    return _shared_component("context_budget", ContextBudget.from_env)
+
+def get_dispatcher():
+    return _shared_component("dispatcher", create_dispatcher)
+
+def use_dispatcher(dispatcher):
+    """Have the tools escalate through this dispatcher instead of create_dispatcher()'s
+
+    Must be called before the tools are built (e.g. by a batch job whose
+    escalations must not reach the real queue).
+    """
+    with _lock:
+        if "dispatcher" in _shared:
+            raise RuntimeError("The dispatcher is already built")
+        _shared["dispatcher"] = dispatcher
+
+
+_LAZY_ATTRIBUTES = {
+    "support_agent": get_agent,
+    "runner": get_runner,
+    "session_service": get_session_service,
+    "runtime": get_runtime,
+    "tools_instance": get_tools,
+    "context_budget": get_context_budget
+}
+
+
+def __getattr__(name: str):
+    # main.runner, main.support_agent, ... still work, building on first access
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
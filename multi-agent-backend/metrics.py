@@ -0,0 +1,262 @@
+"""
+Minimal Prometheus-style metrics without external dependencies.
+
+Counters and histograms record into per-thread shards, so the request path
+never takes a lock (only a thread's first observation registers its shard).
+Shards are summed when /metrics is scraped. Gauges are either set directly or
+computed by a callback at scrape time.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _merge(into: dict, shard: dict):
+    """Add shard values into `into`: numbers are summed, histogram entries element-wise"""
+    for key, value in shard.items():
+        if isinstance(value, list):
+            total = into.get(key)
+            into[key] = list(value) if total is None else [a + b for a, b in zip(total, value)]
+        else:
+            into[key] = into.get(key, 0) + value
+
+
+class _Sharded:
+    """Per-thread dict shards, merged on read"""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards: List[Tuple[threading.Thread, dict]] = []
+        # Totals from threads that have exited (the threaded server spawns one per request)
+        self._retired: dict = {}
+        self._register_lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._register_lock:
+                self._retire_dead()
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _retire_dead(self):
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                _merge(self._retired, shard)
+        self._shards = live
+
+    def _merged(self) -> dict:
+        with self._register_lock:
+            self._retire_dead()
+            totals: dict = {}
+            _merge(totals, self._retired)
+            shards = [shard for _, shard in self._shards]
+        for shard in shards:
+            # dict.copy() runs in C under the GIL, so it never sees a half-inserted key
+            _merge(totals, shard.copy())
+        return totals
+
+
+class Counter(_Sharded):
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__()
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def inc(self, *labels: str, amount: float = 1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        values = self._merged()
+        if not values and not self.labelnames:
+            values = {(): 0}
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Sharded):
+    """Up/down value, or a callback evaluated at scrape time"""
+
+    def __init__(self, name: str, documentation: str, callback: Optional[Callable[[], float]] = None):
+        super().__init__()
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+
+    def inc(self, amount: float = 1):
+        shard = self._shard()
+        shard[()] = shard.get((), 0) + amount
+
+    def dec(self, amount: float = 1):
+        self.inc(-amount)
+
+    def value(self) -> float:
+        if self.callback is not None:
+            return self.callback()
+        return self._merged().get((), 0)
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} gauge",
+            f"{self.name} {_format_value(self.value())}"
+        ]
+
+
+class Histogram(_Sharded):
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__()
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (float("inf"),)
+
+    def observe(self, value: float, *labels: str):
+        shard = self._shard()
+        entry = shard.get(labels)
+        if entry is None:
+            # [per-bucket counts..., sum, count]
+            entry = shard[labels] = [0] * len(self.buckets) + [0.0, 0]
+        entry[bisect_left(self.buckets, value)] += 1
+        entry[-2] += value
+        entry[-1] += 1
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def render(self) -> List[str]:
+        merged = self._merged()
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, entry in sorted(merged.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(entry[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {int(entry[-1])}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, callback: Optional[Callable[[], float]] = None) -> Gauge:
+        return self.register(Gauge(name, documentation, callback))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# Latency per stage of a chat turn
+SESSION_CREATE_SECONDS = registry.histogram(
+    "support_session_create_seconds", "Time to register a session with the ADK session service")
+RUNNER_SECONDS = registry.histogram(
+    "support_runner_seconds", "Total runner.run time for one turn")
+RUNNER_FIRST_EVENT_SECONDS = registry.histogram(
+    "support_runner_first_event_seconds", "Time from starting the runner to its first event")
+EXTRACTION_SECONDS = registry.histogram(
+    "support_response_extraction_seconds", "Time to extract reply text from the final event",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05))
+REQUEST_SECONDS = registry.histogram(
+    "support_request_seconds", "Whole HTTP request latency", labelnames=("endpoint", "status"))
+
+# Per-turn activity
+EVENTS_PER_TURN = registry.histogram(
+    "support_runner_events_per_turn", "Runner events yielded per turn", buckets=(1, 2, 3, 5, 8, 13, 21, 34))
+TOOL_CALLS = registry.counter(
+    "support_tool_invocations_total", "Tool calls requested by the model", labelnames=("tool",))
+FALLBACK_RESPONSES = registry.counter(
+    "support_fallback_responses_total", "Turns answered with the generic fallback message")
+TURNS = registry.counter(
+    "support_turns_total", "Completed chat turns by serving path", labelnames=("served_by",))
+PROMPT_TOKENS = registry.histogram(
+    "support_prompt_tokens", "Estimated prompt tokens sent to the model per call",
+    buckets=(250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000))
+ERRORS = registry.counter(
+    "support_errors_total", "Errors by stage", labelnames=("stage",))
+
+# Model HTTP transport (see model_transport)
+MODEL_HTTP_SECONDS = registry.histogram(
+    "support_model_http_seconds", "Time from sending a model API request to its response headers")
+MODEL_HEDGES = registry.counter(
+    "support_model_hedged_requests_total", "Model requests that sent a hedge, by which attempt answered",
+    labelnames=("winner",))
+MODEL_DEADLINE_EXCEEDED = registry.counter(
+    "support_model_deadline_exceeded_total", "Model requests abandoned because the caller's deadline passed")
+
+# WebSocket chat transport (see ws_server)
+WS_CONNECTIONS = registry.gauge(
+    "support_ws_connections", "Open authenticated WebSocket chat connections")
+WS_FRAMES = registry.counter(
+    "support_ws_frames_total", "WebSocket frames by direction and type", labelnames=("direction", "type"))
+WS_DROPPED_FRAMES = registry.counter(
+    "support_ws_dropped_frames_total", "Streamed deltas dropped because a client was not reading")
+WS_CLOSED = registry.counter(
+    "support_ws_closed_total", "WebSocket connections closed by the server, by reason", labelnames=("reason",))
+
+# Transcript archive (see transcript_archive)
+TRANSCRIPT_RECORDS = registry.counter(
+    "support_transcript_records_total", "Transcript records written to or dropped from the archive",
+    labelnames=("outcome",))
+TRANSCRIPT_BATCH_SIZE = registry.histogram(
+    "support_transcript_batch_records", "Records per group commit", buckets=(1, 2, 5, 10, 25, 50, 100, 250, 1000, 4096))
+TRANSCRIPT_COMMIT_SECONDS = registry.histogram(
+    "support_transcript_commit_seconds", "Time to write and fsync one batch of transcript records",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25))
+
+HISTORY_BYTES = registry.gauge(
+    "support_history_bytes", "UTF-8 bytes of conversation history held in sessions")
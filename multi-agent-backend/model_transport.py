@@ -0,0 +1,279 @@
+"""
+Shared HTTP transport for Gemini API calls.
+
+Without it, ADK's Gemini model builds a google-genai client with default
+HTTP settings. ModelTransport gives the process one explicitly configured
+transport instead:
+
+- a bounded connection pool with keep-alive (GEMINI_POOL_SIZE,
+  GEMINI_KEEPALIVE_CONNECTIONS, GEMINI_KEEPALIVE_SECONDS), over HTTP/2 when
+  the h2 package is installed (GEMINI_HTTP2=0 forces HTTP/1.1). Each event
+  loop gets its own pool, since connections cannot move between loops;
+- per-request deadlines: a Flask request sets one with set_deadline(), it
+  travels with the call onto the runtime loop (AsyncRuntime carries context
+  variables across), and every attempt, including genai's retries, only gets
+  the time that is left. Once it has passed, DeadlineExceeded is raised,
+  which genai does not retry;
+- optional hedging (GEMINI_HEDGE=1): if no response has arrived after the
+  recent p95 latency, an identical second request is sent and whichever
+  answers first is used; the other is cancelled. At most
+  GEMINI_HEDGE_MAX_RATIO of requests are hedged, so a slow backend does not
+  see double the load. Generation requests have no side effects, so a
+  duplicate only costs tokens.
+
+Latency is measured to response headers, which for generateContent is the
+whole generation and for streaming is the first chunk. GEMINI_BASE_URL points
+the client elsewhere (e.g. benchmarks/mock_gemini.py).
+"""
+
+import asyncio
+import contextvars
+import logging
+import os
+import time
+import weakref
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+import httpx
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("model_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """The caller's deadline passed before the model answered"""
+
+
+def set_deadline(seconds: Optional[float]) -> contextvars.Token:
+    """Model calls made from this context must finish within `seconds` (None: no deadline)"""
+    return _deadline.set(None if seconds is None else time.monotonic() + seconds)
+
+
+def reset_deadline(token: contextvars.Token):
+    try:
+        _deadline.reset(token)
+    except ValueError:
+        # Reset from a different context (e.g. a streamed response finishing); just clear it
+        _deadline.set(None)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline, or None"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+class LatencyWindow:
+    """Recent latencies and their quantiles, recomputed every `refresh` samples"""
+
+    def __init__(self, size: int = 256, refresh: int = 16):
+        self.samples: Deque[float] = deque(maxlen=size)
+        self.refresh = refresh
+        self._since_refresh = 0
+        self._sorted = []
+
+    def observe(self, seconds: float):
+        self.samples.append(seconds)
+        self._since_refresh += 1
+        if self._since_refresh >= self.refresh:
+            self._sorted = sorted(self.samples)
+            self._since_refresh = 0
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self._sorted:
+            return None
+        return self._sorted[min(len(self._sorted) - 1, int(q * len(self._sorted)))]
+
+
+class ModelTransport(httpx.AsyncBaseTransport):
+    """Pooled, deadline-aware, optionally hedging httpx transport"""
+
+    def __init__(self, pool_size: int = 64, keepalive_connections: int = 32, keepalive_seconds: float = 60.0,
+                 http2: bool = True, hedge: bool = False, hedge_quantile: float = 0.95,
+                 hedge_min_samples: int = 50, hedge_max_ratio: float = 0.1):
+        self.limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=keepalive_connections,
+                                   keepalive_expiry=keepalive_seconds)
+        self.http2 = http2
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_max_ratio = hedge_max_ratio
+        self.latency = LatencyWindow()
+        self._pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncHTTPTransport]" = \
+            weakref.WeakKeyDictionary()
+        self.counters = {"requests": 0, "in_flight": 0, "hedged": 0, "hedge_won": 0, "deadline_exceeded": 0}
+
+    @classmethod
+    def from_env(cls) -> Optional["ModelTransport"]:
+        """GEMINI_TRANSPORT=0 leaves ADK's default client in place"""
+        if os.getenv("GEMINI_TRANSPORT", "1") == "0":
+            return None
+        http2 = os.getenv("GEMINI_HTTP2", "1") == "1"
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("GEMINI_HTTP2 requested but h2 is not installed; using HTTP/1.1 keep-alive")
+                http2 = False
+        return cls(
+            pool_size=int(os.getenv("GEMINI_POOL_SIZE", "64")),
+            keepalive_connections=int(os.getenv("GEMINI_KEEPALIVE_CONNECTIONS", "32")),
+            keepalive_seconds=float(os.getenv("GEMINI_KEEPALIVE_SECONDS", "60")),
+            http2=http2,
+            hedge=os.getenv("GEMINI_HEDGE", "0") == "1",
+            hedge_quantile=float(os.getenv("GEMINI_HEDGE_QUANTILE", "0.95")),
+            hedge_min_samples=int(os.getenv("GEMINI_HEDGE_MIN_SAMPLES", "50")),
+            hedge_max_ratio=float(os.getenv("GEMINI_HEDGE_MAX_RATIO", "0.1"))
+        )
+
+    def genai_client(self, api_key: Optional[str] = None, retry_options=None, base_url: Optional[str] = None):
+        """A google-genai Client whose async calls go through this transport"""
+        from google import genai
+        from google.genai import types
+
+        http_client = httpx.AsyncClient(transport=self, timeout=httpx.Timeout(120.0, connect=10.0))
+        return genai.Client(
+            api_key=api_key or os.getenv("GOOGLE_API_KEY"),
+            http_options=types.HttpOptions(
+                base_url=base_url or os.getenv("GEMINI_BASE_URL") or None,
+                retry_options=retry_options,
+                httpx_async_client=http_client
+            )
+        )
+
+    def _pool(self) -> httpx.AsyncHTTPTransport:
+        loop = asyncio.get_running_loop()
+        pool = self._pools.get(loop)
+        if pool is None:
+            pool = self._pools[loop] = httpx.AsyncHTTPTransport(http2=self.http2, limits=self.limits)
+        return pool
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging the next request, or None to not hedge it"""
+        if not self.hedge or len(self.latency.samples) < self.hedge_min_samples:
+            return None
+        if self.counters["hedged"] >= self.hedge_max_ratio * self.counters["requests"]:
+            return None
+        return self.latency.quantile(self.hedge_quantile)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        time_left = remaining()
+        if time_left is not None and time_left <= 0:
+            self._deadline_exceeded()
+        pool = self._pool()
+        delay = self.hedge_delay()
+        self.counters["requests"] += 1
+        self.counters["in_flight"] += 1
+        start = time.perf_counter()
+        try:
+            if delay is None:
+                send = pool.handle_async_request(request)
+            else:
+                send = self._hedged(pool, request, delay)
+            response = await asyncio.wait_for(send, time_left)
+        except asyncio.TimeoutError:
+            self._deadline_exceeded()
+        finally:
+            self.counters["in_flight"] -= 1
+        elapsed = time.perf_counter() - start
+        self.latency.observe(elapsed)
+        metrics.MODEL_HTTP_SECONDS.observe(elapsed)
+        return response
+
+    def _deadline_exceeded(self):
+        self.counters["deadline_exceeded"] += 1
+        metrics.MODEL_DEADLINE_EXCEEDED.inc()
+        raise DeadlineExceeded("Request deadline passed before the model answered")
+
+    async def _hedged(self, pool: httpx.AsyncHTTPTransport, request: httpx.Request, delay: float) -> httpx.Response:
+        body = await request.aread()
+        primary = asyncio.ensure_future(pool.handle_async_request(request))
+        attempts = {primary}
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=delay)
+            if done:
+                return primary.result()
+
+            self.counters["hedged"] += 1
+            hedge = asyncio.ensure_future(pool.handle_async_request(httpx.Request(
+                request.method, request.url, headers=request.headers, content=body, extensions=request.extensions
+            )))
+            attempts.add(hedge)
+            error = None
+            while attempts:
+                done, attempts = await asyncio.wait(attempts, return_when=asyncio.FIRST_COMPLETED)
+                winners = [task for task in done if task.exception() is None]
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                if winners:
+                    winner = hedge if hedge in winners else winners[0]
+                    for task in winners:
+                        if task is not winner:
+                            await task.result().aclose()
+                    won = "hedge" if winner is hedge else "primary"
+                    if winner is hedge:
+                        self.counters["hedge_won"] += 1
+                    metrics.MODEL_HEDGES.inc(won)
+                    return winner.result()
+            raise error
+        finally:
+            for task in attempts:
+                task.cancel()
+
+    async def aclose(self):
+        for pool in list(self._pools.values()):
+            await pool.aclose()
+
+    def pool_stats(self) -> Dict[str, int]:
+        """Connections across this process's pools (httpcore internals; zeros if unavailable)"""
+        stats = {"connections": 0, "idle": 0, "waiting": 0}
+        for pool in list(self._pools.values()):
+            inner = getattr(pool, "_pool", None)
+            for connection in list(getattr(inner, "connections", [])):
+                stats["connections"] += 1
+                stats["idle"] += 1 if connection.is_idle() else 0
+            stats["waiting"] += sum(1 for status in list(getattr(inner, "_requests", []))
+                                    if getattr(status, "connection", None) is None)
+        return stats
+
+    def stats(self) -> Dict[str, Any]:
+        p95 = self.latency.quantile(0.95)
+        return {
+            "http2": self.http2,
+            "pool_size": self.limits.max_connections,
+            **self.pool_stats(),
+            "hedging": self.hedge,
+            "p95_seconds": round(p95, 4) if p95 is not None else None,
+            **self.counters
+        }
+
+
+# Gauges read whichever transport this process installed last
+_current: Optional[ModelTransport] = None
+_gauges_registered = False
+
+
+def _pool_stat(name: str) -> float:
+    return _current.pool_stats()[name] if _current is not None else 0
+
+
+def install(transport: ModelTransport) -> ModelTransport:
+    """Make `transport` the one reported in metrics"""
+    global _current, _gauges_registered
+    if not _gauges_registered:
+        metrics.registry.gauge("support_model_pool_connections", "Open connections to the model API",
+                               callback=lambda: _pool_stat("connections"))
+        metrics.registry.gauge("support_model_pool_idle_connections", "Idle keep-alive connections to the model API",
+                               callback=lambda: _pool_stat("idle"))
+        metrics.registry.gauge("support_model_pool_waiting_requests", "Model requests waiting for a pooled connection",
+                               callback=lambda: _pool_stat("waiting"))
+        metrics.registry.gauge("support_model_requests_in_flight", "Model API requests in progress",
+                               callback=lambda: _current.counters["in_flight"] if _current is not None else 0)
+        _gauges_registered = True
+    _current = transport
+    return transport
@@ -0,0 +1,173 @@
+"""
+Answer cache for repeated customer questions.
+
+Messages are normalised into a fingerprint (lowercased, stopwords dropped,
+common phrasings of "it's broken" folded together, words sorted) so that
+"my internet is down" and "Internet not working" share one entry. Negation
+is kept: a negated word gets its own token ("not:receive"), so "I can receive
+email" and "I can not receive email" do not. Keys also carry the knowledge
+base version, and a version change clears the cache.
+
+A key says nothing about the conversation around the message, so callers
+only use it for a session's opening message.
+Entries expire after a TTL and the least recently used ones are evicted once
+the cache exceeds its byte budget.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from knowledge_base import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Negative contractions spelled out first, so "can't" and "cannot" read as "can not"
+CONTRACTIONS = [
+    (re.compile(r"\bcan(?:'?t|not)\b"), "can not"),
+    (re.compile(r"\bwon'?t\b"), "will not"),
+    (re.compile(r"\b(do|does|did|is|are|was|were|could|would|should|have|has|had)n'?t\b"), r"\1 not"),
+]
+
+# Phrasings folded onto one canonical token before tokenizing
+PHRASE_SYNONYMS = [
+    (re.compile(r"\b(not|is not|does not|will not|stopped|stops) (working|work|loading|load)\b"), "down"),
+    (re.compile(r"\b(broken|dead|out|offline)\b"), "down"),
+    (re.compile(r"\bwi-?fi\b"), "wifi"),
+    (re.compile(r"\b(bill|bills|invoices?)\b"), "billing"),
+]
+
+# Words that negate the content word after them
+NEGATIONS = frozenset(["not", "no", "never"])
+
+# Per-entry bookkeeping on top of key and answer text
+ENTRY_OVERHEAD_BYTES = 200
+
+
+def spell_out_negations(message: str) -> str:
+    """Lowercased message with negative contractions written as "<verb> not" """
+    text = message.lower()
+    for pattern, replacement in CONTRACTIONS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def fingerprint(message: str) -> Tuple[str, int]:
+    """Return (fingerprint, number of content tokens) for a customer message"""
+    text = spell_out_negations(message)
+    for pattern, replacement in PHRASE_SYNONYMS:
+        text = pattern.sub(replacement, text)
+    tokens = set()
+    negated = False
+    for word in re.findall(r"[a-z0-9]+", text):
+        if word in NEGATIONS:
+            negated = True
+            continue
+        for token in tokenize(word):
+            tokens.add(f"not:{token}" if negated else token)
+            negated = False
+    if negated:
+        # Negation with nothing after it ("it works, or not")
+        tokens.add("not")
+    tokens = sorted(tokens)
+    return hashlib.sha1(" ".join(tokens).encode("utf-8")).hexdigest(), len(tokens)
+
+
+def message_key(message: str, kb_version: str, min_tokens: int = 2) -> Optional[str]:
+    """Key for a message, or None if it is too short to be answered out of context"""
+    digest, token_count = fingerprint(message)
+    if token_count < min_tokens:
+        return None
+    return f"{kb_version}:{digest}"
+
+
+class ResponseCache:
+    """LRU + TTL cache of agent answers bounded by total size in bytes"""
+
+    def __init__(self, max_bytes: int = 8 * 1024 * 1024, ttl: float = 3600.0):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.kb_version = ""
+        self._entries: "OrderedDict[str, Tuple[str, float, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expired": 0, "invalidations": 0}
+
+    @classmethod
+    def from_env(cls) -> Optional["ResponseCache"]:
+        """RESPONSE_CACHE_ENABLED=0 disables; RESPONSE_CACHE_MAX_BYTES / RESPONSE_CACHE_TTL tune it"""
+        if os.getenv("RESPONSE_CACHE_ENABLED", "1") == "0":
+            return None
+        return cls(
+            max_bytes=int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(8 * 1024 * 1024))),
+            ttl=float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+        )
+
+    def check_kb_version(self, kb_version: str):
+        """Drop every entry when the knowledge base changes"""
+        if kb_version == self.kb_version:
+            return
+        with self._lock:
+            if kb_version == self.kb_version:
+                return
+            if self._entries:
+                logger.info(f"Knowledge base changed ({self.kb_version} -> {kb_version}), clearing response cache")
+                self.counters["invalidations"] += 1
+            self._entries.clear()
+            self._bytes = 0
+            self.kb_version = kb_version
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.counters["misses"] += 1
+                return None
+            answer, stored_at, size = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                self._bytes -= size
+                self.counters["expired"] += 1
+                self.counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.counters["hits"] += 1
+            return answer
+
+    def put(self, key: str, answer: str):
+        size = len(key) + len(answer.encode("utf-8")) + ENTRY_OVERHEAD_BYTES
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._entries[key] = (answer, time.monotonic(), size)
+            self._bytes += size
+            self.counters["stores"] += 1
+            while self._bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.counters["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.counters["invalidations"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hit_rate": round(self.counters["hits"] / lookups, 3) if lookups else 0.0,
+                **self.counters
+            }
@@ -0,0 +1,527 @@
+"""
+Bounded session stores with idle TTL and LRU eviction.
+
+Stores behave like the dict they replace (`sid in store`, `store[sid]`,
+`del store[sid]`) but cap the number of sessions, expire idle ones from a
+background sweeper thread and notify listeners on every removal so the ADK
+session service can drop its copy too. Mutations go through `update()` so
+backends that keep sessions outside the process can persist them.
+
+Sessions are SessionRecord objects: `__slots__` records with epoch-float
+timestamps and compact Message entries. ISO-8601 strings are only produced
+by to_dict() when a session is serialized for a response.
+
+The in-memory store is split into shards by session-id hash, each with its
+own lock, so requests for different sessions rarely contend. LRU order and
+the size cap are kept per shard.
+
+query() serves the admin listing from secondary indexes (last activity,
+user id, escalation status). Each shard indexes its own sessions under its
+own lock, so a turn updating the index only contends with its shard; a page
+takes up to page size + 1 keys from every shard and merges them, which
+costs O(shards * (log n + page size)) rather than a scan of every session.
+
+SESSION_BACKEND selects the implementation: "memory" (default, one process)
+or "sqlite" (shared by every worker process on the host, see sqlite_sessions).
+"""
+
+import logging
+import os
+import heapq
+import itertools
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def isoformat(timestamp: Optional[float]) -> Optional[str]:
+    """Epoch seconds -> local ISO-8601 string (the format the API has always returned)"""
+    return datetime.fromtimestamp(timestamp).isoformat() if timestamp is not None else None
+
+
+class Message:
+    """One conversation entry"""
+
+    __slots__ = ("role", "content", "timestamp")
+
+    def __init__(self, role: str, content: str, timestamp: float):
+        self.role = role
+        self.content = content
+        self.timestamp = timestamp
+
+    def to_dict(self, seq: Optional[int] = None) -> Dict[str, Any]:
+        data = {"role": self.role, "content": self.content, "timestamp": isoformat(self.timestamp)}
+        if seq is not None:
+            data["seq"] = seq
+        return data
+
+
+class SessionRecord:
+    """Flask-side state of one chat session"""
+
+    __slots__ = ("user_id", "created_at", "last_activity", "message_count", "escalation_status",
+                 "recovered", "history", "touched")
+
+    def __init__(self, user_id: str, created_at: Optional[float] = None, recovered: bool = False):
+        self.user_id = user_id
+        self.created_at = created_at if created_at is not None else time.time()
+        self.last_activity: Optional[float] = None
+        self.message_count = 0
+        self.escalation_status = "none"
+        self.recovered = recovered
+        self.history: List[Message] = []
+        # Monotonic time of last access; the store's LRU/TTL clock
+        self.touched = 0.0
+
+    @property
+    def active_at(self) -> float:
+        """Last activity, or creation time for a session with no turns yet"""
+        return self.last_activity if self.last_activity is not None else self.created_at
+
+    def add_message(self, role: str, content: str, timestamp: Optional[float] = None):
+        # Roles are a handful of literals, so every entry shares the same string object
+        self.history.append(Message(role, content, timestamp if timestamp is not None else time.time()))
+
+    @property
+    def history_length(self) -> int:
+        """Number of messages; stores that keep history elsewhere answer without loading it"""
+        return len(self.history)
+
+    def messages_after(self, after: int = 0, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Serialized messages with seq > after. History is append-only, so seq is position + 1"""
+        end = None if limit is None else after + limit
+        return [message.to_dict(seq) for seq, message in enumerate(self.history[after:end], start=after + 1)]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """API representation with ISO timestamps"""
+        return {
+            "user_id": self.user_id,
+            "created_at": isoformat(self.created_at),
+            "last_activity": isoformat(self.last_activity),
+            "message_count": self.message_count,
+            "escalation_status": self.escalation_status,
+            "recovered": self.recovered,
+            "conversation_history": [message.to_dict() for message in self.history]
+        }
+
+    def to_state(self) -> Dict[str, Any]:
+        """Compact JSON-able form of the scalar fields; persistent stores keep messages apart"""
+        return {
+            "u": self.user_id,
+            "c": self.created_at,
+            "a": self.last_activity,
+            "n": self.message_count,
+            "e": self.escalation_status,
+            "r": self.recovered
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "SessionRecord":
+        record = cls(state["u"], state["c"], state.get("r", False))
+        record.last_activity = state.get("a")
+        record.message_count = state.get("n", 0)
+        record.escalation_status = state.get("e", "none")
+        return record
+
+
+RemoveListener = Callable[[str, SessionRecord, str], None]
+
+# (active_at, session_id): the sort key of every index
+IndexKey = Tuple[float, str]
+
+
+def encode_cursor(key: IndexKey) -> str:
+    return f"{key[0]!r}:{key[1]}"
+
+
+def decode_cursor(cursor: str) -> IndexKey:
+    """Inverse of encode_cursor; raises ValueError on a malformed cursor"""
+    active_at, _, session_id = cursor.partition(":")
+    if not session_id:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return float(active_at), session_id
+
+
+class _SortedList:
+    """Sorted list kept as a list of bounded blocks: O(sqrt n) insert/remove, O(log n) seek"""
+
+    LOAD = 512
+
+    def __init__(self, items=()):
+        self._blocks: List[list] = []
+        self._maxes: list = []
+        for item in sorted(items):
+            if not self._blocks or len(self._blocks[-1]) >= self.LOAD:
+                self._blocks.append([])
+                self._maxes.append(None)
+            self._blocks[-1].append(item)
+            self._maxes[-1] = item
+
+    def add(self, item):
+        if not self._blocks:
+            self._blocks.append([item])
+            self._maxes.append(item)
+            return
+        i = bisect_left(self._maxes, item)
+        if i == len(self._maxes):
+            i -= 1
+            self._blocks[i].append(item)
+            self._maxes[i] = item
+        else:
+            insort(self._blocks[i], item)
+        block = self._blocks[i]
+        if len(block) > 2 * self.LOAD:
+            self._blocks.insert(i + 1, block[self.LOAD:])
+            self._maxes.insert(i + 1, block[-1])
+            del block[self.LOAD:]
+            self._maxes[i] = block[-1]
+
+    def remove(self, item):
+        i = bisect_left(self._maxes, item)
+        block = self._blocks[i]
+        del block[bisect_left(block, item)]
+        if not block:
+            del self._blocks[i]
+            del self._maxes[i]
+        else:
+            self._maxes[i] = block[-1]
+
+    def iter_from(self, start=None, reverse: bool = False) -> Iterator:
+        """Items strictly after start in iteration order (all items if start is None)"""
+        if not self._blocks:
+            return
+        if not reverse:
+            i = 0 if start is None else bisect_right(self._maxes, start)
+            j = 0 if start is None or i == len(self._blocks) else bisect_right(self._blocks[i], start)
+            for block in self._blocks[i:]:
+                yield from block[j:]
+                j = 0
+        else:
+            i = len(self._blocks) - 1 if start is None else min(bisect_left(self._maxes, start), len(self._blocks) - 1)
+            j = len(self._blocks[i]) if start is None else bisect_left(self._blocks[i], start)
+            for k in range(i, -1, -1):
+                block = self._blocks[k]
+                yield from reversed(block[:j] if k == i else block)
+
+
+class SessionIndex:
+    """Secondary indexes over a session table: by last activity, user id and escalation status
+
+    Not locked itself: the table's owner holds its own lock around every call.
+    """
+
+    def __init__(self):
+        # session id -> (key, user_id, escalation_status) as currently indexed
+        self._entries: Dict[str, Tuple[IndexKey, str, str]] = {}
+        self._by_activity = _SortedList()
+        self._by_escalation: Dict[str, _SortedList] = {}
+        self._by_user: Dict[str, set] = {}
+
+    def put(self, session_id: str, record: SessionRecord):
+        entry = ((record.active_at, session_id), record.user_id, record.escalation_status)
+        old = self._entries.get(session_id)
+        if old == entry:
+            return
+        if old is not None:
+            self._remove(session_id, old)
+        key, user_id, status = entry
+        self._entries[session_id] = entry
+        self._by_activity.add(key)
+        if status != "none":
+            self._by_escalation.setdefault(status, _SortedList()).add(key)
+        self._by_user.setdefault(user_id, set()).add(key)
+
+    def discard(self, session_id: str):
+        old = self._entries.pop(session_id, None)
+        if old is not None:
+            self._remove(session_id, old)
+
+    def _remove(self, session_id: str, entry: Tuple[IndexKey, str, str]):
+        key, user_id, status = entry
+        self._by_activity.remove(key)
+        if status != "none":
+            self._by_escalation[status].remove(key)
+        keys = self._by_user[user_id]
+        keys.discard(key)
+        if not keys:
+            del self._by_user[user_id]
+
+    def keys(self, user_id: Optional[str], escalation_status: Optional[str], start: Optional[IndexKey],
+             cutoff: Optional[float], reverse: bool, limit: int) -> List[IndexKey]:
+        """Up to limit matching keys after start, in last-activity order (newest first if reverse)"""
+        if user_id is not None:
+            # A user has a handful of sessions; index them on the fly
+            source = _SortedList(self._by_user.get(user_id, ()))
+        elif escalation_status not in (None, "none"):
+            source = self._by_escalation.get(escalation_status, _SortedList())
+        else:
+            source = self._by_activity
+        keys: List[IndexKey] = []
+        for key in source.iter_from(start, reverse):
+            if len(keys) == limit or (cutoff is not None and key[0] > cutoff):
+                break
+            if escalation_status is not None and self._entries[key[1]][2] != escalation_status:
+                continue
+            keys.append(key)
+        return keys
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class _Shard:
+    __slots__ = ("lock", "changed", "sessions", "capacity", "index")
+
+    def __init__(self, capacity: int):
+        self.lock = threading.Lock()
+        # Signalled on every update or removal, for wait_for()
+        self.changed = threading.Condition(self.lock)
+        self.sessions: "OrderedDict[str, SessionRecord]" = OrderedDict()
+        self.capacity = capacity
+        # Guarded by lock, like sessions
+        self.index = SessionIndex()
+
+
+class SessionStore:
+    """Session id -> SessionRecord, least recently used first within each shard"""
+
+    # Whether other processes read and write the same sessions
+    shared = False
+
+    def __init__(self, max_sessions: int = 10000, idle_ttl: float = 1800.0, sweep_interval: float = 60.0,
+                 shards: int = 16):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.sweep_interval = sweep_interval
+        # Small tables keep fewer shards so the per-shard LRU stays close to a global one
+        self.shard_count = max(1, min(shards, max_sessions // 64))
+        per_shard = max(1, -(-max_sessions // self.shard_count))
+        self._shards = [_Shard(per_shard) for _ in range(self.shard_count)]
+        self._listeners: List[RemoveListener] = []
+        self._stopped = threading.Event()
+        self._sweeper: Optional[threading.Thread] = None
+        self._counters_lock = threading.Lock()
+        self.counters = {"evicted_lru": 0, "evicted_ttl": 0, "ended": 0}
+
+    @classmethod
+    def from_env(cls) -> "SessionStore":
+        """Limits from SESSION_MAX, SESSION_IDLE_TTL, SESSION_SWEEP_INTERVAL (seconds) and SESSION_SHARDS"""
+        return cls(
+            max_sessions=int(os.getenv("SESSION_MAX", "10000")),
+            idle_ttl=float(os.getenv("SESSION_IDLE_TTL", "1800")),
+            sweep_interval=float(os.getenv("SESSION_SWEEP_INTERVAL", "60")),
+            shards=int(os.getenv("SESSION_SHARDS", "16"))
+        )
+
+    def on_remove(self, listener: RemoveListener):
+        """Register listener(session_id, record, reason) called after a session is removed"""
+        self._listeners.append(listener)
+
+    def _count(self, name: str, amount: int = 1):
+        with self._counters_lock:
+            self.counters[name] += amount
+
+    def _notify(self, removed: List[Tuple[str, SessionRecord]], reason: str):
+        for session_id, record in removed:
+            for listener in self._listeners:
+                try:
+                    listener(session_id, record, reason)
+                except Exception as e:
+                    logger.warning(f"Session remove listener failed for {session_id}: {e}")
+
+    def _shard(self, session_id: str) -> _Shard:
+        return self._shards[hash(session_id) % self.shard_count]
+
+    def __contains__(self, session_id: str) -> bool:
+        shard = self._shard(session_id)
+        with shard.lock:
+            return session_id in shard.sessions
+
+    def __getitem__(self, session_id: str) -> SessionRecord:
+        shard = self._shard(session_id)
+        with shard.lock:
+            record = shard.sessions[session_id]
+            shard.sessions.move_to_end(session_id)
+            record.touched = time.monotonic()
+            return record
+
+    def get(self, session_id: str, default: Any = None) -> Any:
+        try:
+            return self[session_id]
+        except KeyError:
+            return default
+
+    def __setitem__(self, session_id: str, record: SessionRecord):
+        shard = self._shard(session_id)
+        evicted = []
+        with shard.lock:
+            record.touched = time.monotonic()
+            shard.sessions[session_id] = record
+            shard.sessions.move_to_end(session_id)
+            shard.index.put(session_id, record)
+            while len(shard.sessions) > shard.capacity:
+                evicted.append(shard.sessions.popitem(last=False))
+                shard.index.discard(evicted[-1][0])
+        if evicted:
+            self._count("evicted_lru", len(evicted))
+            logger.info(f"Evicted {len(evicted)} least recently used session(s)")
+            self._notify(evicted, "lru")
+
+    def update(self, session_id: str, fn: Callable[[SessionRecord], None]) -> Optional[SessionRecord]:
+        """Apply fn to a session's record atomically. Returns the record, or None if the session is gone"""
+        shard = self._shard(session_id)
+        with shard.lock:
+            record = shard.sessions.get(session_id)
+            if record is None:
+                return None
+            fn(record)
+            shard.sessions.move_to_end(session_id)
+            record.touched = time.monotonic()
+            shard.index.put(session_id, record)
+            shard.changed.notify_all()
+            return record
+
+    def wait_for(self, session_id: str, predicate: Callable[[SessionRecord], bool],
+                 timeout: float) -> Optional[SessionRecord]:
+        """Block until predicate(record) holds or timeout passes. Returns the record, or None if it is gone"""
+        shard = self._shard(session_id)
+        deadline = time.monotonic() + timeout
+        with shard.changed:
+            while True:
+                record = shard.sessions.get(session_id)
+                if record is None or predicate(record):
+                    return record
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return record
+                shard.changed.wait(remaining)
+
+    def __delitem__(self, session_id: str):
+        shard = self._shard(session_id)
+        with shard.lock:
+            record = shard.sessions.pop(session_id)
+            shard.index.discard(session_id)
+            shard.changed.notify_all()
+        self._count("ended")
+        self._notify([(session_id, record)], "ended")
+
+    def __len__(self) -> int:
+        return sum(len(shard.sessions) for shard in self._shards)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def keys(self) -> List[str]:
+        keys: List[str] = []
+        for shard in self._shards:
+            with shard.lock:
+                keys.extend(shard.sessions)
+        return keys
+
+    def items(self) -> List[Tuple[str, SessionRecord]]:
+        """Snapshot of (session_id, record) pairs, safe to iterate while other threads write"""
+        items: List[Tuple[str, SessionRecord]] = []
+        for shard in self._shards:
+            with shard.lock:
+                items.extend(shard.sessions.items())
+        return items
+
+    def query(self, user_id: Optional[str] = None, escalation_status: Optional[str] = None,
+              idle_seconds: Optional[float] = None, order: str = "desc", cursor: Optional[str] = None,
+              limit: int = 50) -> Tuple[List[Tuple[str, SessionRecord]], Optional[str]]:
+        """One page of (session_id, record) ordered by last activity, plus the next-page cursor
+        
+        Filters: user_id, escalation_status ("queued", "assigned", "claimed" or "none") and
+        idle_seconds (no activity for at least that long). order is "desc" (most recent first)
+        or "asc". Reading a page does not count as session activity.
+        """
+        reverse = order == "desc"
+        start = decode_cursor(cursor) if cursor else None
+        cutoff = time.time() - idle_seconds if idle_seconds is not None else None
+        if reverse and cutoff is not None:
+            # Newest first: jump straight past everything active after the cutoff
+            bound = (cutoff, chr(0x10FFFF))
+            start = bound if start is None else min(start, bound)
+
+        # One extra key tells whether there is a next page
+        runs = []
+        for shard in self._shards:
+            with shard.lock:
+                runs.append(shard.index.keys(user_id, escalation_status, start, cutoff, reverse, limit + 1))
+        keys = list(itertools.islice(heapq.merge(*runs, reverse=reverse), limit + 1))
+        next_cursor = encode_cursor(keys[limit - 1]) if len(keys) > limit else None
+
+        page = []
+        for _, session_id in keys[:limit]:
+            shard = self._shard(session_id)
+            with shard.lock:
+                record = shard.sessions.get(session_id)
+            if record is not None:
+                page.append((session_id, record))
+        return page, next_cursor
+
+    def sweep(self) -> int:
+        """Remove sessions idle for longer than idle_ttl. Returns how many were removed"""
+        cutoff = time.monotonic() - self.idle_ttl
+        expired = []
+        for shard in self._shards:
+            with shard.lock:
+                # Entries are ordered by last access, so stop at the first one still fresh
+                while shard.sessions:
+                    session_id, record = next(iter(shard.sessions.items()))
+                    if record.touched > cutoff:
+                        break
+                    expired.append((session_id, shard.sessions.pop(session_id)))
+                    shard.index.discard(session_id)
+        if expired:
+            self._count("evicted_ttl", len(expired))
+            logger.info(f"Expired {len(expired)} idle session(s)")
+            self._notify(expired, "ttl")
+        return len(expired)
+
+    def start_sweeper(self):
+        """Run sweep() every sweep_interval seconds on a daemon thread"""
+        # Not alive in a process forked after it was started: start another
+        if self._sweeper is not None and self._sweeper.is_alive():
+            return
+
+        def loop():
+            while not self._stopped.wait(self.sweep_interval):
+                try:
+                    self.sweep()
+                except Exception as e:
+                    logger.error(f"Session sweep failed: {e}")
+
+        self._sweeper = threading.Thread(target=loop, name="session-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._counters_lock:
+            counters = dict(self.counters)
+        return {
+            "backend": "memory",
+            "size": len(self),
+            "shards": self.shard_count,
+            "max_sessions": self.max_sessions,
+            "idle_ttl_seconds": self.idle_ttl,
+            **counters
+        }
+
+
+def create_session_store():
+    """Build the session store selected by SESSION_BACKEND"""
+    backend = os.getenv("SESSION_BACKEND", "memory").lower()
+    if backend == "sqlite":
+        from sqlite_sessions import SQLiteSessionStore
+        return SQLiteSessionStore.from_env()
+    if backend != "memory":
+        logger.warning(f"Unknown SESSION_BACKEND {backend!r}, using in-memory sessions")
+    return SessionStore.from_env()
@@ -0,0 +1,71 @@
+"""
+Single-flight coalescing of identical in-flight calls.
+
+The first caller for a key (the leader) runs the call; callers that arrive
+with the same key while it is still running wait for the leader and receive
+its result instead of starting their own.
+"""
+
+import logging
+import threading
+from typing import Any, Callable, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Deduplicates concurrent calls that share a key"""
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self.counters = {"leaders": 0, "coalesced": 0, "in_flight": 0}
+
+    def do(self, key: str, fn: Callable[[], Any], timeout: float = None) -> Tuple[Any, bool]:
+        """Run fn once per key among concurrent callers. Returns (result, shared)"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                leader = True
+                self.counters["leaders"] += 1
+                self.counters["in_flight"] += 1
+            else:
+                leader = False
+                call.waiters += 1
+                self.counters["coalesced"] += 1
+
+        if not leader:
+            if not call.done.wait(timeout):
+                raise TimeoutError(f"Timed out waiting for in-flight call {key}")
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                self.counters["in_flight"] -= 1
+            if call.waiters:
+                logger.info(f"Shared one in-flight call with {call.waiters} waiting request(s)")
+            call.done.set()
+        return call.result, False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.counters)
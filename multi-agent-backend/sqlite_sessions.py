@@ -0,0 +1,1157 @@
+"""
+SQLite session backend shared by every worker process on one host.
+
+Both halves of a chat session live in one WAL-mode database file so that any
+gunicorn worker can serve any request:
+
+- SQLiteSessionStore holds the Flask-side metadata and conversation history
+  (drop-in for session_store.SessionStore).
+- SQLiteSessionService is an ADK BaseSessionService storing sessions, events
+  and app/user scoped state.
+- SQLiteRateLimiter keeps the per-user token buckets (drop-in for
+  admission.RateLimiter), so a user's limit holds whichever worker serves
+  them instead of being multiplied by the worker count.
+- SQLiteEscalationDispatcher keeps human agents and escalation tickets
+  (drop-in for escalation.EscalationDispatcher), so each agent's capacity
+  is counted once and any worker can claim or release any ticket.
+
+SESSION_DB_PATH sets the database file (default sessions.db).
+
+Reads are plain SELECTs: a session's last_seen (its LRU/TTL clock) is
+refreshed by writes, and by reads at most once per touch_interval, so looking
+a session up does not queue behind the database write lock. Messages live in
+their own table keyed by (session_id, seq): a session row holds only the
+scalar fields, a turn inserts its two messages, and history is read only by
+whoever asks for it, one page at a time. The row count
+used for the size cap is kept by triggers rather than counted per insert.
+Every write bumps the row's version, which is what a history long-poll
+watches: writes from this process wake its waiters at once, and writes from
+other processes are noticed by polling the version with a plain read.
+
+The ADK service's coroutines run on the shared asyncio runtime, so their
+database work is handed to a small thread pool (SESSION_DB_THREADS); a
+write waiting on the lock then holds up one pool thread instead of every
+model call and stream on the loop.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from google.adk.events.event import Event
+from google.adk.sessions.base_session_service import (
+    BaseSessionService,
+    GetSessionConfig,
+    ListSessionsResponse,
+)
+from google.adk.sessions.session import Session
+from google.adk.sessions.state import State
+
+from admission import AdmissionRejected, RateLimiter
+from escalation import OPEN_STATUSES, DispatchError, EscalationDispatcher, HumanAgent, Ticket, urgency
+from session_store import Message, SessionRecord, SessionStore, decode_cursor, encode_cursor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = "sessions.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chat_sessions (
+    session_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    last_seen REAL NOT NULL,
+    active_at REAL NOT NULL DEFAULT 0,
+    escalation_status TEXT NOT NULL DEFAULT 'none',
+    version INTEGER NOT NULL DEFAULT 0,
+    messages INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS chat_sessions_last_seen ON chat_sessions (last_seen);
+CREATE TABLE IF NOT EXISTS chat_messages (
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    PRIMARY KEY (session_id, seq)
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS chat_sessions_messages_delete AFTER DELETE ON chat_sessions
+BEGIN DELETE FROM chat_messages WHERE session_id = old.session_id; END;
+
+CREATE TABLE IF NOT EXISTS adk_sessions (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    last_update_time REAL NOT NULL,
+    PRIMARY KEY (app_name, user_id, session_id)
+);
+CREATE TABLE IF NOT EXISTS adk_events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    event TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS adk_events_session ON adk_events (app_name, user_id, session_id, seq);
+CREATE TABLE IF NOT EXISTS adk_app_state (
+    app_name TEXT PRIMARY KEY,
+    state TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS adk_user_state (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    PRIMARY KEY (app_name, user_id)
+);
+
+CREATE TABLE IF NOT EXISTS escalation_agents (
+    agent_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    capacity INTEGER NOT NULL,
+    held INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS escalation_tickets (
+    ticket_id TEXT PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    reason TEXT NOT NULL,
+    message TEXT NOT NULL,
+    urgency INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    priority_key REAL NOT NULL,
+    status TEXT NOT NULL,
+    agent_id TEXT,
+    updated_at REAL NOT NULL,
+    change_seq INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS escalation_tickets_queue ON escalation_tickets (status, priority_key, created_at);
+CREATE INDEX IF NOT EXISTS escalation_tickets_session ON escalation_tickets (session_id, status);
+CREATE INDEX IF NOT EXISTS escalation_tickets_agent ON escalation_tickets (agent_id, status);
+CREATE UNIQUE INDEX IF NOT EXISTS escalation_tickets_changes ON escalation_tickets (change_seq);
+CREATE TABLE IF NOT EXISTS escalation_counters (
+    name TEXT PRIMARY KEY,
+    n INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS rate_buckets (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL,
+    granted INTEGER NOT NULL
+);
+"""
+
+# Admin listing indexes; created after older files have gained the columns
+CHAT_SESSION_INDEXES = """
+CREATE INDEX IF NOT EXISTS chat_sessions_active ON chat_sessions (active_at, session_id);
+CREATE INDEX IF NOT EXISTS chat_sessions_user ON chat_sessions (user_id, active_at, session_id);
+CREATE INDEX IF NOT EXISTS chat_sessions_escalation ON chat_sessions (escalation_status, active_at, session_id);
+"""
+
+
+# Row count of chat_sessions, kept by triggers so the size cap costs one row read
+CHAT_SESSION_COUNT = """
+BEGIN IMMEDIATE;
+CREATE TABLE IF NOT EXISTS chat_session_count (id INTEGER PRIMARY KEY CHECK (id = 0), n INTEGER NOT NULL);
+INSERT OR IGNORE INTO chat_session_count (id, n) SELECT 0, COUNT(*) FROM chat_sessions;
+CREATE TRIGGER IF NOT EXISTS chat_sessions_count_insert AFTER INSERT ON chat_sessions
+BEGIN UPDATE chat_session_count SET n = n + 1; END;
+CREATE TRIGGER IF NOT EXISTS chat_sessions_count_delete AFTER DELETE ON chat_sessions
+BEGIN UPDATE chat_session_count SET n = n - 1; END;
+COMMIT;
+"""
+
+# UTF-8 bytes of all stored message content, kept by triggers for the
+# support_history_bytes gauge
+CHAT_HISTORY_BYTES = """
+BEGIN IMMEDIATE;
+CREATE TABLE IF NOT EXISTS chat_history_bytes (id INTEGER PRIMARY KEY CHECK (id = 0), n INTEGER NOT NULL);
+INSERT OR IGNORE INTO chat_history_bytes (id, n)
+SELECT 0, COALESCE(SUM(length(CAST(content AS BLOB))), 0) FROM chat_messages;
+CREATE TRIGGER IF NOT EXISTS chat_messages_bytes_insert AFTER INSERT ON chat_messages
+BEGIN UPDATE chat_history_bytes SET n = n + length(CAST(new.content AS BLOB)); END;
+CREATE TRIGGER IF NOT EXISTS chat_messages_bytes_delete AFTER DELETE ON chat_messages
+BEGIN UPDATE chat_history_bytes SET n = n - length(CAST(old.content AS BLOB)); END;
+COMMIT;
+"""
+
+
+# Each agent's count of assigned/claimed tickets, kept by triggers, and an
+# index on load so the least-loaded agent with room is one index seek
+ESCALATION_LOAD = """
+CREATE INDEX IF NOT EXISTS escalation_agents_load
+    ON escalation_agents (CAST(held AS REAL) / capacity, agent_id) WHERE capacity > 0;
+CREATE TRIGGER IF NOT EXISTS escalation_tickets_held_insert AFTER INSERT ON escalation_tickets
+WHEN NEW.status IN ('assigned', 'claimed')
+BEGIN UPDATE escalation_agents SET held = held + 1 WHERE agent_id = NEW.agent_id; END;
+CREATE TRIGGER IF NOT EXISTS escalation_tickets_held_update AFTER UPDATE OF status, agent_id ON escalation_tickets
+BEGIN
+    UPDATE escalation_agents SET held = held - 1
+        WHERE agent_id = OLD.agent_id AND OLD.status IN ('assigned', 'claimed');
+    UPDATE escalation_agents SET held = held + 1
+        WHERE agent_id = NEW.agent_id AND NEW.status IN ('assigned', 'claimed');
+END;
+CREATE TRIGGER IF NOT EXISTS escalation_tickets_held_delete AFTER DELETE ON escalation_tickets
+WHEN OLD.status IN ('assigned', 'claimed')
+BEGIN UPDATE escalation_agents SET held = held - 1 WHERE agent_id = OLD.agent_id; END;
+"""
+
+
+class SQLiteDatabase:
+    """One connection per thread to a WAL-mode database file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        conn = self.connection()
+        conn.executescript(SCHEMA)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(chat_sessions)")}
+        if "active_at" not in columns:
+            conn.execute("ALTER TABLE chat_sessions ADD COLUMN active_at REAL NOT NULL DEFAULT 0")
+        if "escalation_status" not in columns:
+            conn.execute("ALTER TABLE chat_sessions ADD COLUMN escalation_status TEXT NOT NULL DEFAULT 'none'")
+        if "version" not in columns:
+            conn.execute("ALTER TABLE chat_sessions ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        if "messages" not in columns:
+            self._move_history(conn)
+        conn.executescript(CHAT_SESSION_INDEXES)
+        conn.executescript(CHAT_SESSION_COUNT)
+        conn.executescript(CHAT_HISTORY_BYTES)
+        if "held" not in {row[1] for row in conn.execute("PRAGMA table_info(escalation_agents)")}:
+            conn.execute("ALTER TABLE escalation_agents ADD COLUMN held INTEGER NOT NULL DEFAULT 0")
+            conn.execute(
+                "UPDATE escalation_agents SET held = (SELECT COUNT(*) FROM escalation_tickets t "
+                "WHERE t.agent_id = escalation_agents.agent_id AND t.status IN ('assigned', 'claimed'))"
+            )
+        conn.executescript(ESCALATION_LOAD)
+
+    @staticmethod
+    def _move_history(conn: sqlite3.Connection):
+        """Move histories kept in the session JSON (older databases) into chat_messages"""
+        with _Transaction(conn):
+            if "messages" in {row[1] for row in conn.execute("PRAGMA table_info(chat_sessions)")}:
+                return
+            conn.execute("ALTER TABLE chat_sessions ADD COLUMN messages INTEGER NOT NULL DEFAULT 0")
+            for session_id, data in conn.execute("SELECT session_id, data FROM chat_sessions").fetchall():
+                state = json.loads(data)
+                history = state.pop("h", [])
+                conn.executemany(
+                    "INSERT INTO chat_messages (session_id, seq, role, content, timestamp) VALUES (?, ?, ?, ?, ?)",
+                    [(session_id, seq, *message) for seq, message in enumerate(history, start=1)]
+                )
+                conn.execute(
+                    "UPDATE chat_sessions SET data = ?, messages = ? WHERE session_id = ?",
+                    (json.dumps(state, separators=(",", ":")), len(history), session_id)
+                )
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        # A connection must not be used across fork; a child opens its own
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def transaction(self) -> "_Transaction":
+        """Write transaction that takes the database write lock up front"""
+        return _Transaction(self.connection())
+
+
+class _Transaction:
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+_databases: Dict[str, SQLiteDatabase] = {}
+_databases_lock = threading.Lock()
+
+
+def get_database(path: Optional[str] = None) -> SQLiteDatabase:
+    """Shared SQLiteDatabase for a path (SESSION_DB_PATH by default)"""
+    path = path or os.getenv("SESSION_DB_PATH", DEFAULT_DB_PATH)
+    with _databases_lock:
+        if path not in _databases:
+            _databases[path] = SQLiteDatabase(path)
+            logger.info(f"SQLite session database opened at {path}")
+        return _databases[path]
+
+
+def _dump(record: SessionRecord) -> str:
+    return json.dumps(record.to_state(), separators=(",", ":"))
+
+
+def _load(data: str) -> SessionRecord:
+    return SessionRecord.from_state(json.loads(data))
+
+
+def _rows(session_id: str, messages: List[Message], start: int) -> List[tuple]:
+    """chat_messages rows for messages numbered from start + 1"""
+    return [(session_id, seq, m.role, m.content, m.timestamp) for seq, m in enumerate(messages, start=start + 1)]
+
+
+# The slot SessionRecord keeps its history in; _StoredRecord puts a property in front of it
+_history = SessionRecord.history
+
+
+class _StoredRecord(SessionRecord):
+    """SessionRecord whose messages stay in chat_messages until something reads them
+
+    Messages added before the history is read are kept on their own, so an
+    update() appending a turn writes those rows without loading the others.
+    """
+
+    __slots__ = ("_db", "_session_id", "_stored", "_loaded")
+
+    @classmethod
+    def load(cls, db: "SQLiteDatabase", session_id: str, data: str, stored: int) -> "_StoredRecord":
+        record = cls.from_state(json.loads(data))
+        record._db = db
+        record._session_id = session_id
+        # Messages in the table when the row was read; later ones are not this record's
+        record._stored = stored
+        record._loaded = stored == 0
+        return record
+
+    @property
+    def history(self) -> List[Message]:
+        if not self._loaded:
+            rows = self._db.connection().execute(
+                "SELECT role, content, timestamp FROM chat_messages WHERE session_id = ? AND seq <= ? ORDER BY seq",
+                (self._session_id, self._stored)
+            ).fetchall()
+            _history.__set__(self, [Message(*row) for row in rows] + _history.__get__(self))
+            self._loaded = True
+        return _history.__get__(self)
+
+    @history.setter
+    def history(self, messages: List[Message]):
+        _history.__set__(self, messages)
+        self._loaded = True
+
+    @property
+    def history_length(self) -> int:
+        added = len(_history.__get__(self))
+        return added if self._loaded else self._stored + added
+
+    def add_message(self, role: str, content: str, timestamp: Optional[float] = None):
+        _history.__get__(self).append(Message(role, content, timestamp if timestamp is not None else time.time()))
+
+    def messages_after(self, after: int = 0, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        if self._loaded or _history.__get__(self):
+            return super().messages_after(after, limit)
+        end = self._stored if limit is None else min(self._stored, after + limit)
+        rows = self._db.connection().execute(
+            "SELECT seq, role, content, timestamp FROM chat_messages "
+            "WHERE session_id = ? AND seq > ? AND seq <= ? ORDER BY seq",
+            (self._session_id, after, end)
+        ).fetchall()
+        return [Message(role, content, timestamp).to_dict(seq) for seq, role, content, timestamp in rows]
+
+    def unsaved(self) -> List[Message]:
+        """Messages added since the row was read"""
+        messages = _history.__get__(self)
+        return messages[self._stored:] if self._loaded else messages
+
+    def saved(self):
+        """Count the unsaved messages as written"""
+        if self._loaded:
+            self._stored = len(_history.__get__(self))
+        else:
+            self._stored += len(_history.__get__(self))
+            _history.__set__(self, [])
+
+
+class SQLiteSessionStore(SessionStore):
+    """SessionStore persisted in SQLite; last access time doubles as the LRU order
+
+    Records it returns load their history on first use (messages_after() reads
+    just the requested page). Records handed to removal listeners carry the
+    scalar fields only: their messages are deleted along with the row.
+    """
+
+    shared = True
+
+    def __init__(self, db: SQLiteDatabase, max_sessions: int = 10000, idle_ttl: float = 1800.0,
+                 sweep_interval: float = 60.0):
+        super().__init__(max_sessions=max_sessions, idle_ttl=idle_ttl, sweep_interval=sweep_interval)
+        self.db = db
+        self.poll_interval = 0.25
+        # How stale last_seen may get before a read refreshes it
+        self.touch_interval = min(60.0, idle_ttl / 10)
+        # Bumped (under the condition) on every write made by this process, for wait_for()
+        self._changed = threading.Condition()
+        self._generation = 0
+
+    def _wake_waiters(self):
+        with self._changed:
+            self._generation += 1
+            self._changed.notify_all()
+
+    @classmethod
+    def from_env(cls) -> "SQLiteSessionStore":
+        return cls(
+            get_database(),
+            max_sessions=int(os.getenv("SESSION_MAX", "10000")),
+            idle_ttl=float(os.getenv("SESSION_IDLE_TTL", "1800")),
+            sweep_interval=float(os.getenv("SESSION_SWEEP_INTERVAL", "60"))
+        )
+
+    def __contains__(self, session_id: str) -> bool:
+        row = self.db.connection().execute(
+            "SELECT 1 FROM chat_sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return row is not None
+
+    def _record(self, session_id: str, data: str, messages: int) -> "_StoredRecord":
+        return _StoredRecord.load(self.db, session_id, data, messages)
+
+    def __getitem__(self, session_id: str) -> SessionRecord:
+        conn = self.db.connection()
+        row = conn.execute(
+            "SELECT data, last_seen, messages FROM chat_sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(session_id)
+        now = time.time()
+        if now - row[1] >= self.touch_interval:
+            conn.execute(
+                "UPDATE chat_sessions SET last_seen = ? WHERE session_id = ? AND last_seen < ?",
+                (now, session_id, now - self.touch_interval)
+            )
+        return self._record(session_id, row[0], row[2])
+
+    def __setitem__(self, session_id: str, record: SessionRecord):
+        with self.db.transaction() as conn:
+            history = record.history
+            conn.execute(
+                "INSERT INTO chat_sessions (session_id, user_id, data, last_seen, active_at, escalation_status, "
+                "messages) VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (session_id) DO UPDATE SET data = excluded.data, last_seen = excluded.last_seen, "
+                "active_at = excluded.active_at, escalation_status = excluded.escalation_status, "
+                "messages = excluded.messages, version = chat_sessions.version + 1",
+                (session_id, record.user_id, _dump(record), time.time(), record.active_at,
+                 record.escalation_status, len(history))
+            )
+            conn.execute("DELETE FROM chat_messages WHERE session_id = ?", (session_id,))
+            conn.executemany(
+                "INSERT INTO chat_messages (session_id, seq, role, content, timestamp) VALUES (?, ?, ?, ?, ?)",
+                _rows(session_id, history, 0)
+            )
+            (count,) = conn.execute("SELECT n FROM chat_session_count").fetchone()
+            evicted = []
+            if count > self.max_sessions:
+                evicted = conn.execute(
+                    "DELETE FROM chat_sessions WHERE session_id IN "
+                    "(SELECT session_id FROM chat_sessions ORDER BY last_seen LIMIT ?) "
+                    "RETURNING session_id, data",
+                    (count - self.max_sessions,)
+                ).fetchall()
+        self._wake_waiters()
+        if evicted:
+            self._count("evicted_lru", len(evicted))
+            logger.info(f"Evicted {len(evicted)} least recently used session(s)")
+            self._notify([(sid, _load(data)) for sid, data in evicted], "lru")
+
+    def update(self, session_id: str, fn: Callable[[SessionRecord], None]) -> Optional[SessionRecord]:
+        with self.db.transaction() as conn:
+            row = conn.execute(
+                "SELECT data, messages FROM chat_sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            record = self._record(session_id, row[0], row[1])
+            fn(record)
+            # Only the messages fn added are written; the rest of the history is never read
+            conn.executemany(
+                "INSERT INTO chat_messages (session_id, seq, role, content, timestamp) VALUES (?, ?, ?, ?, ?)",
+                _rows(session_id, record.unsaved(), record._stored)
+            )
+            conn.execute(
+                "UPDATE chat_sessions SET data = ?, last_seen = ?, active_at = ?, escalation_status = ?, "
+                "messages = ?, version = version + 1 WHERE session_id = ?",
+                (_dump(record), time.time(), record.active_at, record.escalation_status, record.history_length,
+                 session_id)
+            )
+            record.saved()
+        self._wake_waiters()
+        return record
+
+    def wait_for(self, session_id: str, predicate: Callable[[SessionRecord], bool],
+                 timeout: float) -> Optional[SessionRecord]:
+        # Only reads: the record is loaded again only when its version has moved
+        deadline = time.monotonic() + timeout
+        conn = self.db.connection()
+        seen_version, record = None, None
+        while True:
+            with self._changed:
+                generation = self._generation
+            row = conn.execute("SELECT version FROM chat_sessions WHERE session_id = ?", (session_id,)).fetchone()
+            if row is not None and row[0] != seen_version:
+                row = conn.execute(
+                    "SELECT version, data, messages FROM chat_sessions WHERE session_id = ?", (session_id,)
+                ).fetchone()
+                if row is not None:
+                    seen_version, record = row[0], self._record(session_id, row[1], row[2])
+                    if predicate(record):
+                        return record
+            if row is None:
+                return None
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return record
+            with self._changed:
+                if self._generation == generation:
+                    self._changed.wait(min(self.poll_interval, remaining))
+
+    def __delitem__(self, session_id: str):
+        with self.db.transaction() as conn:
+            row = conn.execute(
+                "DELETE FROM chat_sessions WHERE session_id = ? RETURNING data", (session_id,)
+            ).fetchone()
+        if row is None:
+            raise KeyError(session_id)
+        self._wake_waiters()
+        self._count("ended")
+        self._notify([(session_id, _load(row[0]))], "ended")
+
+    def __len__(self) -> int:
+        (count,) = self.db.connection().execute("SELECT n FROM chat_session_count").fetchone()
+        return count
+
+    def history_bytes(self) -> int:
+        """UTF-8 bytes of message content held by every process's sessions"""
+        (total,) = self.db.connection().execute("SELECT n FROM chat_history_bytes").fetchone()
+        return total
+
+    def keys(self) -> List[str]:
+        rows = self.db.connection().execute(
+            "SELECT session_id FROM chat_sessions ORDER BY last_seen"
+        ).fetchall()
+        return [sid for (sid,) in rows]
+
+    def items(self) -> List[Tuple[str, SessionRecord]]:
+        rows = self.db.connection().execute(
+            "SELECT session_id, data, messages FROM chat_sessions ORDER BY last_seen"
+        ).fetchall()
+        return [(sid, self._record(sid, data, messages)) for sid, data, messages in rows]
+
+    def query(self, user_id: Optional[str] = None, escalation_status: Optional[str] = None,
+              idle_seconds: Optional[float] = None, order: str = "desc", cursor: Optional[str] = None,
+              limit: int = 50) -> Tuple[List[Tuple[str, SessionRecord]], Optional[str]]:
+        # Keyset pagination over the (…, active_at, session_id) indexes
+        clauses, params = [], []
+        if user_id is not None:
+            clauses.append("user_id = ?")
+            params.append(user_id)
+        if escalation_status is not None:
+            clauses.append("escalation_status = ?")
+            params.append(escalation_status)
+        if idle_seconds is not None:
+            clauses.append("active_at <= ?")
+            params.append(time.time() - idle_seconds)
+        if cursor:
+            clauses.append("(active_at, session_id) < (?, ?)" if order == "desc" else "(active_at, session_id) > (?, ?)")
+            params.extend(decode_cursor(cursor))
+        direction = "DESC" if order == "desc" else "ASC"
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+        rows = self.db.connection().execute(
+            f"SELECT session_id, data, active_at, messages FROM chat_sessions {where}"
+            f"ORDER BY active_at {direction}, session_id {direction} LIMIT ?",
+            (*params, limit + 1)
+        ).fetchall()
+        page = [(sid, self._record(sid, data, messages)) for sid, data, _, messages in rows[:limit]]
+        next_cursor = encode_cursor((rows[limit - 1][2], rows[limit - 1][0])) if len(rows) > limit else None
+        return page, next_cursor
+
+    def sweep(self) -> int:
+        with self.db.transaction() as conn:
+            expired = conn.execute(
+                "DELETE FROM chat_sessions WHERE last_seen < ? RETURNING session_id, data",
+                (time.time() - self.idle_ttl,)
+            ).fetchall()
+        if expired:
+            self._count("evicted_ttl", len(expired))
+            logger.info(f"Expired {len(expired)} idle session(s)")
+            self._notify([(sid, _load(data)) for sid, data in expired], "ttl")
+        return len(expired)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._counters_lock:
+            counters = dict(self.counters)
+        return {
+            "backend": "sqlite",
+            "size": len(self),
+            "max_sessions": self.max_sessions,
+            "idle_ttl_seconds": self.idle_ttl,
+            **counters
+        }
+
+
+# One statement refills the bucket, takes a token if there is one and reports
+# whether it did; SET expressions all see the row as it was before the update
+TAKE_TOKEN = """
+INSERT INTO rate_buckets (key, tokens, updated, granted) VALUES (:key, :burst - 1, :now, 1)
+ON CONFLICT (key) DO UPDATE SET
+    granted = MIN(:burst, tokens + MAX(0, :now - updated) * :rate) >= 1,
+    tokens = MIN(:burst, tokens + MAX(0, :now - updated) * :rate)
+             - (MIN(:burst, tokens + MAX(0, :now - updated) * :rate) >= 1),
+    updated = MAX(updated, :now)
+RETURNING tokens, granted
+"""
+
+
+class SQLiteRateLimiter(RateLimiter):
+    """RateLimiter whose buckets live in the shared database"""
+
+    def __init__(self, db: SQLiteDatabase, rate: float, burst: float, idle_prune_seconds: float = 600.0):
+        super().__init__(rate, burst, idle_prune_seconds)
+        self.db = db
+        self._last_prune = time.time()
+
+    def check(self, key: str):
+        """Take one token for key or raise AdmissionRejected (429)"""
+        now = time.time()
+        conn = self.db.connection()
+        tokens, granted = conn.execute(
+            TAKE_TOKEN, {"key": key, "burst": self.burst, "rate": self.rate, "now": now}
+        ).fetchone()
+        if now - self._last_prune > self.idle_prune_seconds:
+            # A bucket idle this long has refilled; dropping it loses nothing
+            self._last_prune = now
+            conn.execute("DELETE FROM rate_buckets WHERE updated < ?", (now - self.idle_prune_seconds,))
+        if not granted:
+            self.rejected += 1
+            raise AdmissionRejected("rate_limited", 429, (1.0 - tokens) / self.rate)
+
+    def stats(self) -> Dict[str, Any]:
+        (tracked,) = self.db.connection().execute("SELECT COUNT(*) FROM rate_buckets").fetchone()
+        return {
+            "backend": "sqlite",
+            "rate_per_minute": round(self.rate * 60, 2),
+            "burst": self.burst,
+            "tracked_users": tracked,
+            "rejected": self.rejected
+        }
+
+
+TICKET_COLUMNS = ", ".join(Ticket.__slots__)
+_OPEN = "(" + ", ".join(f"'{status}'" for status in OPEN_STATUSES) + ")"
+_HELD = "('assigned', 'claimed')"
+
+
+class SQLiteEscalationDispatcher(EscalationDispatcher):
+    """EscalationDispatcher whose agents and tickets live in the shared database
+
+    Each operation is one write transaction, so dispatch decisions made by
+    different processes are serialised by the database write lock. Every
+    ticket write takes the next change_seq; closed tickets are kept for
+    closed_ttl seconds so processes following changes_since() see them close.
+    """
+
+    shared = True
+
+    def __init__(self, aging_seconds: float = 120.0, db: Optional[SQLiteDatabase] = None,
+                 closed_ttl: float = 86400.0):
+        super().__init__(aging_seconds=aging_seconds)
+        self.db = db or get_database()
+        self.closed_ttl = closed_ttl
+        self._last_prune = 0.0
+
+    # Rows
+
+    @staticmethod
+    def _ticket(row) -> Ticket:
+        return Ticket.restore(dict(zip(Ticket.__slots__, row)))
+
+    def _save(self, conn: sqlite3.Connection, ticket: Ticket):
+        conn.execute(
+            f"INSERT INTO escalation_tickets ({TICKET_COLUMNS}, change_seq) "
+            f"VALUES ({', '.join('?' * len(Ticket.__slots__))}, "
+            "(SELECT COALESCE(MAX(change_seq), 0) + 1 FROM escalation_tickets)) "
+            "ON CONFLICT (ticket_id) DO UPDATE SET status = excluded.status, agent_id = excluded.agent_id, "
+            "updated_at = excluded.updated_at, change_seq = excluded.change_seq",
+            [getattr(ticket, name) for name in Ticket.__slots__]
+        )
+
+    def _set_status(self, conn: sqlite3.Connection, ticket: Ticket, status: str, agent_id: Optional[str]):
+        ticket.status = status
+        ticket.agent_id = agent_id
+        ticket.updated_at = time.time()
+        self._save(conn, ticket)
+
+    @staticmethod
+    def _count(conn: sqlite3.Connection, name: str, amount: int = 1):
+        conn.execute(
+            "INSERT INTO escalation_counters (name, n) VALUES (?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET n = n + excluded.n",
+            (name, amount)
+        )
+
+    def _open_ticket(self, conn: sqlite3.Connection, column: str, value: str) -> Optional[Ticket]:
+        row = conn.execute(
+            f"SELECT {TICKET_COLUMNS} FROM escalation_tickets WHERE {column} = ? AND status IN {_OPEN} "
+            "ORDER BY created_at DESC LIMIT 1", (value,)
+        ).fetchone()
+        return self._ticket(row) if row else None
+
+    @staticmethod
+    def _least_loaded_id(conn: sqlite3.Connection) -> Optional[str]:
+        """Agent with the lowest load that still has room, or None"""
+        # Walks escalation_agents_load in load order; the first agent with room is the answer
+        row = conn.execute(
+            "SELECT agent_id FROM escalation_agents WHERE capacity > 0 AND held < capacity "
+            "ORDER BY CAST(held AS REAL) / capacity, agent_id LIMIT 1"
+        ).fetchone()
+        return row[0] if row else None
+
+    def _next_queued(self, conn: sqlite3.Connection) -> Optional[Ticket]:
+        row = conn.execute(
+            f"SELECT {TICKET_COLUMNS} FROM escalation_tickets WHERE status = 'queued' "
+            "ORDER BY priority_key, created_at LIMIT 1"
+        ).fetchone()
+        return self._ticket(row) if row else None
+
+    def _dispatch_queued(self, conn: sqlite3.Connection) -> List[Ticket]:
+        """Hand queued tickets to the least-loaded agents while anyone has room"""
+        assigned = []
+        while True:
+            agent_id = self._least_loaded_id(conn)
+            ticket = self._next_queued(conn) if agent_id else None
+            if ticket is None:
+                return assigned
+            self._set_status(conn, ticket, "assigned", agent_id)
+            self._count(conn, "assigned")
+            assigned.append(ticket)
+
+    @staticmethod
+    def _merge(ticket: Ticket, dispatched: List[Ticket]) -> List[Ticket]:
+        """ticket (as last written) followed by the other dispatched tickets"""
+        for other in dispatched:
+            if other.ticket_id == ticket.ticket_id:
+                ticket = other
+        return [ticket] + [t for t in dispatched if t is not ticket]
+
+    def _prune(self, conn: sqlite3.Connection):
+        now = time.time()
+        if now - self._last_prune < min(3600.0, self.closed_ttl):
+            return
+        self._last_prune = now
+        # The newest change stays so change_seq never goes backwards
+        conn.execute(
+            f"DELETE FROM escalation_tickets WHERE status NOT IN {_OPEN} AND updated_at < ? "
+            "AND change_seq < (SELECT MAX(change_seq) FROM escalation_tickets)",
+            (now - self.closed_ttl,)
+        )
+
+    # Agent registry
+
+    def _agent(self, conn: sqlite3.Connection, agent_id: str) -> HumanAgent:
+        name, capacity = conn.execute(
+            "SELECT name, capacity FROM escalation_agents WHERE agent_id = ?", (agent_id,)
+        ).fetchone()
+        agent = HumanAgent(agent_id, name, capacity)
+        agent.tickets = {ticket_id for (ticket_id,) in conn.execute(
+            f"SELECT ticket_id FROM escalation_tickets WHERE agent_id = ? AND status IN {_HELD}", (agent_id,)
+        )}
+        return agent
+
+    def register_agent(self, agent_id: str, name: Optional[str] = None, capacity: int = 3) -> HumanAgent:
+        """Add an agent or change an existing agent's capacity"""
+        if not agent_id or capacity < 0:
+            raise DispatchError("agent_id is required and capacity must be >= 0")
+        with self.db.transaction() as conn:
+            conn.execute(
+                "INSERT INTO escalation_agents (agent_id, name, capacity, held) VALUES (:agent_id, :default_name, "
+                f":capacity, (SELECT COUNT(*) FROM escalation_tickets WHERE agent_id = :agent_id AND status IN {_HELD})) "
+                "ON CONFLICT (agent_id) DO UPDATE SET capacity = excluded.capacity, "
+                "name = COALESCE(:name, escalation_agents.name)",
+                {"agent_id": agent_id, "default_name": name or agent_id, "capacity": capacity, "name": name}
+            )
+            changed = self._dispatch_queued(conn)
+            agent = self._agent(conn, agent_id)
+        self._changed(changed)
+        return agent
+
+    def remove_agent(self, agent_id: str):
+        """Take an agent offline; their tickets go back to the queue"""
+        with self.db.transaction() as conn:
+            if conn.execute("DELETE FROM escalation_agents WHERE agent_id = ?", (agent_id,)).rowcount == 0:
+                raise DispatchError(f"Unknown agent {agent_id}", 404)
+            changed = [self._ticket(row) for row in conn.execute(
+                f"SELECT {TICKET_COLUMNS} FROM escalation_tickets WHERE agent_id = ? AND status IN {_HELD}",
+                (agent_id,)
+            ).fetchall()]
+            for ticket in changed:
+                self._set_status(conn, ticket, "queued", None)
+            if changed:
+                self._count(conn, "requeued", len(changed))
+            changed.extend(self._dispatch_queued(conn))
+        self._changed(changed)
+
+    def agents(self) -> List[Dict[str, Any]]:
+        conn = self.db.connection()
+        agents = {agent_id: HumanAgent(agent_id, name, capacity) for agent_id, name, capacity in conn.execute(
+            "SELECT agent_id, name, capacity FROM escalation_agents ORDER BY agent_id"
+        )}
+        for agent_id, ticket_id in conn.execute(
+            f"SELECT agent_id, ticket_id FROM escalation_tickets WHERE status IN {_HELD}"
+        ):
+            if agent_id in agents:
+                agents[agent_id].tickets.add(ticket_id)
+        return [agent.to_dict() for agent in agents.values()]
+
+    # Tickets
+
+    def escalate(self, session_id: str, user_id: str, reason: str, message: str) -> Ticket:
+        """Open a ticket for a session, or return its open one"""
+        with self.db.transaction() as conn:
+            existing = self._open_ticket(conn, "session_id", session_id)
+            if existing is not None:
+                return existing
+            ticket = Ticket(session_id, user_id, reason, message, urgency(f"{reason} {message}"),
+                            self.aging_seconds)
+            self._save(conn, ticket)
+            self._count(conn, "escalated")
+            changed = self._merge(ticket, self._dispatch_queued(conn))
+            ticket = changed[0]
+            self._prune(conn)
+        self._changed(changed)
+        logger.info(f"Escalation {ticket.ticket_id} (urgency {ticket.urgency}) -> {ticket.status} "
+                    f"{ticket.agent_id or ''}".rstrip())
+        return ticket
+
+    def claim(self, agent_id: str, ticket_id: Optional[str] = None) -> Ticket:
+        """Agent takes a ticket: a given one assigned to them or queued, or else the next in the queue"""
+        with self.db.transaction() as conn:
+            row = conn.execute(
+                "SELECT capacity, held FROM escalation_agents WHERE agent_id = ?", (agent_id,)
+            ).fetchone()
+            if row is None:
+                raise DispatchError(f"Unknown agent {agent_id}", 404)
+            capacity, held = row
+            has_room = held < capacity
+            if ticket_id is None:
+                if not has_room:
+                    raise DispatchError(f"Agent {agent_id} is at capacity", 409)
+                ticket = self._next_queued(conn)
+                if ticket is None:
+                    raise DispatchError("No tickets waiting", 404)
+            else:
+                ticket = self._open_ticket(conn, "ticket_id", ticket_id)
+                if ticket is None:
+                    raise DispatchError(f"Unknown ticket {ticket_id}", 404)
+                if ticket.status == "queued":
+                    if not has_room:
+                        raise DispatchError(f"Agent {agent_id} is at capacity", 409)
+                elif not (ticket.status == "assigned" and ticket.agent_id == agent_id):
+                    raise DispatchError(f"Ticket {ticket_id} is {ticket.status}", 409)
+            self._set_status(conn, ticket, "claimed", agent_id)
+            self._count(conn, "claimed")
+        self._changed([ticket])
+        return ticket
+
+    def release(self, agent_id: str, ticket_id: str, resolved: bool = True) -> Ticket:
+        """Agent finishes a ticket (resolved) or hands it back to the queue"""
+        with self.db.transaction() as conn:
+            ticket = self._open_ticket(conn, "ticket_id", ticket_id)
+            known = conn.execute("SELECT 1 FROM escalation_agents WHERE agent_id = ?", (agent_id,)).fetchone()
+            if ticket is None or known is None:
+                raise DispatchError(f"Unknown ticket {ticket_id} or agent {agent_id}", 404)
+            if ticket.agent_id != agent_id or ticket.status not in ("assigned", "claimed"):
+                raise DispatchError(f"Ticket {ticket_id} is not held by {agent_id}", 409)
+            if resolved:
+                self._set_status(conn, ticket, "resolved", agent_id)
+                self._count(conn, "resolved")
+            else:
+                self._set_status(conn, ticket, "queued", None)
+                self._count(conn, "requeued")
+            changed = self._merge(ticket, self._dispatch_queued(conn))
+            ticket = changed[0]
+        self._changed(changed)
+        return ticket
+
+    def cancel_session(self, session_id: str, *_):
+        """Withdraw a session's ticket if no agent holds it yet (usable as a session store remove listener)"""
+        with self.db.transaction() as conn:
+            ticket = self._open_ticket(conn, "session_id", session_id)
+            if ticket is None or ticket.status != "queued":
+                # An agent is already on it; they release it as usual
+                return
+            self._set_status(conn, ticket, "cancelled", None)
+            self._count(conn, "cancelled")
+
+    def status_for_session(self, session_id: str) -> str:
+        """State of the session's open ticket, or "none" """
+        ticket = self._open_ticket(self.db.connection(), "session_id", session_id)
+        return ticket.status if ticket is not None else "none"
+
+    def get(self, ticket_id: str) -> Optional[Ticket]:
+        return self._open_ticket(self.db.connection(), "ticket_id", ticket_id)
+
+    def waiting(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Queued tickets in dispatch order"""
+        rows = self.db.connection().execute(
+            f"SELECT {TICKET_COLUMNS} FROM escalation_tickets WHERE status = 'queued' "
+            "ORDER BY priority_key, created_at LIMIT ?", (limit,)
+        ).fetchall()
+        return [self._ticket(row).to_dict() for row in rows]
+
+    def changes_since(self, change_seq: int, limit: int = 500) -> Tuple[List[Ticket], int]:
+        """Tickets written by any process after change_seq, oldest first, and the change_seq to pass next
+
+        A negative change_seq returns no tickets, only the current position to start following from.
+        """
+        conn = self.db.connection()
+        if change_seq < 0:
+            (latest,) = conn.execute("SELECT COALESCE(MAX(change_seq), 0) FROM escalation_tickets").fetchone()
+            return [], latest
+        rows = conn.execute(
+            f"SELECT {TICKET_COLUMNS}, change_seq FROM escalation_tickets WHERE change_seq > ? "
+            "ORDER BY change_seq LIMIT ?", (change_seq, limit)
+        ).fetchall()
+        return [self._ticket(row[:-1]) for row in rows], rows[-1][-1] if rows else change_seq
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self.db.connection()
+        agents, capacity, active = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(capacity), 0), COALESCE(SUM(held), 0) FROM escalation_agents"
+        ).fetchone()
+        (queued,) = conn.execute("SELECT COUNT(*) FROM escalation_tickets WHERE status = 'queued'").fetchone()
+        counters = dict.fromkeys(self.counters, 0)
+        counters.update(conn.execute("SELECT name, n FROM escalation_counters").fetchall())
+        return {
+            "backend": "sqlite",
+            "agents": agents,
+            "capacity": capacity,
+            "active_tickets": active,
+            "queued": queued,
+            **counters
+        }
+
+
+def _split_state(state: Optional[Dict[str, Any]]) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]:
+    """Split a state dict into (app, user, session) parts; temp: keys are dropped"""
+    app_state, user_state, session_state = {}, {}, {}
+    for key, value in (state or {}).items():
+        if key.startswith(State.APP_PREFIX):
+            app_state[key[len(State.APP_PREFIX):]] = value
+        elif key.startswith(State.USER_PREFIX):
+            user_state[key[len(State.USER_PREFIX):]] = value
+        elif not key.startswith(State.TEMP_PREFIX):
+            session_state[key] = value
+    return app_state, user_state, session_state
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, default=str)
+
+
+class SQLiteSessionService(BaseSessionService):
+    """ADK session service backed by the shared SQLite database"""
+
+    def __init__(self, db: Optional[SQLiteDatabase] = None, threads: Optional[int] = None):
+        self.db = db or get_database()
+        self._executor = ThreadPoolExecutor(
+            max_workers=threads or int(os.getenv("SESSION_DB_THREADS", "4")), thread_name_prefix="session-db"
+        )
+
+    async def _run(self, fn: Callable[..., Any], *args) -> Any:
+        """Run blocking database work on the service's threads instead of the event loop"""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _merge_scoped_state(self, conn: sqlite3.Connection, app_name: str, user_id: str,
+                            state: Dict[str, Any], app_delta: Dict[str, Any], user_delta: Dict[str, Any]):
+        """Apply app/user deltas and merge the resulting scoped state into state"""
+        row = conn.execute("SELECT state FROM adk_app_state WHERE app_name = ?", (app_name,)).fetchone()
+        app_state = json.loads(row[0]) if row else {}
+        if app_delta:
+            app_state.update(app_delta)
+            conn.execute(
+                "INSERT INTO adk_app_state (app_name, state) VALUES (?, ?) "
+                "ON CONFLICT (app_name) DO UPDATE SET state = excluded.state",
+                (app_name, _dumps(app_state))
+            )
+
+        row = conn.execute(
+            "SELECT state FROM adk_user_state WHERE app_name = ? AND user_id = ?", (app_name, user_id)
+        ).fetchone()
+        user_state = json.loads(row[0]) if row else {}
+        if user_delta:
+            user_state.update(user_delta)
+            conn.execute(
+                "INSERT INTO adk_user_state (app_name, user_id, state) VALUES (?, ?, ?) "
+                "ON CONFLICT (app_name, user_id) DO UPDATE SET state = excluded.state",
+                (app_name, user_id, _dumps(user_state))
+            )
+
+        for key, value in app_state.items():
+            state[State.APP_PREFIX + key] = value
+        for key, value in user_state.items():
+            state[State.USER_PREFIX + key] = value
+
+    async def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[Dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        session_id = (session_id or "").strip() or str(uuid.uuid4())
+        return await self._run(self._create_session, app_name, user_id, session_id, state)
+
+    def _create_session(self, app_name: str, user_id: str, session_id: str,
+                        state: Optional[Dict[str, Any]]) -> Session:
+        app_delta, user_delta, session_state = _split_state(state)
+        now = time.time()
+
+        with self.db.transaction() as conn:
+            try:
+                conn.execute(
+                    "INSERT INTO adk_sessions (app_name, user_id, session_id, state, last_update_time) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (app_name, user_id, session_id, _dumps(session_state), now)
+                )
+            except sqlite3.IntegrityError:
+                raise ValueError(f"Session with id {session_id} already exists.")
+            merged = dict(session_state)
+            self._merge_scoped_state(conn, app_name, user_id, merged, app_delta, user_delta)
+
+        return Session(app_name=app_name, user_id=user_id, id=session_id, state=merged, last_update_time=now)
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        return await self._run(self._get_session, app_name, user_id, session_id, config)
+
+    def _get_session(self, app_name: str, user_id: str, session_id: str,
+                     config: Optional[GetSessionConfig]) -> Optional[Session]:
+        conn = self.db.connection()
+        row = conn.execute(
+            "SELECT state, last_update_time FROM adk_sessions "
+            "WHERE app_name = ? AND user_id = ? AND session_id = ?",
+            (app_name, user_id, session_id)
+        ).fetchone()
+        if row is None:
+            return None
+
+        where = "app_name = ? AND user_id = ? AND session_id = ?"
+        params: List[Any] = [app_name, user_id, session_id]
+        if config and config.after_timestamp is not None:
+            where += " AND timestamp >= ?"
+            params.append(config.after_timestamp)
+        if config and config.num_recent_events is not None:
+            query = (
+                f"SELECT event FROM (SELECT seq, event FROM adk_events WHERE {where} "
+                "ORDER BY seq DESC LIMIT ?) ORDER BY seq"
+            )
+            params.append(config.num_recent_events)
+        else:
+            query = f"SELECT event FROM adk_events WHERE {where} ORDER BY seq"
+        events = [Event.model_validate_json(event) for (event,) in conn.execute(query, params)]
+
+        state = json.loads(row[0])
+        self._merge_scoped_state(conn, app_name, user_id, state, {}, {})
+        return Session(
+            app_name=app_name,
+            user_id=user_id,
+            id=session_id,
+            state=state,
+            events=events,
+            last_update_time=row[1]
+        )
+
+    async def list_sessions(self, *, app_name: str, user_id: Optional[str] = None) -> ListSessionsResponse:
+        return await self._run(self._list_sessions, app_name, user_id)
+
+    def _list_sessions(self, app_name: str, user_id: Optional[str]) -> ListSessionsResponse:
+        conn = self.db.connection()
+        query = "SELECT user_id, session_id, state, last_update_time FROM adk_sessions WHERE app_name = ?"
+        params: List[Any] = [app_name]
+        if user_id is not None:
+            query += " AND user_id = ?"
+            params.append(user_id)
+        query += " ORDER BY last_update_time, user_id, session_id"
+
+        sessions = []
+        for uid, sid, state_json, last_update_time in conn.execute(query, params).fetchall():
+            state = json.loads(state_json)
+            self._merge_scoped_state(conn, app_name, uid, state, {}, {})
+            sessions.append(Session(
+                app_name=app_name, user_id=uid, id=sid, state=state, last_update_time=last_update_time
+            ))
+        return ListSessionsResponse(sessions=sessions)
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        await self._run(self._delete_session, app_name, user_id, session_id)
+
+    def _delete_session(self, app_name: str, user_id: str, session_id: str):
+        with self.db.transaction() as conn:
+            conn.execute(
+                "DELETE FROM adk_sessions WHERE app_name = ? AND user_id = ? AND session_id = ?",
+                (app_name, user_id, session_id)
+            )
+            conn.execute(
+                "DELETE FROM adk_events WHERE app_name = ? AND user_id = ? AND session_id = ?",
+                (app_name, user_id, session_id)
+            )
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        if event.partial:
+            return event
+
+        await super().append_event(session=session, event=event)
+        session.last_update_time = event.timestamp
+        await self._run(self._append_event, session, event)
+        return event
+
+    def _append_event(self, session: Session, event: Event):
+        delta = event.actions.state_delta if event.actions else None
+        app_delta, user_delta, session_delta = _split_state(delta)
+
+        with self.db.transaction() as conn:
+            row = conn.execute(
+                "SELECT state FROM adk_sessions WHERE app_name = ? AND user_id = ? AND session_id = ?",
+                (session.app_name, session.user_id, session.id)
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Session {session.id} not found.")
+            stored_state = json.loads(row[0])
+            stored_state.update(session_delta)
+            conn.execute(
+                "UPDATE adk_sessions SET state = ?, last_update_time = ? "
+                "WHERE app_name = ? AND user_id = ? AND session_id = ?",
+                (_dumps(stored_state), event.timestamp, session.app_name, session.user_id, session.id)
+            )
+            conn.execute(
+                "INSERT INTO adk_events (app_name, user_id, session_id, timestamp, event) VALUES (?, ?, ?, ?, ?)",
+                (session.app_name, session.user_id, session.id, event.timestamp,
+                 event.model_dump_json(exclude_none=True))
+            )
+            if app_delta or user_delta:
+                self._merge_scoped_state(conn, session.app_name, session.user_id, {}, app_delta, user_delta)
@@ -51,6 +51,37 @@ def test_send_message(session_id, user_id, message):
     print(f"Metadata: {json.dumps(data.get('metadata', {}), indent=2)}")
     return response.status_code == 200
 
+def test_stream_message(session_id, user_id, message):
+    print_section(f"Testing Stream Message: '{message[:50]}...'")
+    response = requests.post(
+        f"{BASE_URL}/api/chat/message/stream",
+        json={
+            "session_id": session_id,
+            "user_id": user_id,
+            "message": message
+        },
+        stream=True
+    )
+    print(f"Status: {response.status_code}")
+    
+    first_event_at = None
+    start = time.time()
+    final_payload = None
+    event_name = None
+    for line in response.iter_lines(decode_unicode=True):
+        if line.startswith("event: "):
+            event_name = line[len("event: "):]
+            if first_event_at is None:
+                first_event_at = time.time() - start
+        elif line.startswith("data: ") and event_name == "done":
+            final_payload = json.loads(line[len("data: "):])
+    
+    print(f"Time to first event: {first_event_at:.2f}s" if first_event_at else "No events received")
+    if final_payload:
+        print(f"Agent Response: {final_payload.get('agent_response', 'No response')[:200]}...")
+        print(f"Message Count: {final_payload.get('message_count')}")
+    return response.status_code == 200 and final_payload is not None
+
 def test_get_history(session_id):
     print_section("Testing Get Chat History")
     response = requests.get(f"{BASE_URL}/api/chat/history/{session_id}")
@@ -110,6 +141,9 @@ def run_full_test():
         results["send_messages"].append(success)
         time.sleep(2)  # Wait for agent processing
     
+    results["stream_message"] = test_stream_message(session_id, user_id, "My app keeps crashing")
+    time.sleep(1)
+    
     # Test 4: Get History
     results["get_history"] = test_get_history(session_id)
     time.sleep(1)
@@ -129,15 +163,17 @@ def run_full_test():
     print(f"✅ Health Check: {'PASSED' if results['health_check'] else 'FAILED'}")
     print(f"✅ Start Chat: {'PASSED' if results['start_chat'] else 'FAILED'}")
     print(f"✅ Send Messages: {sum(results['send_messages'])}/{len(results['send_messages'])} PASSED")
+    print(f"✅ Stream Message: {'PASSED' if results['stream_message'] else 'FAILED'}")
     print(f"✅ Get History: {'PASSED' if results['get_history'] else 'FAILED'}")
     print(f"✅ Active Sessions: {'PASSED' if results['active_sessions'] else 'FAILED'}")
     print(f"✅ End Chat: {'PASSED' if results['end_chat'] else 'FAILED'}")
     
-    total_tests = 6 + len(results['send_messages']) - 1
+    total_tests = 7 + len(results['send_messages']) - 1
     passed_tests = sum([
         results['health_check'],
         results['start_chat'],
         sum(results['send_messages']),
+        results['stream_message'],
         results['get_history'],
         results['active_sessions'],
         results['end_chat']
@@ -0,0 +1,88 @@
+import threading
+import time
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected, RateLimiter
+
+
+def test_rate_limiter_allows_burst_then_rejects_with_retry_after():
+    limiter = RateLimiter(rate=1.0, burst=2)
+    limiter.check("u1")
+    limiter.check("u1")
+    with pytest.raises(AdmissionRejected) as rejected:
+        limiter.check("u1")
+    assert rejected.value.status == 429
+    assert 0 < rejected.value.retry_after <= 1.0
+    # Other users have their own bucket
+    limiter.check("u2")
+
+
+def test_admission_controller_rejects_when_queue_is_full():
+    controller = AdmissionController(max_concurrent=1, max_queue=0, max_wait=1)
+    with controller.acquire():
+        with pytest.raises(AdmissionRejected) as rejected:
+            controller.acquire()
+    assert rejected.value.reason == "queue_full"
+    controller.acquire().release()
+
+
+def test_admission_controller_times_out_queued_requests():
+    controller = AdmissionController(max_concurrent=1, max_queue=1, max_wait=0.05)
+    with controller.acquire():
+        with pytest.raises(AdmissionRejected) as rejected:
+            controller.acquire()
+    assert rejected.value.reason == "queue_timeout"
+
+
+def test_shared_rate_limiter_counts_every_process(tmp_path):
+    pytest.importorskip("google.adk")
+    from sqlite_sessions import SQLiteDatabase, SQLiteRateLimiter
+
+    path = str(tmp_path / "sessions.db")
+    # Two limiters on one file stand in for two worker processes
+    workers = [SQLiteRateLimiter(SQLiteDatabase(path), rate=0.01, burst=3) for _ in range(2)]
+    granted = 0
+    for i in range(6):
+        try:
+            workers[i % 2].check("u1")
+            granted += 1
+        except AdmissionRejected:
+            pass
+    assert granted == 3
+    assert workers[0].stats()["tracked_users"] == 1
+
+
+def test_shared_rate_limiter_refills(tmp_path):
+    pytest.importorskip("google.adk")
+    from sqlite_sessions import SQLiteDatabase, SQLiteRateLimiter
+
+    limiter = SQLiteRateLimiter(SQLiteDatabase(str(tmp_path / "sessions.db")), rate=20.0, burst=1)
+    limiter.check("u1")
+    with pytest.raises(AdmissionRejected):
+        limiter.check("u1")
+    time.sleep(0.1)
+    limiter.check("u1")
+
+
+def test_shared_rate_limiter_is_consistent_across_threads(tmp_path):
+    pytest.importorskip("google.adk")
+    from sqlite_sessions import SQLiteDatabase, SQLiteRateLimiter
+
+    limiter = SQLiteRateLimiter(SQLiteDatabase(str(tmp_path / "sessions.db")), rate=0.001, burst=10)
+    results = []
+
+    def worker():
+        for _ in range(5):
+            try:
+                limiter.check("u1")
+                results.append(True)
+            except AdmissionRejected:
+                results.append(False)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results.count(True) == 10
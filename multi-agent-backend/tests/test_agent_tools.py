@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+pytest.importorskip("google.adk")
+
+from agent_tools import SimplifiedAgentTools  # noqa: E402
+from escalation import EscalationDispatcher  # noqa: E402
+from knowledge_base import KnowledgeBase  # noqa: E402
+
+
+class CountingVectors:
+    def __init__(self, hits):
+        self.hits = hits
+        self.calls = 0
+
+    def search(self, text, top_k=3):
+        self.calls += 1
+        return self.hits[:top_k]
+
+
+@pytest.fixture
+def tools():
+    kb = KnowledgeBase.from_categories({"internet": ["Restart your router"], "billing": ["Check your invoice"]})
+    tools = SimplifiedAgentTools(kb=kb, dispatcher=EscalationDispatcher())
+    tools.vectors = CountingVectors([(1, 0.9)])
+    return tools
+
+
+def test_a_bm25_match_skips_the_vector_scan(tools):
+    result = json.loads(tools.search_knowledge_base("internet"))
+    assert result["category"] == "internet"
+    assert tools.vectors.calls == 0
+
+
+def test_vectors_are_searched_when_bm25_finds_nothing(tools):
+    result = json.loads(tools.search_knowledge_base("zzzqqq"))
+    assert (result["found"], result["category"], tools.vectors.calls) == (True, "billing", 1)
+
+
+def test_ranked_categories_on_request(tools):
+    result = tools.lookup("internet", rank_categories=True)
+    assert tools.vectors.calls == 1
+    assert result["categories"][0]["category"] == "billing"
+
+
+def test_escalate_to_human_runs_the_dispatcher_off_the_event_loop(tools):
+    import asyncio
+    import threading
+    from types import SimpleNamespace
+
+    threads = []
+    escalate = tools.dispatcher.escalate
+
+    def recording_escalate(**kwargs):
+        threads.append(threading.current_thread())
+        return escalate(**kwargs)
+
+    tools.dispatcher.escalate = recording_escalate
+    tools.dispatcher.register_agent("A1", capacity=1)
+    context = SimpleNamespace(session=SimpleNamespace(id="s1"), user_id="u1")
+
+    async def call():
+        return threading.current_thread(), await tools.escalate_to_human("complex", "help", context)
+
+    loop_thread, result = asyncio.run(call())
+    assert json.loads(result)["agent_id"] == "A1"
+    assert threads and threads[0] is not loop_thread
@@ -0,0 +1,174 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("google.adk")
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+import app  # noqa: E402
+import model_transport  # noqa: E402
+from escalation import Ticket  # noqa: E402
+from session_store import SessionRecord, SessionStore  # noqa: E402
+
+
+@pytest.fixture
+def session_id(monkeypatch):
+    # A store without the app's remove listeners, so nothing reaches the ADK session service
+    monkeypatch.setattr(app, "active_sessions", SessionStore())
+    app.active_sessions["test-session"] = SessionRecord("u1")
+    return "test-session"
+
+
+def test_session_escalation_status_follows_the_ticket_and_clears_when_closed(session_id):
+    ticket = Ticket(session_id, "u1", "complex", "help", 0, 120)
+    for status, expected in [("queued", "queued"), ("claimed", "claimed"), ("resolved", "none")]:
+        ticket.status = status
+        app.track_escalation(ticket)
+        assert app.active_sessions[session_id].escalation_status == expected
+
+
+def test_history_long_poll_returns_the_current_page_when_waiters_are_full(session_id, monkeypatch):
+    monkeypatch.setattr(app, "history_waiters", threading.BoundedSemaphore(0))
+    start = time.monotonic()
+    response = app.app.test_client().get(f"/api/chat/history/{session_id}?after=0&wait=5")
+    assert time.monotonic() - start < 1
+    assert response.status_code == 200
+    assert response.get_json()["conversation_history"] == []
+
+
+def test_history_long_poll_frees_its_waiter_slot(session_id, monkeypatch):
+    monkeypatch.setattr(app, "history_waiters", threading.BoundedSemaphore(1))
+    client = app.app.test_client()
+    for _ in range(2):
+        assert client.get(f"/api/chat/history/{session_id}?after=0&wait=0.05").status_code == 200
+    assert app.history_waiters.acquire(blocking=False)
+
+
+def test_history_bytes_gauge_counts_utf8_bytes(session_id, monkeypatch):
+    monkeypatch.setattr(app.dispatcher, "status_for_session", lambda session_id: "none")
+    before = app.metrics.HISTORY_BYTES.value()
+    app.record_turn(session_id, "naïve", "日本")
+    assert app.metrics.HISTORY_BYTES.value() - before == len("naïve".encode("utf-8")) + len("日本".encode("utf-8"))
+    assert app.history_bytes(app.active_sessions[session_id]) == 12
+
+
+@pytest.fixture
+def admin(monkeypatch):
+    monkeypatch.setattr(app, "ADMIN_TOKEN", "secret")
+    return {"X-Admin-Token": "secret"}
+
+
+@pytest.mark.parametrize("capacity", ["abc", None, "3", 2.5, True])
+def test_register_agent_rejects_a_capacity_that_is_not_an_integer(admin, capacity):
+    response = app.app.test_client().post("/api/agents", headers=admin,
+                                          json={"agent_id": "A-test", "capacity": capacity})
+    assert response.status_code == 400
+
+
+def test_register_agent_rejects_a_negative_capacity(admin):
+    response = app.app.test_client().post("/api/agents", headers=admin, json={"agent_id": "A-test", "capacity": -1})
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("method, path", [
+    ("get", "/api/escalations"),
+    ("get", "/api/escalations/T-1"),
+    ("post", "/api/escalations/claim"),
+    ("post", "/api/escalations/T-1/release"),
+    ("get", "/api/agents"),
+    ("post", "/api/agents"),
+    ("delete", "/api/agents/A-1"),
+])
+def test_escalation_and_agent_endpoints_need_the_admin_token(monkeypatch, method, path):
+    client = app.app.test_client()
+    monkeypatch.setattr(app, "ADMIN_TOKEN", "")
+    assert getattr(client, method)(path, json={"agent_id": "A-1"}).status_code == 403
+    monkeypatch.setattr(app, "ADMIN_TOKEN", "secret")
+    assert getattr(client, method)(path, json={"agent_id": "A-1"}).status_code == 401
+    response = getattr(client, method)(path, json={"agent_id": "A-1"}, headers={"X-Admin-Token": "wrong"})
+    assert response.status_code == 401
+
+
+def test_agents_are_listed_with_the_admin_token(admin):
+    response = app.app.test_client().get("/api/agents", headers=admin)
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize("parallelism", ["abc", None, [2]])
+def test_batch_rejects_a_parallelism_that_is_not_an_integer(parallelism):
+    response = app.app.test_client().post("/api/chat/batch",
+                                          json={"items": [{"message": "hi"}], "parallelism": parallelism})
+    assert response.status_code == 400
+
+
+def test_batch_items_are_rate_limited_and_see_the_request_context(session_id, monkeypatch):
+    seen = []
+
+    def check(user_id):
+        if user_id == "limited":
+            raise app.AdmissionRejected("rate_limited", 429, 2.0)
+
+    def answer(session_id, user_id, message):
+        seen.append(model_transport.remaining())
+        return "answer", {"metadata": {}}
+
+    monkeypatch.setattr(app.rate_limiter, "check", check)
+    monkeypatch.setattr(app, "answer_message", answer)
+    monkeypatch.setattr(app, "create_sessions", lambda user_ids: [f"s-{user_id}" for user_id in user_ids])
+    response = app.app.test_client().post(
+        "/api/chat/batch", headers={"X-Request-Timeout": "5"},
+        json={"items": [{"message": "hi", "user_id": "ok"}, {"message": "hi", "user_id": "limited"}]}
+    )
+    lines = [json.loads(line) for line in response.data.decode().splitlines()]
+    results = {line["user_id"]: line for line in lines if "user_id" in line}
+    assert results["ok"]["status"] == "ok"
+    assert (results["limited"]["error"], results["limited"]["retry_after"]) == ("rate_limited", 2.0)
+    assert len(seen) == 1 and 0 < seen[0] <= 5
+
+
+def test_transcripts_need_the_admin_token(monkeypatch):
+    client = app.app.test_client()
+    monkeypatch.setattr(app, "ADMIN_TOKEN", "")
+    assert client.get("/api/chat/transcript/s1").status_code == 403
+    monkeypatch.setattr(app, "ADMIN_TOKEN", "secret")
+    assert client.get("/api/chat/transcript/s1", headers={"X-Admin-Token": "wrong"}).status_code == 401
+    monkeypatch.setattr(app, "transcripts", None)
+    assert client.get("/api/chat/transcript/s1", headers={"X-Admin-Token": "secret"}).status_code == 404
+
+
+@pytest.fixture
+def model_only(monkeypatch):
+    """answer_message with the model, ADK mirror and knowledge base stubbed; returns the fast path's calls"""
+    routed = []
+
+    class Router:
+        def route(self, message):
+            routed.append(message)
+            return {"agent_response": "canned", "category": "app", "confidence": 1.0}
+
+    class Tools:
+        kb = type("KB", (), {"version": "test"})()
+
+    monkeypatch.setattr(app, "fast_path", Router())
+    monkeypatch.setattr(app, "response_cache", None)
+    monkeypatch.setattr(app, "get_tools", Tools)
+    monkeypatch.setattr(app, "append_adk_turn", lambda *args: None)
+    monkeypatch.setattr(app, "admitted_run_agent", lambda *args: "from the model")
+    return routed
+
+
+def test_fast_path_answers_only_opening_messages(session_id, model_only):
+    assert app.answer_message(session_id, "u1", "my app keeps crashing")[0] == "canned"
+    assert app.answer_message(session_id, "u1", "my app keeps crashing")[0] == "from the model"
+    assert len(model_only) == 1
+
+
+def test_fast_path_skips_escalated_sessions(session_id, model_only):
+    def escalate(session):
+        session.escalation_status = "queued"
+    app.active_sessions.update(session_id, escalate)
+    assert app.answer_message(session_id, "u1", "my app keeps crashing")[0] == "from the model"
+    assert model_only == []
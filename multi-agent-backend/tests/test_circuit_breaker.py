@@ -0,0 +1,131 @@
+import pytest
+
+import circuit_breaker
+from circuit_breaker import (
+    CLOSED,
+    DEGRADED_NOT_FOUND,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitOpen,
+    degraded_response,
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(circuit_breaker, "time", clock)
+    return clock
+
+
+def breaker(**kwargs) -> CircuitBreaker:
+    options = dict(window_seconds=60, min_calls=4, failure_rate=0.5, slow_seconds=5, slow_rate=0.5,
+                   open_seconds=30, half_open_probes=1)
+    return CircuitBreaker(**dict(options, **kwargs))
+
+
+def calls(cb: CircuitBreaker, *outcomes):
+    for ok, seconds in outcomes:
+        with cb.acquire() as call:
+            call.record(ok, seconds)
+
+
+def trip(cb: CircuitBreaker):
+    calls(cb, (True, 0.1), (True, 0.1), (False, 0.1), (False, 0.1))
+    assert cb.state == OPEN
+
+
+def test_opens_at_the_failure_rate_once_the_window_has_min_calls(clock):
+    cb = breaker()
+    calls(cb, (False, 0.1), (False, 0.1), (False, 0.1))
+    assert cb.state == CLOSED
+    calls(cb, (True, 0.1))
+    assert cb.state == OPEN
+    with pytest.raises(CircuitOpen) as refused:
+        cb.acquire()
+    assert refused.value.retry_after == 30
+    assert cb.stats()["rejected"] == 1
+
+
+def test_opens_at_the_slow_rate(clock):
+    cb = breaker()
+    calls(cb, (True, 0.1), (True, 0.1), (True, 6.0), (True, 7.0))
+    assert cb.state == OPEN
+
+
+def test_old_calls_leave_the_window(clock):
+    cb = breaker()
+    calls(cb, (False, 0.1), (False, 0.1), (False, 0.1))
+    clock.now += 61
+    calls(cb, (True, 0.1))
+    assert cb.state == CLOSED
+    assert cb.stats()["window_calls"] == 1
+
+
+def test_half_open_grants_a_single_probe_and_closes_after_it_succeeds(clock):
+    cb = breaker()
+    trip(cb)
+    clock.now += 29
+    with pytest.raises(CircuitOpen):
+        cb.acquire()
+    clock.now += 1
+    assert cb.state == HALF_OPEN
+
+    probe = cb.acquire()
+    assert probe.probe
+    with pytest.raises(CircuitOpen):
+        cb.acquire()
+    probe.record(True, 0.1)
+    assert cb.state == CLOSED
+    assert cb.stats()["window_calls"] == 0
+    assert not cb.acquire().probe
+
+
+def test_a_probe_released_without_a_result_frees_its_slot(clock):
+    cb = breaker()
+    trip(cb)
+    clock.now += 30
+    with cb.acquire():
+        pass
+    assert cb.state == HALF_OPEN
+    assert cb.acquire().probe
+
+
+@pytest.mark.parametrize("ok, seconds", [(False, 0.1), (True, 6.0)])
+def test_a_failed_or_slow_probe_reopens(clock, ok, seconds):
+    cb = breaker()
+    trip(cb)
+    clock.now += 30
+    cb.acquire().record(ok, seconds)
+    assert cb.state == OPEN
+    assert cb.stats()["opened"] == 2
+
+
+def test_needs_every_probe_to_succeed_before_closing(clock):
+    cb = breaker(half_open_probes=2)
+    trip(cb)
+    clock.now += 30
+    first, second = cb.acquire(), cb.acquire()
+    with pytest.raises(CircuitOpen):
+        cb.acquire()
+    first.record(True, 0.1)
+    assert cb.state == HALF_OPEN
+    second.record(True, 0.1)
+    assert cb.state == CLOSED
+
+
+def test_degraded_response_lists_the_knowledge_base_steps():
+    reply = degraded_response({"found": True, "category": "internet",
+                               "solutions": ["Unplug the router", "Call your ISP"]})
+    assert "internet issues" in reply
+    assert "1. Unplug the router\n2. Call your ISP" in reply
+    assert degraded_response({"found": False}) == DEGRADED_NOT_FOUND
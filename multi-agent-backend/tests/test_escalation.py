@@ -0,0 +1,158 @@
+import pytest
+
+from escalation import DispatchError, EscalationDispatcher, urgency
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def dispatcher(request, tmp_path):
+    if request.param == "memory":
+        dispatcher = EscalationDispatcher(aging_seconds=120)
+    else:
+        dispatcher = sqlite_dispatcher(tmp_path)
+    dispatcher.register_agent("A1", capacity=1)
+    return dispatcher
+
+
+def sqlite_dispatcher(tmp_path):
+    pytest.importorskip("google.adk")
+    from sqlite_sessions import SQLiteEscalationDispatcher, get_database
+    return SQLiteEscalationDispatcher(aging_seconds=120, db=get_database(str(tmp_path / "sessions.db")))
+
+
+def test_new_ticket_goes_to_an_agent_with_room(dispatcher):
+    ticket = dispatcher.escalate("s1", "u1", "complex", "help")
+    assert (ticket.status, ticket.agent_id) == ("assigned", "A1")
+    assert dispatcher.status_for_session("s1") == "assigned"
+
+
+def test_ticket_waits_when_agents_are_full(dispatcher):
+    dispatcher.escalate("s1", "u1", "complex", "help")
+    second = dispatcher.escalate("s2", "u2", "complex", "help")
+    assert second.status == "queued"
+    assert [t["ticket_id"] for t in dispatcher.waiting()] == [second.ticket_id]
+
+
+def test_escalating_again_returns_the_open_ticket(dispatcher):
+    first = dispatcher.escalate("s1", "u1", "complex", "help")
+    assert dispatcher.escalate("s1", "u1", "again", "help!").ticket_id == first.ticket_id
+
+
+def test_claim_release_and_resolve(dispatcher):
+    ticket = dispatcher.escalate("s1", "u1", "complex", "help")
+    assert dispatcher.claim("A1", ticket.ticket_id).status == "claimed"
+    resolved = dispatcher.release("A1", ticket.ticket_id, resolved=True)
+    assert resolved.status == "resolved"
+    assert dispatcher.status_for_session("s1") == "none"
+    assert dispatcher.get(ticket.ticket_id) is None
+    # The session may escalate again with a new ticket
+    assert dispatcher.escalate("s1", "u1", "complex", "help").ticket_id != ticket.ticket_id
+
+
+def test_release_unresolved_requeues_and_redispatches(dispatcher):
+    ticket = dispatcher.escalate("s1", "u1", "complex", "help")
+    queued = dispatcher.escalate("s2", "u2", "urgent outage!!", "help")
+    released = dispatcher.release("A1", ticket.ticket_id, resolved=False)
+    # The more urgent waiting ticket takes the freed place ahead of the handed-back one
+    assert released.status == "queued"
+    assert dispatcher.status_for_session("s2") == "assigned"
+    assert dispatcher.get(queued.ticket_id).agent_id == "A1"
+
+
+def test_freed_capacity_assigns_the_next_ticket(dispatcher):
+    first = dispatcher.escalate("s1", "u1", "complex", "help")
+    second = dispatcher.escalate("s2", "u2", "complex", "help")
+    dispatcher.release("A1", first.ticket_id, resolved=True)
+    assert dispatcher.get(second.ticket_id).status == "assigned"
+
+
+def test_claim_errors(dispatcher):
+    with pytest.raises(DispatchError) as error:
+        dispatcher.claim("nobody")
+    assert error.value.status == 404
+    dispatcher.escalate("s1", "u1", "complex", "help")
+    with pytest.raises(DispatchError) as error:
+        dispatcher.claim("A1")
+    assert error.value.status == 409
+    with pytest.raises(DispatchError):
+        dispatcher.release("A1", "T-unknown")
+
+
+def test_removing_an_agent_requeues_their_tickets(dispatcher):
+    ticket = dispatcher.escalate("s1", "u1", "complex", "help")
+    dispatcher.remove_agent("A1")
+    assert dispatcher.get(ticket.ticket_id).status == "queued"
+    dispatcher.register_agent("A2", capacity=2)
+    assert dispatcher.get(ticket.ticket_id).agent_id == "A2"
+
+
+def test_cancel_session_withdraws_only_queued_tickets(dispatcher):
+    held = dispatcher.escalate("s1", "u1", "complex", "help")
+    waiting = dispatcher.escalate("s2", "u2", "complex", "help")
+    dispatcher.cancel_session("s1")
+    dispatcher.cancel_session("s2")
+    assert dispatcher.get(held.ticket_id).status == "assigned"
+    assert dispatcher.get(waiting.ticket_id) is None
+    assert dispatcher.stats()["cancelled"] == 1
+
+
+def test_listeners_see_every_change(dispatcher):
+    seen = []
+    dispatcher.on_change(lambda ticket: seen.append((ticket.session_id, ticket.status)))
+    ticket = dispatcher.escalate("s1", "u1", "complex", "help")
+    dispatcher.claim("A1", ticket.ticket_id)
+    dispatcher.release("A1", ticket.ticket_id)
+    assert seen == [("s1", "assigned"), ("s1", "claimed"), ("s1", "resolved")]
+
+
+def test_register_agent_validates_capacity(dispatcher):
+    with pytest.raises(DispatchError):
+        dispatcher.register_agent("A2", capacity=-1)
+
+
+def test_workers_sharing_the_database_see_one_queue(tmp_path):
+    first, second = sqlite_dispatcher(tmp_path), sqlite_dispatcher(tmp_path)
+    first.register_agent("A1", capacity=1)
+    ticket = first.escalate("s1", "u1", "complex", "help")
+    # The agent's capacity is counted once across both
+    assert second.escalate("s2", "u2", "complex", "help").status == "queued"
+    assert second.claim("A1", ticket.ticket_id).status == "claimed"
+    first.release("A1", ticket.ticket_id)
+    assert second.status_for_session("s1") == "none"
+    assert first.status_for_session("s2") == "assigned"
+    assert second.stats()["resolved"] == 1
+
+
+def test_agent_load_counter_follows_every_transition(tmp_path):
+    dispatcher = sqlite_dispatcher(tmp_path)
+    dispatcher.register_agent("A1", capacity=2)
+    dispatcher.register_agent("A2", capacity=1)
+    tickets = [dispatcher.escalate(f"s{i}", "u1", "complex", "help") for i in range(4)]
+    dispatcher.claim(tickets[0].agent_id, tickets[0].ticket_id)
+    dispatcher.release(tickets[0].agent_id, tickets[0].ticket_id)
+    dispatcher.remove_agent("A2")
+    dispatcher.register_agent("A3", capacity=5)
+    conn = dispatcher.db.connection()
+    for agent_id, held in conn.execute("SELECT agent_id, held FROM escalation_agents"):
+        (actual,) = conn.execute(
+            "SELECT COUNT(*) FROM escalation_tickets WHERE agent_id = ? AND status IN ('assigned', 'claimed')",
+            (agent_id,)
+        ).fetchone()
+        assert held == actual
+    assert dispatcher.stats()["active_tickets"] == 3
+
+
+def test_changes_since_follows_other_workers(tmp_path):
+    first, second = sqlite_dispatcher(tmp_path), sqlite_dispatcher(tmp_path)
+    first.register_agent("A1", capacity=1)
+    _, seq = second.changes_since(-1)
+    ticket = first.escalate("s1", "u1", "complex", "help")
+    first.claim("A1", ticket.ticket_id)
+    changes, seq = second.changes_since(seq)
+    # Only each ticket's latest state is kept
+    assert [(t.session_id, t.status) for t in changes] == [("s1", "claimed")]
+    assert second.changes_since(seq) == ([], seq)
+
+
+def test_urgency_scoring():
+    assert urgency("how do I reset my password") == 0
+    assert urgency("URGENT outage, this is UNACCEPTABLE!!") == 5
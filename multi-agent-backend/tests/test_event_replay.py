@@ -0,0 +1,91 @@
+import asyncio
+import gzip
+import json
+import threading
+
+import pytest
+
+from event_replay import RecordingRunner, read_recording
+
+
+class FakeEvent:
+    def __init__(self, text):
+        self.text = text
+
+    def model_dump(self, **kwargs):
+        return {"text": self.text}
+
+
+class FakeRunner:
+    async def run_async(self, *, user_id, session_id, new_message, **kwargs):
+        for text in ("partial", "final"):
+            yield FakeEvent(text)
+
+
+class Message:
+    def __init__(self, text):
+        self.parts = [type("Part", (), {"text": text})()]
+
+
+def record(runner, count):
+    async def turns():
+        for i in range(count):
+            async for _ in runner.run_async(user_id="u", session_id=f"s{i}", new_message=Message(f"question {i}")):
+                pass
+    asyncio.run(turns())
+
+
+@pytest.mark.parametrize("name", ["events.jsonl", "events.jsonl.gz"])
+def test_recorded_turns_read_back_in_order(tmp_path, name):
+    path = str(tmp_path / name)
+    runner = RecordingRunner(FakeRunner(), path)
+    record(runner, 3)
+    runner.flush()
+    turns = list(read_recording(path))
+    assert [turn["message"] for turn in turns] == ["question 0", "question 1", "question 2"]
+    assert [event["event"]["text"] for event in turns[0]["events"]] == ["partial", "final"]
+    assert runner.stats()["recorded"] == 3
+
+
+def test_recording_writes_happen_off_the_calling_thread(tmp_path, monkeypatch):
+    import event_replay
+
+    writers = set()
+    original = event_replay._open
+
+    def tracking_open(path, mode):
+        writers.add(threading.current_thread().name)
+        return original(path, mode)
+    monkeypatch.setattr(event_replay, "_open", tracking_open)
+
+    runner = RecordingRunner(FakeRunner(), str(tmp_path / "events.jsonl"))
+    record(runner, 2)
+    runner.flush()
+    assert writers == {"runner-recorder"}
+
+
+def test_full_queue_drops_turns_instead_of_blocking(tmp_path):
+    runner = RecordingRunner(FakeRunner(), str(tmp_path / "events.jsonl"), max_pending=1)
+    runner._start_writer = lambda: None  # no writer draining the queue
+    runner._write({"message": "a", "events": []})
+    runner._write({"message": "b", "events": []})
+    assert runner.dropped == 1
+
+
+def test_truncated_gzip_stops_at_last_complete_turn(tmp_path):
+    path = tmp_path / "events.jsonl.gz"
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        for i in range(200):
+            f.write(json.dumps({"message": f"question {i}", "events": [], "padding": "x" * i}) + "\n")
+    data = path.read_bytes()
+    path.write_bytes(data[:len(data) * 2 // 3])
+
+    turns = list(read_recording(str(path)))
+    assert 0 < len(turns) < 200
+    assert [turn["message"] for turn in turns] == [f"question {i}" for i in range(len(turns))]
+
+
+def test_truncated_plain_line_is_skipped(tmp_path):
+    path = tmp_path / "events.jsonl"
+    path.write_text(json.dumps({"message": "a", "events": []}) + "\n" + '{"message": "b", "ev')
+    assert [turn["message"] for turn in read_recording(str(path))] == ["a"]
@@ -0,0 +1,44 @@
+import json
+
+import pytest
+
+from fast_path import FastPathRouter
+
+SOLUTIONS = {"app": ["Update the app", "Clear the cache"], "internet": ["Restart your router"]}
+
+
+@pytest.fixture
+def router():
+    def search(category):
+        return json.dumps({"found": True, "category": category, "solutions": SOLUTIONS.get(category, ["Try again"])})
+    return FastPathRouter(search, min_confidence=0.75)
+
+
+@pytest.mark.parametrize("message, category", [
+    ("my app keeps crashing", "app"),
+    ("I can't connect to wifi", "internet"),
+    ("internet not working", "internet"),
+    ("no internet connection", "internet"),
+])
+def test_problem_reports_are_answered(router, message, category):
+    routed = router.route(message)
+    assert routed is not None and routed["category"] == category
+
+
+@pytest.mark.parametrize("message", [
+    "the app is not crashing anymore, thanks",
+    "the app isn't freezing now",
+    "there are no errors from the api now",
+])
+def test_a_negated_symptom_is_not_a_problem_report(router, message):
+    assert router.route(message) is None
+
+
+@pytest.mark.parametrize("message", ["I want to talk to a human about my bill", "my internet is STILL down"])
+def test_escalation_wording_falls_through(router, message):
+    assert router.classify(message)["category"] is None
+
+
+def test_competing_categories_halve_confidence(router):
+    intent = router.classify("the app shows a billing error")
+    assert intent["confidence"] < 0.75
@@ -0,0 +1,50 @@
+import random
+
+import pytest
+
+from knowledge_base import KnowledgeBase, tokenize
+
+VOCABULARY = [f"w{i}" for i in range(40)]
+
+
+def corpus(seed: int, size: int = 300):
+    rng = random.Random(seed)
+    articles = []
+    for i in range(size):
+        words = rng.choices(VOCABULARY, k=rng.randint(3, 12))
+        articles.append({"id": f"kb-{i}", "category": rng.choice(["internet", "billing", "app"]),
+                         "title": " ".join(words[:2]), "body": " ".join(words[2:])})
+    # Exact copies score identically, so every query with hits on them has ties
+    articles += [dict(article, id=f"{article['id']}-copy") for article in articles[:40]]
+    rng.shuffle(articles)
+    return articles
+
+
+def brute_force(kb: KnowledgeBase, query: str, top_k: int):
+    query_tids = sorted({kb._term_ids[t] for t in tokenize(query) if t in kb._term_ids})
+    scored = [(kb._score(doc_id, query_tids), doc_id) for doc_id in range(len(kb))]
+    ranked = sorted((entry for entry in scored if entry[0] > 0), key=lambda entry: (-entry[0], entry[1]))
+    return [(kb.articles[doc_id]["id"], round(score, 4)) for score, doc_id in ranked[:top_k]]
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("top_k", [1, 3, 10])
+def test_search_matches_brute_force_scoring(seed, top_k):
+    kb = KnowledgeBase(corpus(seed))
+    rng = random.Random(seed + 100)
+    for _ in range(50):
+        query = " ".join(rng.choices(VOCABULARY, k=rng.randint(1, 4)))
+        results = [(article["id"], article["score"]) for article in kb.search(query, top_k)]
+        assert results == brute_force(kb, query, top_k), query
+
+
+def test_ties_are_ranked_in_article_order():
+    kb = KnowledgeBase([{"id": f"kb-{i}", "title": "router reset"} for i in range(6)])
+    for query in ("router", "router reset"):
+        assert [article["id"] for article in kb.search(query, 3)] == ["kb-0", "kb-1", "kb-2"]
+
+
+def test_unknown_terms_and_empty_top_k_find_nothing():
+    kb = KnowledgeBase.from_categories({"internet": ["Restart the router"]})
+    assert kb.search("zebra") == []
+    assert kb.search("router", top_k=0) == []
@@ -0,0 +1,134 @@
+import asyncio
+
+import httpx
+import pytest
+
+import model_transport
+from model_transport import DeadlineExceeded, ModelTransport, reset_deadline, set_deadline
+
+
+class FakePool:
+    """Stands in for the httpx pool: each attempt waits its delay, then answers or raises its outcome"""
+
+    def __init__(self, *attempts):
+        self.attempts = list(attempts)
+        self.sent = 0
+        self.cancelled = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        delay, outcome = self.attempts[self.sent]
+        self.sent += 1
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if isinstance(outcome, Exception):
+            raise outcome
+        return httpx.Response(200, content=outcome.encode())
+
+
+def transport_with(pool: FakePool, hedge_after=None) -> ModelTransport:
+    transport = ModelTransport(hedge=hedge_after is not None)
+    transport._pool = lambda: pool
+    if hedge_after is not None:
+        transport.hedge_delay = lambda: hedge_after
+    return transport
+
+
+def send(transport: ModelTransport, deadline=None) -> httpx.Response:
+    async def run():
+        token = set_deadline(deadline)
+        try:
+            return await transport.handle_async_request(
+                httpx.Request("POST", "https://model.test/generate", content=b"{}"))
+        finally:
+            reset_deadline(token)
+    return asyncio.run(run())
+
+
+def test_requests_go_through_the_pool_without_a_deadline():
+    transport = transport_with(FakePool((0, "ok")))
+    assert send(transport).content == b"ok"
+    assert transport.counters["requests"] == 1
+    assert transport.counters["in_flight"] == 0
+
+
+def test_a_passed_deadline_fails_before_sending():
+    pool = FakePool((0, "ok"))
+    transport = transport_with(pool)
+    with pytest.raises(DeadlineExceeded):
+        send(transport, deadline=-1)
+    assert pool.sent == 0
+    assert transport.counters["deadline_exceeded"] == 1
+
+
+def test_a_request_only_gets_the_time_left():
+    pool = FakePool((5, "late"))
+    transport = transport_with(pool)
+    with pytest.raises(DeadlineExceeded):
+        send(transport, deadline=0.05)
+    assert pool.cancelled == 1
+    assert transport.counters["in_flight"] == 0
+
+
+def test_deadline_is_per_context():
+    token = set_deadline(10)
+    try:
+        assert 9 < model_transport.remaining() <= 10
+    finally:
+        reset_deadline(token)
+    assert model_transport.remaining() is None
+
+
+def test_a_fast_primary_is_not_hedged():
+    pool = FakePool((0, "primary"))
+    transport = transport_with(pool, hedge_after=1.0)
+    assert send(transport).content == b"primary"
+    assert pool.sent == 1
+    assert transport.counters["hedged"] == 0
+
+
+def test_a_slow_primary_is_hedged_and_the_first_answer_wins():
+    pool = FakePool((5, "primary"), (0, "hedge"))
+    transport = transport_with(pool, hedge_after=0.02)
+    assert send(transport).content == b"hedge"
+    assert pool.sent == 2
+    assert pool.cancelled == 1
+    assert transport.counters["hedged"] == 1
+    assert transport.counters["hedge_won"] == 1
+
+
+def test_the_primary_can_still_win_after_the_hedge_is_sent():
+    pool = FakePool((0.05, "primary"), (5, "hedge"))
+    transport = transport_with(pool, hedge_after=0.02)
+    assert send(transport).content == b"primary"
+    assert pool.cancelled == 1
+    assert transport.counters["hedge_won"] == 0
+
+
+def test_a_failed_attempt_leaves_the_other_to_answer():
+    pool = FakePool((0.05, httpx.ConnectError("reset")), (0.1, "hedge"))
+    transport = transport_with(pool, hedge_after=0.02)
+    assert send(transport).content == b"hedge"
+
+
+def test_the_error_is_raised_when_every_attempt_fails():
+    pool = FakePool((0.05, httpx.ConnectError("primary")), (0.05, httpx.ConnectError("hedge")))
+    transport = transport_with(pool, hedge_after=0.02)
+    with pytest.raises(httpx.ConnectError):
+        send(transport)
+
+
+def test_hedge_delay_needs_samples_and_respects_the_ratio():
+    transport = ModelTransport(hedge=True, hedge_min_samples=16, hedge_max_ratio=0.1)
+    for _ in range(15):
+        transport.latency.observe(0.2)
+    transport.counters["requests"] = 15
+    assert transport.hedge_delay() is None
+    transport.latency.observe(0.2)
+    transport.counters["requests"] = 16
+    assert transport.hedge_delay() == 0.2
+    transport.counters["hedged"] = 2
+    assert transport.hedge_delay() is None
+    assert ModelTransport(hedge=False).hedge_delay() is None
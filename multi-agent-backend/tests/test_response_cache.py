@@ -0,0 +1,59 @@
+import time
+
+from response_cache import ResponseCache, fingerprint, message_key
+
+
+def test_phrasings_of_the_same_problem_share_a_key():
+    assert message_key("my internet is down", "v1") == message_key("Internet not working", "v1")
+    assert message_key("internet isn't working", "v1") == message_key("My internet is broken", "v1")
+
+
+def test_negation_changes_the_key():
+    assert message_key("I can receive email", "v1") != message_key("I can not receive email", "v1")
+    assert message_key("email sync is on", "v1") != message_key("email sync is not on", "v1")
+
+
+def test_negation_spellings_share_a_key():
+    keys = {message_key(m, "v1") for m in ("I can not receive email", "I can't receive email",
+                                           "I cannot receive email", "I cant receive email")}
+    assert len(keys) == 1
+
+
+def test_negation_applies_to_the_next_word_only():
+    assert fingerprint("not sending but receiving email") != fingerprint("sending but not receiving email")
+
+
+def test_short_messages_have_no_key():
+    assert message_key("help", "v1") is None
+    assert message_key("thanks!", "v1") is None
+
+
+def test_key_carries_the_knowledge_base_version():
+    assert message_key("my internet is down", "v1") != message_key("my internet is down", "v2")
+
+
+def test_lru_eviction_by_bytes():
+    # Each entry: 4-byte key + 400-byte answer + per-entry overhead
+    cache = ResponseCache(max_bytes=3 * (4 + 400 + 200))
+    for i in range(4):
+        cache.put(f"key{i}", "x" * 400)
+    assert cache.get("key0") is None
+    assert cache.get("key3") == "x" * 400
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    cache = ResponseCache(ttl=10)
+    cache.put("key", "answer")
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 11)
+    assert cache.get("key") is None
+    assert cache.stats()["expired"] == 1
+
+
+def test_knowledge_base_change_clears_entries():
+    cache = ResponseCache()
+    cache.check_kb_version("v1")
+    cache.put("v1:key", "answer")
+    cache.check_kb_version("v2")
+    assert cache.get("v1:key") is None
@@ -0,0 +1,143 @@
+import threading
+import time
+
+import pytest
+
+import session_store
+from session_store import SessionRecord, SessionStore
+
+
+@pytest.fixture
+def store():
+    store = SessionStore(max_sessions=1000, idle_ttl=600, shards=8)
+    now = time.time()
+    for i in range(60):
+        record = SessionRecord(f"user-{i % 3}", created_at=now - 1000 + i)
+        record.escalation_status = "queued" if i % 4 == 0 else "none"
+        store[f"s{i:02d}"] = record
+    return store
+
+
+def page_through(store, **filters):
+    session_ids, cursor = [], None
+    while True:
+        page, cursor = store.query(cursor=cursor, limit=7, **filters)
+        session_ids.extend(session_id for session_id, _ in page)
+        if cursor is None:
+            return session_ids
+
+
+def test_sessions_are_spread_over_shards(store):
+    assert store.shard_count == 8
+    assert sum(1 for shard in store._shards if shard.sessions) > 1
+
+
+@pytest.mark.parametrize("order", ["asc", "desc"])
+def test_pages_merge_every_shard_in_activity_order(store, order):
+    expected = [f"s{i:02d}" for i in range(60)]
+    assert page_through(store, order=order) == (expected if order == "asc" else expected[::-1])
+
+
+def test_filters_by_user_and_escalation_status(store):
+    assert page_through(store, order="asc", user_id="user-1") == [f"s{i:02d}" for i in range(1, 60, 3)]
+    assert page_through(store, order="asc", escalation_status="queued") == [f"s{i:02d}" for i in range(0, 60, 4)]
+
+
+def test_idle_filter_and_activity_update(store):
+    assert page_through(store, order="desc", idle_seconds=950) == [f"s{i:02d}" for i in range(50, -1, -1)]
+
+    def turn(record):
+        record.last_activity = time.time()
+    store.update("s00", turn)
+    assert store.query(order="desc", limit=1)[0][0][0] == "s00"
+    assert "s00" not in page_through(store, order="asc", idle_seconds=950)
+
+
+def test_removed_sessions_leave_the_index(store):
+    del store["s59"]
+    assert store.query(order="desc", limit=1)[0][0][0] == "s58"
+
+
+class Clock:
+    """Stands in for the time module: a monotonic clock the test moves by hand"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return time.time()
+
+
+def removals(store):
+    removed = []
+    store.on_remove(lambda session_id, record, reason: removed.append((session_id, reason)))
+    return removed
+
+
+def test_size_cap_evicts_the_least_recently_used_session():
+    store = SessionStore(max_sessions=3, shards=8)
+    assert store.shard_count == 1
+    removed = removals(store)
+    for session_id in ("a", "b", "c"):
+        store[session_id] = SessionRecord("u1")
+    store["a"]
+    store["d"] = SessionRecord("u1")
+    assert sorted(store.keys()) == ["a", "c", "d"]
+    assert removed == [("b", "lru")]
+    assert store.stats()["evicted_lru"] == 1
+
+
+def test_sweep_expires_sessions_idle_past_the_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(session_store, "time", clock)
+    store = SessionStore(max_sessions=100, idle_ttl=60)
+    removed = removals(store)
+    store["old"] = SessionRecord("u1")
+    store["busy"] = SessionRecord("u1")
+    clock.now += 45
+    store.update("busy", lambda record: None)
+    store["new"] = SessionRecord("u1")
+    clock.now += 30
+    assert store.sweep() == 1
+    assert removed == [("old", "ttl")]
+    assert sorted(store.keys()) == ["busy", "new"]
+    assert store.stats()["evicted_ttl"] == 1
+
+
+def test_ended_sessions_notify_listeners_and_wake_waiters():
+    store = SessionStore()
+    removed = removals(store)
+    store["s1"] = SessionRecord("u1")
+    assert store.wait_for("s1", lambda record: record.message_count > 0, 0.01).message_count == 0
+    del store["s1"]
+    assert removed == [("s1", "ended")]
+    assert store.wait_for("s1", lambda record: True, 0.01) is None
+    assert store.update("s1", lambda record: None) is None
+
+
+def test_small_tables_keep_fewer_shards():
+    assert SessionStore(max_sessions=100, shards=16).shard_count == 1
+    assert SessionStore(max_sessions=640, shards=16).shard_count == 10
+    assert SessionStore(max_sessions=100000, shards=16).shard_count == 16
+
+
+def test_concurrent_updates_across_shards_are_not_lost():
+    store = SessionStore(max_sessions=10000, shards=16)
+    for i in range(32):
+        store[f"s{i}"] = SessionRecord("u1")
+
+    def add_turns(session_id):
+        for _ in range(200):
+            store.update(session_id, lambda record: setattr(record, "message_count", record.message_count + 1))
+
+    threads = [threading.Thread(target=add_turns, args=(f"s{i % 32}",)) for i in range(64)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(store[f"s{i}"].message_count == 400 for i in range(32))
+    page, _ = store.query(limit=100)
+    assert len(page) == 32
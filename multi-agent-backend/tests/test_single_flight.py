@@ -0,0 +1,81 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def leader_blocked(flight: SingleFlight, key: str, fn):
+    """Start a leader for key whose fn waits until the returned event is set"""
+    release = threading.Event()
+    started = threading.Event()
+
+    def run():
+        started.set()
+        release.wait(5)
+        return fn()
+
+    pool = ThreadPoolExecutor(max_workers=1)
+    future = pool.submit(flight.do, key, run)
+    pool.shutdown(wait=False)
+    assert started.wait(5)
+    return release, future
+
+
+def wait_for_waiters(flight: SingleFlight, count: int):
+    for _ in range(500):
+        if flight.stats()["coalesced"] >= count:
+            return
+        time.sleep(0.01)
+    raise AssertionError("waiters never joined the call")
+
+
+def test_concurrent_callers_share_the_leaders_result():
+    flight = SingleFlight()
+    calls = []
+    release, leader = leader_blocked(flight, "k", lambda: calls.append(1) or "answer")
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        followers = [pool.submit(flight.do, "k", lambda: calls.append(2) or "other") for _ in range(4)]
+        wait_for_waiters(flight, 4)
+        release.set()
+        assert leader.result(5) == ("answer", False)
+        assert [f.result(5) for f in followers] == [("answer", True)] * 4
+    assert calls == [1]
+    assert flight.stats() == {"leaders": 1, "coalesced": 4, "in_flight": 0}
+
+
+def test_different_keys_run_separately():
+    flight = SingleFlight()
+    assert flight.do("a", lambda: 1) == (1, False)
+    assert flight.do("b", lambda: 2) == (2, False)
+    # Finished calls are forgotten, so the same key runs again
+    assert flight.do("a", lambda: 3) == (3, False)
+
+
+def test_the_leaders_error_reaches_every_waiter():
+    flight = SingleFlight()
+
+    def fail():
+        raise ValueError("model down")
+
+    release, leader = leader_blocked(flight, "k", fail)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        follower = pool.submit(flight.do, "k", lambda: "unused")
+        wait_for_waiters(flight, 1)
+        release.set()
+        with pytest.raises(ValueError):
+            leader.result(5)
+        with pytest.raises(ValueError):
+            follower.result(5)
+    assert flight.do("k", lambda: "ok") == ("ok", False)
+
+
+def test_a_waiter_gives_up_after_its_timeout():
+    flight = SingleFlight()
+    release, leader = leader_blocked(flight, "k", lambda: "late")
+    with pytest.raises(TimeoutError):
+        flight.do("k", lambda: "unused", timeout=0.05)
+    release.set()
+    assert leader.result(5) == ("late", False)
@@ -0,0 +1,239 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("google.adk")
+
+from session_store import SessionRecord  # noqa: E402
+from sqlite_sessions import SQLiteDatabase, SQLiteSessionService, SQLiteSessionStore  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path):
+    return SQLiteDatabase(str(tmp_path / "sessions.db"))
+
+
+@pytest.fixture
+def store(db):
+    return SQLiteSessionStore(db, max_sessions=3, idle_ttl=600)
+
+
+def last_seen(db, session_id):
+    return db.connection().execute(
+        "SELECT last_seen FROM chat_sessions WHERE session_id = ?", (session_id,)
+    ).fetchone()[0]
+
+
+def test_set_get_contains_delete(store):
+    store["s1"] = SessionRecord("u1")
+    assert "s1" in store
+    assert store["s1"].user_id == "u1"
+    assert store.get("missing") is None
+    del store["s1"]
+    assert "s1" not in store
+    with pytest.raises(KeyError):
+        del store["s1"]
+
+
+def test_update_persists_and_returns_none_when_gone(store):
+    store["s1"] = SessionRecord("u1")
+    store.update("s1", lambda record: record.add_message("user", "hi"))
+    assert [m.content for m in store["s1"].history] == ["hi"]
+    assert store.update("missing", lambda record: None) is None
+
+
+def add_turn(record):
+    record.message_count += 1
+    record.add_message("user", f"question {record.message_count}")
+    record.add_message("agent", f"answer {record.message_count}")
+
+
+def test_update_writes_only_the_new_messages(db, store):
+    store["s1"] = SessionRecord("u1")
+    for _ in range(3):
+        record = store.update("s1", add_turn)
+    assert record.history_length == 6
+    data = db.connection().execute("SELECT data FROM chat_sessions WHERE session_id = 's1'").fetchone()[0]
+    assert "question" not in data
+    rows = db.connection().execute(
+        "SELECT seq, content FROM chat_messages WHERE session_id = 's1' ORDER BY seq"
+    ).fetchall()
+    assert rows == [(1, "question 1"), (2, "answer 1"), (3, "question 2"), (4, "answer 2"),
+                    (5, "question 3"), (6, "answer 3")]
+    assert [m.content for m in record.history][-2:] == ["question 3", "answer 3"]
+
+
+def test_history_pages_come_from_the_message_table(store):
+    store["s1"] = SessionRecord("u1")
+    for _ in range(3):
+        store.update("s1", add_turn)
+    record = store["s1"]
+    assert record.history_length == 6
+    page = record.messages_after(2, 2)
+    assert [(m["seq"], m["content"]) for m in page] == [(3, "question 2"), (4, "answer 2")]
+    assert [m["seq"] for m in record.messages_after(4)] == [5, 6]
+    # A record read before later turns keeps the history it was read with
+    store.update("s1", add_turn)
+    assert record.history_length == 6
+    assert len(record.history) == 6
+    assert store["s1"].history_length == 8
+
+
+def test_replacing_a_session_replaces_its_messages(db, store):
+    first = SessionRecord("u1")
+    first.add_message("user", "old")
+    store["s1"] = first
+    store["s1"] = SessionRecord("u1")
+    assert store["s1"].history == []
+    del store["s1"]
+    assert db.connection().execute("SELECT COUNT(*) FROM chat_messages").fetchone()[0] == 0
+
+
+def test_history_bytes_is_the_utf8_total_of_every_stored_message(tmp_path, store):
+    store["s1"] = SessionRecord("u1")
+    store.update("s1", lambda record: record.add_message("user", "café ☕"))
+    # Another process writing to the same database counts too
+    other = SQLiteSessionStore(SQLiteDatabase(str(tmp_path / "sessions.db")))
+    other["s2"] = SessionRecord("u2")
+    other.update("s2", lambda record: record.add_message("user", "hi"))
+    assert store.history_bytes() == len("café ☕".encode("utf-8")) + 2
+    del store["s1"]
+    assert store.history_bytes() == 2
+
+
+def test_history_in_session_json_is_moved_to_the_message_table(tmp_path):
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE chat_sessions (session_id TEXT PRIMARY KEY, user_id TEXT NOT NULL, data TEXT NOT NULL, "
+        "last_seen REAL NOT NULL)"
+    )
+    state = {"u": "u1", "c": 1.0, "a": 2.0, "n": 1, "e": "none", "r": False,
+             "h": [["user", "hi", 2.0], ["agent", "hello", 2.0]]}
+    conn.execute("INSERT INTO chat_sessions VALUES ('s1', 'u1', ?, ?)", (json.dumps(state), time.time()))
+    conn.commit()
+    conn.close()
+
+    record = SQLiteSessionStore(SQLiteDatabase(path))["s1"]
+    assert record.message_count == 1
+    assert [(m.role, m.content) for m in record.history] == [("user", "hi"), ("agent", "hello")]
+
+
+def test_reads_do_not_write_within_touch_interval(db, store):
+    store["s1"] = SessionRecord("u1")
+    seen = last_seen(db, "s1")
+    store["s1"]
+    store.get("s1")
+    assert last_seen(db, "s1") == seen
+
+
+def test_stale_read_refreshes_last_seen(db, store):
+    store["s1"] = SessionRecord("u1")
+    db.connection().execute("UPDATE chat_sessions SET last_seen = last_seen - 3600")
+    stale = last_seen(db, "s1")
+    store["s1"]
+    assert last_seen(db, "s1") > stale
+
+
+def test_size_cap_evicts_least_recently_seen(db, store):
+    removed = []
+    store.on_remove(lambda session_id, record, reason: removed.append((session_id, reason)))
+    for i in range(3):
+        store[f"s{i}"] = SessionRecord(f"u{i}")
+    # s0 is written again, so s1 is now the least recently seen
+    store.update("s0", lambda record: None)
+    store["s3"] = SessionRecord("u3")
+    assert len(store) == 3
+    assert removed == [("s1", "lru")]
+    assert set(store.keys()) == {"s0", "s2", "s3"}
+
+
+def test_row_count_follows_upserts_and_deletes(store):
+    store["s1"] = SessionRecord("u1")
+    store["s1"] = SessionRecord("u1")
+    store["s2"] = SessionRecord("u2")
+    assert len(store) == 2
+    del store["s2"]
+    assert len(store) == 1
+
+
+def test_sweep_expires_idle_sessions(db, store):
+    removed = []
+    store.on_remove(lambda session_id, record, reason: removed.append((session_id, reason)))
+    store["old"] = SessionRecord("u1")
+    store["new"] = SessionRecord("u2")
+    db.connection().execute("UPDATE chat_sessions SET last_seen = last_seen - 3600 WHERE session_id = 'old'")
+    assert store.sweep() == 1
+    assert removed == [("old", "ttl")]
+    assert len(store) == 1
+
+
+def test_session_service_runs_database_work_off_the_loop(db):
+    service = SQLiteSessionService(db)
+    threads = set()
+    original = db.transaction
+
+    def transaction():
+        threads.add(threading.current_thread().name)
+        return original()
+    db.transaction = transaction
+
+    async def scenario():
+        loop_thread = threading.current_thread().name
+        await service.create_session(app_name="app", user_id="u1", session_id="s1")
+        session = await service.get_session(app_name="app", user_id="u1", session_id="s1")
+        await service.delete_session(app_name="app", user_id="u1", session_id="s1")
+        return loop_thread, session, await service.get_session(app_name="app", user_id="u1", session_id="s1")
+
+    loop_thread, session, deleted = asyncio.run(scenario())
+    assert session is not None and session.id == "s1"
+    assert deleted is None
+    assert threads and loop_thread not in threads
+
+
+def test_wait_for_wakes_on_a_write_from_this_process(store):
+    store["s1"] = SessionRecord("u1")
+    store.poll_interval = 30  # only the in-process notification can wake it in time
+
+    def write():
+        time.sleep(0.1)
+        store.update("s1", lambda record: record.add_message("user", "hi"))
+    threading.Thread(target=write).start()
+    start = time.monotonic()
+    record = store.wait_for("s1", lambda record: len(record.history) > 0, timeout=5)
+    assert len(record.history) == 1
+    assert time.monotonic() - start < 2
+
+
+def test_wait_for_sees_writes_from_another_process(db, tmp_path):
+    waiter = SQLiteSessionStore(db, idle_ttl=600)
+    # A second store on the same file stands in for another worker process
+    writer = SQLiteSessionStore(SQLiteDatabase(db.path), idle_ttl=600)
+    writer["s1"] = SessionRecord("u1")
+    waiter.poll_interval = 0.05
+
+    def write():
+        time.sleep(0.1)
+        writer.update("s1", lambda record: record.add_message("user", "hi"))
+    threading.Thread(target=write).start()
+    record = waiter.wait_for("s1", lambda record: len(record.history) > 0, timeout=5)
+    assert len(record.history) == 1
+
+
+def test_wait_for_only_reads(db, store):
+    store["s1"] = SessionRecord("u1")
+    before = db.connection().total_changes
+    store.poll_interval = 0.02
+    record = store.wait_for("s1", lambda record: False, timeout=0.2)
+    assert record.user_id == "u1"
+    assert db.connection().total_changes == before
+
+
+def test_wait_for_returns_none_when_session_ends(store):
+    store["s1"] = SessionRecord("u1")
+    threading.Timer(0.1, lambda: store.__delitem__("s1")).start()
+    assert store.wait_for("s1", lambda record: False, timeout=5) is None
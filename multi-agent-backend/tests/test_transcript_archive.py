@@ -0,0 +1,92 @@
+import json
+import os
+import time
+
+import pytest
+
+from transcript_archive import INDEX_SUFFIX, SEGMENT_SUFFIX, TranscriptArchive, TranscriptReader
+
+
+@pytest.fixture
+def archive(tmp_path):
+    archive = TranscriptArchive(str(tmp_path), segment_bytes=200, fsync=False)
+    yield archive
+    archive.close()
+
+
+def segment_names(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith(SEGMENT_SUFFIX))
+
+
+def write_segment(directory, name, records, tail=b""):
+    with open(os.path.join(directory, name), "wb") as f:
+        for record in records:
+            f.write(json.dumps(record).encode() + b"\n")
+        f.write(tail)
+
+
+def turn(session_id, ts, message="hello"):
+    return {"ts": ts, "type": "turn", "session_id": session_id, "user_id": "u1", "message": message,
+            "reply": "hi", "served_by": "llm"}
+
+
+def test_start_seals_a_crashed_segment_and_cuts_its_torn_record(tmp_path, archive):
+    now = time.time()
+    write_segment(str(tmp_path), f"{int(now * 1000):013d}-99999{SEGMENT_SUFFIX}",
+                  [turn("s1", now), turn("s2", now + 1)], tail=b'{"ts": 1, "type": "tu')
+    archive.start()
+    [segment] = TranscriptReader(str(tmp_path)).segments()
+    assert segment["index"]["records"] == 2
+    assert [r["session_id"] for r in TranscriptReader(str(tmp_path)).scan()] == ["s1", "s2"]
+
+
+def test_rotations_in_the_same_millisecond_get_separate_segments(tmp_path, archive):
+    archive.start()
+    ts = time.time()
+    for i in range(10):
+        archive.append_turn(f"s{i % 2}", "u1", f"message {i}", "reply", "llm", ts=ts)
+    archive.close()
+    names = segment_names(str(tmp_path))
+    assert len(names) > 1 and len({name.split("-")[0] for name in names}) == 1
+    segments = TranscriptReader(str(tmp_path)).segments()
+    assert all(segment["index"] is not None for segment in segments)
+    assert sum(segment["index"]["records"] for segment in segments) == 10
+    assert len(TranscriptReader(str(tmp_path)).transcript("s1")) == 5
+
+
+def test_a_sealed_segment_is_never_reopened(tmp_path, archive):
+    ts = time.time()
+    # What a previous process with this pid would have left for the same millisecond
+    taken = f"{int(ts * 1000):013d}-{os.getpid()}-000000{SEGMENT_SUFFIX}"
+    write_segment(str(tmp_path), taken, [turn("old", ts)])
+    with open(os.path.join(str(tmp_path), taken[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX), "w") as f:
+        json.dump({"first_ts": ts, "last_ts": ts, "records": 1, "sessions": {"old": [0]}}, f)
+    before = os.path.getsize(os.path.join(str(tmp_path), taken))
+    archive.start()
+    archive.append_turn("new", "u1", "hello", "hi", "llm", ts=ts)
+    archive.close()
+    assert os.path.getsize(os.path.join(str(tmp_path), taken)) == before
+    reader = TranscriptReader(str(tmp_path))
+    assert [r["session_id"] for r in reader.scan()] == ["old", "new"]
+
+
+def test_sealed_segments_past_retention_are_deleted(tmp_path):
+    old = time.time() - 10 * 86400
+    name = f"{int(old * 1000):013d}-99999-000000"
+    write_segment(str(tmp_path), name + SEGMENT_SUFFIX, [turn("s1", old)])
+    with open(os.path.join(str(tmp_path), name + INDEX_SUFFIX), "w") as f:
+        json.dump({"first_ts": old, "last_ts": old, "records": 1, "sessions": {"s1": [0]}}, f)
+    keep = TranscriptArchive(str(tmp_path), fsync=False, retention_days=30)
+    keep.start()
+    keep.close()
+    assert segment_names(str(tmp_path)) == [name + SEGMENT_SUFFIX]
+    expire = TranscriptArchive(str(tmp_path), fsync=False, retention_days=7)
+    expire.start()
+    expire.close()
+    assert os.listdir(str(tmp_path)) == []
+    assert expire.stats()["segments_expired"] == 1
+
+
+def test_archive_is_off_without_a_directory(monkeypatch):
+    monkeypatch.delenv("TRANSCRIPT_ARCHIVE_DIR", raising=False)
+    assert TranscriptArchive.from_env() is None
@@ -0,0 +1,84 @@
+import asyncio
+import json
+import os
+import socket
+import threading
+
+import pytest
+
+pytest.importorskip("google.adk")
+pytest.importorskip("websockets")
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+from websockets.asyncio.client import connect  # noqa: E402
+from websockets.exceptions import ConnectionClosed  # noqa: E402
+
+import app  # noqa: E402
+import model_transport  # noqa: E402
+import ws_server  # noqa: E402
+from session_store import SessionRecord, SessionStore  # noqa: E402
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(app, "active_sessions", SessionStore())
+    app.active_sessions["s1"] = SessionRecord("u1")
+    server = ws_server.ChatSocketServer(host="127.0.0.1", port=free_port(), turn_workers=2)
+    serving = []
+
+    async def serve():
+        serving.append(asyncio.current_task())
+        try:
+            await server.serve_forever()
+        except asyncio.CancelledError:
+            pass
+
+    thread = threading.Thread(target=asyncio.run, args=(serve(),), daemon=True)
+    thread.start()
+    assert server.ready.wait(10)
+    yield server
+    server.loop.call_soon_threadsafe(serving[0].cancel)
+    thread.join(10)
+    app.dispatcher._listeners.remove(server.ticket_changed)
+
+
+def exchange(server, frames, replies=1):
+    async def run():
+        async with connect(f"ws://127.0.0.1:{server.port}") as websocket:
+            for frame in frames:
+                await websocket.send(json.dumps(frame))
+            return [json.loads(await asyncio.wait_for(websocket.recv(), 5)) for _ in range(replies)]
+    return asyncio.run(run())
+
+
+def test_turns_run_under_the_request_deadline(server, monkeypatch):
+    budgets = []
+
+    def answer_message(session_id, user_id, message, on_event=None):
+        budgets.append(model_transport.remaining())
+        return "hi", {"metadata": {}, "message_count": 1}
+
+    monkeypatch.setattr(app, "answer_message", answer_message)
+    monkeypatch.setattr(app, "REQUEST_TIMEOUT", 7.0)
+    frames = exchange(server, [{"type": "auth", "session_id": "s1", "user_id": "u1"},
+                               {"type": "message", "message": "hello", "id": 1}], replies=3)
+    assert [frame["type"] for frame in frames] == ["ready", "typing", "reply"]
+    assert 0 < budgets[0] <= 7.0
+
+
+@pytest.mark.parametrize("session_id, user_id, reason", [
+    ("unknown", "u1", "Unknown session"),
+    ("s1", "u2", "Invalid user_id"),
+])
+def test_auth_rejects_unknown_sessions_and_other_users(server, session_id, user_id, reason):
+    with pytest.raises(ConnectionClosed) as closed:
+        exchange(server, [{"type": "auth", "session_id": session_id, "user_id": user_id}])
+    assert closed.value.rcvd.code == ws_server.CLOSE_POLICY
+    assert closed.value.rcvd.reason.startswith(reason)
+    assert "unknown" not in app.active_sessions
@@ -0,0 +1,470 @@
+"""
+Write-behind archive of chat transcripts.
+
+Session history lives in memory (or SQLite) only while the session does;
+/api/chat/end, eviction and restarts drop it. TranscriptArchive keeps a
+durable copy without putting disk I/O on the request path:
+
+- append_turn()/append_end() stamp a record and push it onto a deque
+  (append and popleft are atomic in CPython, so producers take no lock) and
+  return. If the writer has fallen more than max_queue records behind, the
+  record is dropped and counted rather than blocking the request;
+- one writer thread per process drains whatever has queued up, writes it
+  as one batch of JSON lines and fsyncs once for the whole batch (group
+  commit): the more requests arrive during an fsync, the bigger the next
+  batch, so throughput grows with load while each request waits for nothing;
+- the log is split into segments of about segment_bytes. A full segment is
+  sealed: an index file next to it records its time span and the byte
+  offsets of each session's records, so readers can skip whole segments
+  and seek straight to a session's lines.
+
+Segments are named <first record ms>-<pid>-<seq>.jsonl, so several
+gunicorn workers can share a directory, each writing its own. A segment is
+always a new file (created exclusively), so a sealed segment is never
+appended to, even by a restarted process that got the same pid. A writer
+holds an flock on its open segment; on start, any unsealed segment nobody
+holds is left over from a crash, and is repaired (a torn last line is cut
+off) and sealed.
+
+The archive is off unless TRANSCRIPT_ARCHIVE_DIR names its directory.
+Transcripts hold customer conversations, so they are kept for
+TRANSCRIPT_RETENTION_DAYS (30 by default; 0 keeps them until removed by
+hand): each writer deletes sealed segments whose newest record is older
+than that when it starts and whenever it rotates.
+
+TranscriptReader scans the archive by session and/or time range; run this
+module to do that from the command line:
+
+    python transcript_archive.py --session <session_id>
+    python transcript_archive.py --since 2026-01-01T00:00 --until 2026-01-02T00:00
+"""
+
+import argparse
+import atexit
+import collections
+import heapq
+import itertools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+import metrics
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SUFFIX = ".jsonl"
+INDEX_SUFFIX = ".index.json"
+
+
+def _index_path(segment_path: str) -> str:
+    return segment_path[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX
+
+
+class _SegmentIndex:
+    """Time span and per-session byte offsets of one segment"""
+
+    def __init__(self):
+        self.first_ts: Optional[float] = None
+        self.last_ts: Optional[float] = None
+        self.records = 0
+        self.sessions: Dict[str, List[int]] = collections.defaultdict(list)
+
+    def add(self, record: Dict[str, Any], offset: int):
+        ts = record["ts"]
+        self.first_ts = ts if self.first_ts is None else min(self.first_ts, ts)
+        self.last_ts = ts if self.last_ts is None else max(self.last_ts, ts)
+        self.records += 1
+        self.sessions[record["session_id"]].append(offset)
+
+    def save(self, segment_path: str):
+        path = _index_path(segment_path)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"first_ts": self.first_ts, "last_ts": self.last_ts, "records": self.records,
+                       "sessions": self.sessions}, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def scan(cls, segment_path: str) -> "_SegmentIndex":
+        index = cls()
+        offset = 0
+        with open(segment_path, "rb") as f:
+            for line in f:
+                if line.endswith(b"\n"):
+                    index.add(json.loads(line), offset)
+                offset += len(line)
+        return index
+
+
+class TranscriptArchive:
+    """Asynchronous, group-committed, segmented JSONL transcript log"""
+
+    def __init__(self, directory: str, segment_bytes: int = 64 * 1024 * 1024, max_queue: int = 100000,
+                 max_batch: int = 4096, fsync: bool = True, retention_days: float = 30.0):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.retention_days = retention_days
+        self.max_queue = max_queue
+        self.max_batch = max_batch
+        self.fsync = fsync
+        self._queue: Deque[Dict[str, Any]] = collections.deque()
+        self._wakeup = threading.Event()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._start_lock = threading.Lock()
+        self._file = None
+        self._path: Optional[str] = None
+        self._size = 0
+        self._index: Optional[_SegmentIndex] = None
+        self._segment_seq = itertools.count()
+        self.counters = {"queued": 0, "written": 0, "dropped": 0, "batches": 0, "fsyncs": 0,
+                         "segments_sealed": 0, "segments_expired": 0, "write_errors": 0}
+
+    @classmethod
+    def from_env(cls) -> Optional["TranscriptArchive"]:
+        """Archive in TRANSCRIPT_ARCHIVE_DIR, or None (off) when that is not set"""
+        directory = os.getenv("TRANSCRIPT_ARCHIVE_DIR")
+        if not directory:
+            return None
+        return cls(
+            directory=directory,
+            segment_bytes=int(os.getenv("TRANSCRIPT_SEGMENT_MB", "64")) * 1024 * 1024,
+            max_queue=int(os.getenv("TRANSCRIPT_MAX_QUEUE", "100000")),
+            max_batch=int(os.getenv("TRANSCRIPT_MAX_BATCH", "4096")),
+            fsync=os.getenv("TRANSCRIPT_FSYNC", "1") == "1",
+            retention_days=float(os.getenv("TRANSCRIPT_RETENTION_DAYS", "30"))
+        )
+
+    # Producers: request threads
+
+    def append_turn(self, session_id: str, user_id: str, message: str, reply: str, served_by: str,
+                    ts: Optional[float] = None):
+        self._append({"ts": ts if ts is not None else time.time(), "type": "turn", "session_id": session_id,
+                      "user_id": user_id, "message": message, "reply": reply, "served_by": served_by})
+
+    def append_end(self, session_id: str, user_id: str, reason: str, message_count: int):
+        self._append({"ts": time.time(), "type": "end", "session_id": session_id, "user_id": user_id,
+                      "reason": reason, "message_count": message_count})
+
+    def _append(self, record: Dict[str, Any]):
+        if len(self._queue) >= self.max_queue:
+            self.counters["dropped"] += 1
+            metrics.TRANSCRIPT_RECORDS.inc("dropped")
+            return
+        self._queue.append(record)
+        self.counters["queued"] += 1
+        if not self._wakeup.is_set():
+            self._wakeup.set()
+
+    # Writer thread
+
+    def start(self):
+        """Start this process's writer thread (again after a fork)"""
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                # Forked: the parent's open segment, lock and queue are not ours
+                self._file = None
+                self._queue.clear()
+            os.makedirs(self.directory, exist_ok=True)
+            self._recover()
+            self._expire()
+            self._stopping = False
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="transcript-writer", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def _recover(self):
+        """Seal segments left unsealed by a process that is gone"""
+        for name in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, name)
+            if not name.endswith(SEGMENT_SUFFIX) or os.path.exists(_index_path(path)):
+                continue
+            with open(path, "rb+") as f:
+                if fcntl is not None:
+                    try:
+                        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError:
+                        continue  # another worker is still writing it
+                if os.path.exists(_index_path(path)):
+                    continue  # sealed by another worker starting at the same time
+                size = end = f.seek(0, os.SEEK_END)
+                while end > 0:
+                    start = max(0, end - 65536)
+                    f.seek(start)
+                    newline = f.read(end - start).rfind(b"\n")
+                    if newline >= 0:
+                        end = start + newline + 1
+                        break
+                    end = start
+                if end < size:
+                    logger.warning(f"Transcript segment {name}: cutting {size - end} bytes of torn record")
+                    f.truncate(end)
+                    os.fsync(f.fileno())
+                _SegmentIndex.scan(path).save(path)
+            logger.info(f"Sealed transcript segment {name} left by an earlier process")
+
+    def _expire(self):
+        """Delete sealed segments whose newest record is past the retention period"""
+        if self.retention_days <= 0:
+            return
+        cutoff = time.time() - self.retention_days * 86400
+        for name in os.listdir(self.directory):
+            if not name.endswith(INDEX_SUFFIX):
+                continue
+            index_path = os.path.join(self.directory, name)
+            try:
+                with open(index_path, encoding="utf-8") as f:
+                    last_ts = json.load(f)["last_ts"]
+                if last_ts is not None and last_ts >= cutoff:
+                    continue
+                # Segment first: an index without its segment is ignored, a segment without one would be resealed
+                os.remove(index_path[:-len(INDEX_SUFFIX)] + SEGMENT_SUFFIX)
+                os.remove(index_path)
+            except FileNotFoundError:
+                continue  # expired by another worker
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Could not expire transcript segment {name}: {e}")
+                continue
+            self.counters["segments_expired"] += 1
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(1.0)
+            self._wakeup.clear()
+            if self._queue:
+                # Cleared before taking records, so flush() never sees idle while a batch is unwritten
+                self._idle.clear()
+            while self._queue:
+                batch = []
+                while self._queue and len(batch) < self.max_batch:
+                    batch.append(self._queue.popleft())
+                self._commit(batch)
+            self._idle.set()
+            if self._stopping and not self._queue:
+                self._close_segment(seal=True)
+                return
+
+    def _commit(self, batch: List[Dict[str, Any]]):
+        start = time.perf_counter()
+        try:
+            lines = []
+            for record in batch:
+                if self._file is None or self._size >= self.segment_bytes:
+                    self._write(lines)
+                    lines = []
+                    self._rotate(record["ts"])
+                line = (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+                self._index.add(record, self._size)
+                self._size += len(line)
+                lines.append(line)
+            self._write(lines)
+        except OSError as e:
+            self.counters["write_errors"] += 1
+            metrics.ERRORS.inc("transcript_archive")
+            logger.error(f"Transcript archive write failed, {len(batch)} records lost: {e}")
+            self._close_segment(seal=False)
+            return
+        self.counters["written"] += len(batch)
+        self.counters["batches"] += 1
+        metrics.TRANSCRIPT_RECORDS.inc("written", amount=len(batch))
+        metrics.TRANSCRIPT_BATCH_SIZE.observe(len(batch))
+        metrics.TRANSCRIPT_COMMIT_SECONDS.observe(time.perf_counter() - start)
+
+    def _write(self, lines: List[bytes]):
+        if not lines:
+            return
+        self._file.write(b"".join(lines))
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+            self.counters["fsyncs"] += 1
+
+    def _rotate(self, first_ts: float):
+        sealed = self._file is not None
+        self._close_segment(seal=True)
+        if sealed:
+            self._expire()
+        while True:
+            name = f"{int(first_ts * 1000):013d}-{os.getpid()}-{next(self._segment_seq):06d}{SEGMENT_SUFFIX}"
+            self._path = os.path.join(self.directory, name)
+            try:
+                # Exclusive create: an existing segment, sealed or not, is never reopened
+                self._file = open(self._path, "xb")
+                break
+            except FileExistsError:
+                continue
+        if fcntl is not None:
+            fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._size = 0
+        self._index = _SegmentIndex()
+
+    def _close_segment(self, seal: bool):
+        if self._file is None:
+            return
+        try:
+            if seal:
+                self._index.save(self._path)
+                self.counters["segments_sealed"] += 1
+            self._file.close()
+        except OSError as e:
+            logger.error(f"Closing transcript segment {self._path} failed: {e}")
+        self._file = None
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until everything appended so far is on disk (tests, shutdown); never call on a request"""
+        if self._thread is None or not self._thread.is_alive():
+            return not self._queue
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue or not self._idle.is_set():
+            self._wakeup.set()
+            wait = 0.05 if deadline is None else min(0.05, deadline - time.monotonic())
+            if wait <= 0:
+                return False
+            self._idle.wait(wait)
+        return True
+
+    def close(self, timeout: float = 10.0):
+        """Write out the queue, then seal and close the open segment"""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._stopping = True
+        self._wakeup.set()
+        self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "directory": self.directory,
+            "queue_depth": len(self._queue),
+            "segment": os.path.basename(self._path) if self._file is not None else None,
+            "segment_bytes": self._size if self._file is not None else 0,
+            "fsync": self.fsync,
+            "retention_days": self.retention_days,
+            **self.counters
+        }
+
+
+class TranscriptReader:
+    """Scans an archive directory by session and/or time range"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def segments(self) -> List[Dict[str, Any]]:
+        """Segments oldest first, with their index when sealed"""
+        segments = []
+        for name in sorted(os.listdir(self.directory)) if os.path.isdir(self.directory) else []:
+            if not name.endswith(SEGMENT_SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            index = None
+            if os.path.exists(_index_path(path)):
+                with open(_index_path(path), encoding="utf-8") as f:
+                    index = json.load(f)
+            # <ms>-<pid>-<seq>, or <ms>-<pid> from older writers
+            start_ms, writer = name[:-len(SEGMENT_SUFFIX)].split("-")[:2]
+            segments.append({"path": path, "start": int(start_ms) / 1000, "writer": writer, "index": index})
+        return segments
+
+    def scan(self, session_id: Optional[str] = None, since: Optional[float] = None,
+             until: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """Records matching all given filters, in timestamp order across writers"""
+        by_writer: Dict[str, List[Dict[str, Any]]] = collections.defaultdict(list)
+        for segment in self.segments():
+            index = segment["index"]
+            if index is not None:
+                if session_id is not None and session_id not in index["sessions"]:
+                    continue
+                if index["records"] == 0:
+                    continue
+                if since is not None and index["last_ts"] < since:
+                    continue
+                if until is not None and index["first_ts"] > until:
+                    continue
+            elif until is not None and segment["start"] > until:
+                continue
+            by_writer[segment["writer"]].append(segment)
+
+        streams = [self._scan_writer(segments, session_id, since, until) for segments in by_writer.values()]
+        return heapq.merge(*streams, key=lambda record: record["ts"])
+
+    def _scan_writer(self, segments: List[Dict[str, Any]], session_id: Optional[str], since: Optional[float],
+                     until: Optional[float]) -> Iterator[Dict[str, Any]]:
+        for segment in segments:
+            for record in self._scan_segment(segment, session_id):
+                if since is not None and record["ts"] < since:
+                    continue
+                if until is not None and record["ts"] > until:
+                    continue
+                yield record
+
+    def _scan_segment(self, segment: Dict[str, Any], session_id: Optional[str]) -> Iterator[Dict[str, Any]]:
+        with open(segment["path"], "rb") as f:
+            if session_id is not None and segment["index"] is not None:
+                for offset in segment["index"]["sessions"][session_id]:
+                    f.seek(offset)
+                    yield json.loads(f.readline())
+                return
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # a record still being written
+                if session_id is not None and session_id.encode() not in line:
+                    continue
+                record = json.loads(line)
+                if session_id is None or record["session_id"] == session_id:
+                    yield record
+
+    def transcript(self, session_id: str) -> List[Dict[str, Any]]:
+        return list(self.scan(session_id=session_id))
+
+
+def _parse_time(value: Optional[str]) -> Optional[float]:
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dir", default=os.getenv("TRANSCRIPT_ARCHIVE_DIR", "transcripts"))
+    parser.add_argument("--session", help="only this session_id")
+    parser.add_argument("--since", help="ISO time or unix seconds")
+    parser.add_argument("--until", help="ISO time or unix seconds")
+    parser.add_argument("--segments", action="store_true", help="list segments instead of records")
+    args = parser.parse_args()
+
+    reader = TranscriptReader(args.dir)
+    if args.segments:
+        for segment in reader.segments():
+            index = segment["index"]
+            summary = (f"{index['records']} records, {len(index['sessions'])} sessions" if index
+                       else "open or unsealed")
+            print(f"{os.path.basename(segment['path'])}  {os.path.getsize(segment['path']):>12,} bytes  {summary}")
+        return
+    for record in reader.scan(args.session, _parse_time(args.since), _parse_time(args.until)):
+        sys.stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    main()
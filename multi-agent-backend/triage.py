@@ -0,0 +1,292 @@
+"""
+Offline triage of historical support tickets.
+
+Streams a JSONL file of tickets through the same routing the API uses and
+writes one JSONL result per ticket:
+
+    normalize -> category routing + KB lookup -> optional LLM -> write
+
+- normalize and routing are CPU-bound and run in a process pool, one chunk
+  of lines per task so the pickling cost is paid per chunk, not per ticket;
+- the LLM stage runs the support agent on an asyncio loop with a
+  concurrency cap (only imported when --llm is used, so a key is not needed
+  for local triage). Its escalate_to_human calls go to a dispatcher local
+  to the run with no agents, so they are reported as "escalated" but never
+  open a ticket in the real queue;
+- results are written in input order as each chunk completes, and a
+  checkpoint (input offset + output size) is saved after every chunk. A
+  rerun with --resume truncates the output to the last checkpoint and
+  continues from there.
+
+At most --max-inflight chunks are read ahead, so memory stays constant
+however large the input is.
+
+Usage:
+    python triage.py tickets.jsonl -o triage.jsonl
+    python triage.py tickets.jsonl -o triage.jsonl --llm fallback --llm-concurrency 16 --resume
+
+Input lines are objects with an "id" (or "ticket_id") and the customer's text
+in "message", "body", "text" or "description" (a "subject" is prepended).
+"""
+
+import argparse
+import asyncio
+import html
+import json
+import logging
+import multiprocessing
+import os
+import re
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TEXT_FIELDS = ("message", "body", "text", "description")
+MAX_TEXT_CHARS = 4000
+
+_TAG = re.compile(r"<[^>]+>")
+_QUOTED_REPLY = re.compile(r"\n(>|On .{0,200} wrote:).*", re.DOTALL)
+
+# Per worker process, built by _init_worker
+_tools = None
+_router = None
+
+
+def normalize(ticket: Dict[str, Any], line_number: int) -> Dict[str, Any]:
+    """Ticket id and plain customer text: HTML and quoted replies stripped, whitespace collapsed"""
+    ticket_id = ticket.get("id", ticket.get("ticket_id", f"line-{line_number}"))
+    parts = [str(ticket["subject"])] if ticket.get("subject") else []
+    parts += [str(ticket[field]) for field in TEXT_FIELDS if ticket.get(field)][:1]
+    text = html.unescape(_TAG.sub(" ", "\n".join(parts)))
+    text = _QUOTED_REPLY.sub("", text)
+    text = " ".join(text.split())[:MAX_TEXT_CHARS]
+    return {"id": ticket_id, "line": line_number, "user_id": str(ticket.get("user_id") or ""), "text": text}
+
+
+def _init_worker():
+    global _tools, _router
+    from agent_tools import SimplifiedAgentTools
+    from fast_path import FastPathRouter
+
+    logging.getLogger().setLevel(logging.WARNING)
+    _tools = SimplifiedAgentTools()
+    _router = FastPathRouter(_tools.search_knowledge_base,
+                             min_confidence=float(os.getenv("FAST_PATH_MIN_CONFIDENCE", "0.75")))
+
+
+def route(ticket: Dict[str, Any]) -> Dict[str, Any]:
+    """Classify a normalized ticket and attach the best knowledge base articles"""
+    answer = _router.route(ticket["text"])
+    intent = answer or _router.classify(ticket["text"])
+    kb = json.loads(_tools.search_knowledge_base(ticket["text"]))
+    return dict(
+        ticket,
+        category=intent["category"] or kb["category"],
+        confidence=intent["confidence"],
+        kb_found=kb["found"],
+        articles=[article["id"] for article in kb.get("articles", [])],
+        served_by="fast_path" if answer else None,
+        agent_response=answer["agent_response"] if answer else None
+    )
+
+
+def triage_chunk(lines: List[Tuple[int, bytes]]) -> List[Dict[str, Any]]:
+    """Process-pool task: normalize and route a chunk; bad lines become error results"""
+    results = []
+    for line_number, raw in lines:
+        try:
+            ticket = json.loads(raw)
+            if not isinstance(ticket, dict):
+                raise ValueError("ticket is not a JSON object")
+            results.append(route(normalize(ticket, line_number)))
+        except Exception as e:
+            results.append({"id": f"line-{line_number}", "line": line_number, "error": f"{type(e).__name__}: {e}"})
+    return results
+
+
+def read_chunks(src, chunk_size: int, first_line: int) -> Iterator[Tuple[List[Tuple[int, bytes]], int, int]]:
+    """Yield (lines, end offset, next line number), skipping blank lines"""
+    chunk: List[Tuple[int, bytes]] = []
+    line_number = first_line
+    offset = src.tell()
+    for raw in src:
+        offset += len(raw)
+        line_number += 1
+        if raw.strip():
+            chunk.append((line_number, raw))
+        if len(chunk) >= chunk_size:
+            yield chunk, offset, line_number
+            chunk = []
+    if chunk:
+        yield chunk, offset, line_number
+
+
+class Checkpoint:
+    """Progress saved after each written chunk; replaced atomically"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.state = {"input_offset": 0, "output_size": 0, "line": 0, "tickets": 0, "errors": 0}
+
+    def load(self, input_path: str) -> "Checkpoint":
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            if state.get("input") != os.path.abspath(input_path):
+                raise SystemExit(f"Checkpoint {self.path} belongs to {state.get('input')}, not {input_path}")
+            self.state.update(state)
+        return self
+
+    def save(self, input_path: str):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(dict(self.state, input=os.path.abspath(input_path), saved_at=time.time()), f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+
+class LlmStage:
+    """Runs tickets through the support agent with at most `concurrency` in flight"""
+
+    def __init__(self, concurrency: int, timeout: float):
+        import main
+        from escalation import EscalationDispatcher
+        from google.genai import types
+
+        self.dispatcher = EscalationDispatcher()
+        main.use_dispatcher(self.dispatcher)
+        self.runner = main.get_runner()
+        self.session_service = main.get_session_service()
+        self.types = types
+        self.timeout = timeout
+        self.semaphore = asyncio.Semaphore(concurrency)
+
+    async def _run(self, user_id: str, session_id: str, text: str) -> Tuple[str, List[str]]:
+        reply, tools_used = "", []
+        content = self.types.Content(role="user", parts=[self.types.Part(text=text)])
+        async for event in self.runner.run_async(user_id=user_id, session_id=session_id, new_message=content):
+            for part in getattr(getattr(event, "content", None), "parts", None) or []:
+                if getattr(part, "function_call", None) is not None:
+                    tools_used.append(part.function_call.name)
+            if event.is_final_response() and event.content and event.content.parts:
+                reply = " ".join(p.text for p in event.content.parts if getattr(p, "text", None)).strip()
+        return reply, tools_used
+
+    async def answer(self, result: Dict[str, Any]):
+        """Fill in agent_response for one ticket; errors are recorded on the result"""
+        user_id = result["user_id"] or "triage"
+        session_id = f"triage-{uuid.uuid4()}"
+        async with self.semaphore:
+            try:
+                await self.session_service.create_session(
+                    app_name="multi_agent_support", user_id=user_id, session_id=session_id)
+                reply, tools_used = await asyncio.wait_for(
+                    self._run(user_id, session_id, result["text"]), self.timeout)
+                result.update(served_by="llm", agent_response=reply, tools_used=tools_used,
+                              escalated="escalate_to_human" in tools_used)
+            except Exception as e:
+                result["error"] = f"llm: {type(e).__name__}: {e}"
+            finally:
+                self.dispatcher.cancel_session(session_id)
+                try:
+                    await self.session_service.delete_session(
+                        app_name="multi_agent_support", user_id=user_id, session_id=session_id)
+                except Exception:
+                    pass
+
+
+async def run_pipeline(args) -> Dict[str, Any]:
+    checkpoint = Checkpoint(args.checkpoint or f"{args.output}.checkpoint")
+    if args.resume:
+        checkpoint.load(args.input)
+    elif os.path.exists(checkpoint.path):
+        os.remove(checkpoint.path)
+    state = checkpoint.state
+
+    llm = LlmStage(args.llm_concurrency, args.llm_timeout) if args.llm != "none" else None
+    loop = asyncio.get_running_loop()
+    # spawn, not fork: the parent may already be running the ADK runtime thread
+    pool = ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                               mp_context=multiprocessing.get_context("spawn"))
+
+    async def process(lines):
+        results = await loop.run_in_executor(pool, triage_chunk, lines)
+        if llm is not None:
+            pending = [r for r in results if "error" not in r
+                       and (args.llm == "all" or r["served_by"] is None)]
+            await asyncio.gather(*(llm.answer(r) for r in pending))
+        return results
+
+    start = time.perf_counter()
+    start_tickets = state["tickets"]
+    with open(args.input, "rb") as src, open(args.output, "ab+") as out:
+        src.seek(state["input_offset"])
+        out.truncate(state["output_size"])
+        out.seek(state["output_size"])
+        if state["input_offset"]:
+            logger.info(f"Resuming at line {state['line']} ({state['tickets']} tickets already written)")
+
+        window: List[Tuple["asyncio.Future", int, int]] = []
+
+        async def commit(task, end_offset, next_line):
+            results = await task
+            out.write(b"".join(json.dumps(r, ensure_ascii=False).encode("utf-8") + b"\n" for r in results))
+            out.flush()
+            os.fsync(out.fileno())
+            state.update(
+                input_offset=end_offset,
+                output_size=out.tell(),
+                line=next_line,
+                tickets=state["tickets"] + len(results),
+                errors=state["errors"] + sum(1 for r in results if "error" in r)
+            )
+            checkpoint.save(args.input)
+            if args.progress and state["tickets"] // args.progress != (state["tickets"] - len(results)) // args.progress:
+                rate = (state["tickets"] - start_tickets) / max(1e-9, time.perf_counter() - start)
+                logger.info(f"{state['tickets']} tickets ({state['errors']} errors), {rate:.0f}/s")
+
+        try:
+            for lines, end_offset, next_line in read_chunks(src, args.chunk_size, state["line"]):
+                window.append((asyncio.ensure_future(process(lines)), end_offset, next_line))
+                if len(window) >= args.max_inflight:
+                    await commit(*window.pop(0))
+            while window:
+                await commit(*window.pop(0))
+        finally:
+            for task, _, _ in window:
+                task.cancel()
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    elapsed = time.perf_counter() - start
+    return dict(state, elapsed_seconds=round(elapsed, 2),
+                tickets_per_second=round((state["tickets"] - start_tickets) / max(1e-9, elapsed), 1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL file of tickets")
+    parser.add_argument("-o", "--output", required=True, help="JSONL file for results")
+    parser.add_argument("--checkpoint", help="checkpoint path (default: <output>.checkpoint)")
+    parser.add_argument("--resume", action="store_true", help="continue from the checkpoint")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="routing processes")
+    parser.add_argument("--chunk-size", type=int, default=500, help="tickets per process-pool task")
+    parser.add_argument("--max-inflight", type=int, default=0, help="chunks read ahead (default: 2 x workers)")
+    parser.add_argument("--llm", choices=["none", "fallback", "all"], default="none",
+                        help="fallback: only tickets the fast path could not answer")
+    parser.add_argument("--llm-concurrency", type=int, default=8)
+    parser.add_argument("--llm-timeout", type=float, default=60.0)
+    parser.add_argument("--progress", type=int, default=10000, help="log every N tickets (0 = quiet)")
+    args = parser.parse_args()
+    args.max_inflight = args.max_inflight or 2 * args.workers
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    summary = asyncio.run(run_pipeline(args))
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""
+Hashed character n-gram TF-IDF index for free-text knowledge base retrieval.
+
+Vectors are built offline from the knowledge base, L2-normalised and stored as
+a float32 matrix in a .npy file next to a small JSON sidecar. At startup the
+matrix is opened with mmap, so loading costs a few milliseconds regardless of
+size, and a query is scored against every article with one matrix-vector
+product.
+
+Build an index offline:
+    python vector_index.py --kb articles.jsonl --out kb_vectors
+
+Then point the backend at it with KB_VECTOR_INDEX=kb_vectors. Without one,
+the first process to need the index builds it into KB_VECTOR_CACHE_DIR
+(default: a kb_vectors directory under the system temp dir), named after the
+knowledge base version, and every process, including later gunicorn
+workers, maps that file; the pages are shared through the page cache
+instead of each worker holding its own copy of the matrix.
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import re
+import tempfile
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from knowledge_base import KnowledgeBase
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DIM = 2048
+NGRAM_RANGE = (3, 5)
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def char_ngrams(text: str, ngram_range: Tuple[int, int] = NGRAM_RANGE) -> Dict[str, int]:
+    """Count character n-grams of each padded word, so typos and inflections still overlap"""
+    counts: Dict[str, int] = {}
+    lo, hi = ngram_range
+    for word in _WORD_RE.findall(text.lower()):
+        padded = f" {word} "
+        for n in range(lo, hi + 1):
+            for i in range(len(padded) - n + 1):
+                gram = padded[i:i + n]
+                counts[gram] = counts.get(gram, 0) + 1
+    return counts
+
+
+def hash_features(text: str, dim: int, ngram_range: Tuple[int, int] = NGRAM_RANGE) -> Dict[int, float]:
+    """Hash n-gram counts into dim buckets with sublinear term frequency"""
+    features: Dict[int, float] = {}
+    for gram, count in char_ngrams(text, ngram_range).items():
+        bucket = zlib.crc32(gram.encode("utf-8")) % dim
+        features[bucket] = features.get(bucket, 0.0) + 1.0 + math.log(count)
+    return features
+
+
+def article_text(article: Dict[str, Any]) -> str:
+    return " ".join([article["category"], article["title"], " ".join(article["solutions"])])
+
+
+class VectorIndex:
+    """Dense hashed TF-IDF vectors for every knowledge base article, one row per article"""
+
+    def __init__(self, matrix, idf, dim: int, ngram_range: Tuple[int, int], kb_version: str):
+        self.matrix = matrix
+        self.idf = idf
+        self.dim = dim
+        self.ngram_range = ngram_range
+        self.kb_version = kb_version
+
+    @classmethod
+    def build(cls, kb: KnowledgeBase, dim: int = DEFAULT_DIM) -> "VectorIndex":
+        """Vectorise every article in the knowledge base"""
+        if np is None:
+            raise RuntimeError("numpy is required to build a vector index")
+
+        rows = [hash_features(article_text(article), dim) for article in kb.articles]
+        doc_freq = np.zeros(dim, dtype=np.float64)
+        for features in rows:
+            doc_freq[list(features)] += 1
+        idf = np.log((1 + len(rows)) / (1 + doc_freq)).astype(np.float32) + 1.0
+
+        matrix = np.zeros((len(rows), dim), dtype=np.float32)
+        for doc_id, features in enumerate(rows):
+            if features:
+                matrix[doc_id, list(features)] = list(features.values())
+        matrix *= idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix /= norms
+
+        return cls(matrix, idf, dim, NGRAM_RANGE, kb.version)
+
+    def save(self, prefix: str):
+        """Write <prefix>.npy (matrix), <prefix>.idf.npy and <prefix>.json
+
+        Each file is written under a temporary name and renamed into place, the
+        sidecar last, so a process loading the index concurrently never sees a
+        partial file; processes that already mapped an older matrix keep it.
+        """
+        tmp = f".{os.getpid()}.tmp"
+        with open(f"{prefix}.npy{tmp}", "wb") as f:
+            np.save(f, self.matrix)
+        with open(f"{prefix}.idf.npy{tmp}", "wb") as f:
+            np.save(f, self.idf)
+        with open(f"{prefix}.json{tmp}", "w", encoding="utf-8") as f:
+            json.dump({
+                "dim": self.dim,
+                "ngram_range": list(self.ngram_range),
+                "kb_version": self.kb_version,
+                "rows": int(self.matrix.shape[0])
+            }, f)
+        for suffix in (".npy", ".idf.npy", ".json"):
+            os.replace(f"{prefix}{suffix}{tmp}", f"{prefix}{suffix}")
+        logger.info(f"Vector index saved to {prefix}.npy ({self.matrix.shape[0]} rows x {self.dim})")
+
+    @classmethod
+    def load(cls, prefix: str) -> "VectorIndex":
+        """Open a saved index; the matrix is memory-mapped, not read into memory"""
+        if np is None:
+            raise RuntimeError("numpy is required to load a vector index")
+        with open(f"{prefix}.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        matrix = np.load(f"{prefix}.npy", mmap_mode="r")
+        idf = np.load(f"{prefix}.idf.npy")
+        return cls(matrix, idf, meta["dim"], tuple(meta["ngram_range"]), meta["kb_version"])
+
+    @classmethod
+    def for_knowledge_base(cls, kb: KnowledgeBase) -> Optional["VectorIndex"]:
+        """Load KB_VECTOR_INDEX if it matches the knowledge base, else map (building it first if needed) a cached one"""
+        if np is None:
+            logger.info("numpy not installed, free-text vector retrieval disabled")
+            return None
+
+        prefix = os.getenv("KB_VECTOR_INDEX")
+        if prefix and os.path.exists(f"{prefix}.npy"):
+            index = cls.load(prefix)
+            if index.kb_version == kb.version and index.matrix.shape[0] == len(kb):
+                logger.info(f"Vector index loaded from {prefix}.npy (kb version {index.kb_version})")
+                return index
+            logger.warning(
+                f"Vector index {prefix}.npy was built for kb version {index.kb_version}, "
+                f"current is {kb.version}; rebuild it with vector_index.py"
+            )
+            return None
+
+        if len(kb) > 10000:
+            logger.warning(
+                f"Knowledge base has {len(kb)} articles, too many to index at startup, so free-text vector "
+                f"retrieval is off; build an index with vector_index.py and point KB_VECTOR_INDEX at it"
+            )
+            return None
+        return cls.cached(kb, os.getenv("KB_VECTOR_CACHE_DIR", os.path.join(tempfile.gettempdir(), "kb_vectors")))
+
+    @classmethod
+    def cached(cls, kb: KnowledgeBase, directory: str) -> "VectorIndex":
+        """Memory-map the index for this knowledge base version from directory, building it there first if missing"""
+        prefix = os.path.join(directory, f"kb-{kb.version}-{DEFAULT_DIM}")
+        if os.path.exists(f"{prefix}.json"):
+            try:
+                index = cls.load(prefix)
+                if index.kb_version == kb.version and index.matrix.shape[0] == len(kb):
+                    return index
+            except (OSError, ValueError) as e:
+                logger.warning(f"Cached vector index {prefix}.npy is unreadable, rebuilding: {e}")
+        index = cls.build(kb)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            index.save(prefix)
+        except OSError as e:
+            logger.warning(f"Could not cache vector index in {directory}, keeping it in memory: {e}")
+            return index
+        return cls.load(prefix)
+
+    def vectorize(self, text: str):
+        query = np.zeros(self.dim, dtype=np.float32)
+        features = hash_features(text, self.dim, self.ngram_range)
+        if features:
+            query[list(features)] = list(features.values())
+        query *= self.idf
+        norm = np.linalg.norm(query)
+        if norm:
+            query /= norm
+        return query
+
+    def search(self, text: str, top_k: int = 3) -> List[Tuple[int, float]]:
+        """Return (article id, cosine score) pairs for the top_k most similar articles"""
+        query = self.vectorize(text)
+        if not query.any() or top_k <= 0:
+            return []
+
+        scores = self.matrix @ query
+        k = min(top_k, scores.shape[0])
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top if scores[i] > 0]
+
+    @staticmethod
+    def rank_categories(kb: KnowledgeBase, hits: List[Tuple[int, float]], top_k: int = 3) -> List[Dict[str, Any]]:
+        """Score categories by their best-matching article among search hits"""
+        best: Dict[str, float] = {}
+        for doc_id, score in hits:
+            category = kb.articles[doc_id]["category"]
+            if score > best.get(category, 0.0):
+                best[category] = score
+        ranked = sorted(best.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [{"category": category, "score": round(score, 4)} for category, score in ranked]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--kb", help="Knowledge base .json/.jsonl (defaults to KB_PATH or built-in categories)")
+    parser.add_argument("--out", required=True, help="Output prefix for .npy/.json files")
+    parser.add_argument("--dim", type=int, default=DEFAULT_DIM)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    kb = KnowledgeBase.load(args.kb) if args.kb else KnowledgeBase.from_env()
+    VectorIndex.build(kb, dim=args.dim).save(args.out)
+
+
+if __name__ == "__main__":
+    main()
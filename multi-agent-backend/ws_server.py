@@ -0,0 +1,394 @@
+"""
+WebSocket chat transport.
+
+A client opens one connection per chat and authenticates its session once.
+Messages, streamed partial replies, tool progress and escalation updates
+then share that connection, so a turn no longer pays for a new HTTP request,
+a CORS preflight and a session lookup. All connections are served by one
+asyncio event loop (the websockets package): an idle connection costs a few
+kilobytes and no thread. Turns run on a bounded thread pool
+(WS_TURN_WORKERS) because they go through the same blocking answer_message
+as POST /api/chat/message, with its fast path, cache, admission control and
+circuit breaker, and with the same REQUEST_TIMEOUT_SECONDS deadline on their
+model calls.
+
+Protocol, JSON text frames:
+
+    -> {"type": "auth", "session_id": ..., "user_id": ...}
+    <- {"type": "ready", "session_id", "message_count", "escalation_status"}
+    -> {"type": "message", "message": ..., "id": ...}       (id is optional and echoed back)
+    <- {"type": "typing", "id"}                             accepted, the agent is working
+    <- {"type": "delta", "id", "text"}                      partial reply text
+    <- {"type": "tool", "id", "name", "state": "call" | "result"}
+    <- {"type": "reply", "id", "agent_response", "metadata", "message_count", "timestamp"}
+    <- {"type": "error", "id", "error", "retry_after"}       (retry_after only when rejected)
+    <- {"type": "escalation", "ticket": {...}}              whenever the session's ticket changes
+    -> {"type": "ping"}    <- {"type": "pong"}
+
+The auth frame must arrive within WS_AUTH_TIMEOUT seconds and name a session
+created with POST /api/chat/start that belongs to user_id. Otherwise the
+connection is closed with 1008; unlike the HTTP endpoints, the socket never
+creates (recovers) a session it does not know.
+
+Backpressure: each connection answers one message at a time and holds up to
+WS_MAX_PENDING more; further messages get a "busy" error. Outgoing frames
+go through a bounded queue (WS_SEND_QUEUE) that is drained only as fast as
+the socket accepts data. When a client stops reading and the queue fills,
+deltas are dropped (the reply frame carries the whole text); if any other
+frame does not fit, the connection is closed with 1013. Heartbeats are
+protocol pings every WS_PING_INTERVAL seconds, and a client that does not
+answer within WS_PING_TIMEOUT is disconnected.
+
+Session lookups, rate-limit checks and dispatcher reads can block on the
+database with SESSION_BACKEND=sqlite, so they run on the turn pool too and
+the event loop only moves frames.
+
+`python app.py` serves this on WS_PORT (5001) in the same process. Under
+gunicorn, run `python ws_server.py` as its own process with
+SESSION_BACKEND=sqlite so it sees the same sessions as the HTTP workers.
+Escalation tickets then change in other processes too, so instead of
+listening to its own dispatcher the server polls the shared one for changes
+every WS_ESCALATION_POLL seconds and pushes them to connected sessions.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Optional, Set, Tuple
+
+from websockets.asyncio.server import ServerConnection, serve
+from websockets.exceptions import ConnectionClosed
+
+import app as chat
+import metrics
+from admission import AdmissionRejected
+from escalation import Ticket
+from model_transport import reset_deadline, set_deadline
+
+logger = logging.getLogger(__name__)
+# websockets logs every connection open and close at INFO
+logging.getLogger("websockets.server").setLevel(logging.WARNING)
+
+CLOSE_POLICY = 1008
+CLOSE_TRY_AGAIN = 1013
+
+
+def runner_frames(event) -> list:
+    """delta and tool frames (without ids) for one runner event"""
+    content = getattr(event, 'content', None)
+    parts = getattr(content, 'parts', None) or []
+    if getattr(event, 'partial', False):
+        text = ''.join(str(part.text) for part in parts if getattr(part, 'text', None))
+        return [{"type": "delta", "text": text}] if text else []
+    frames = []
+    for part in parts:
+        function_call = getattr(part, 'function_call', None)
+        function_response = getattr(part, 'function_response', None)
+        if function_call is not None:
+            frames.append({"type": "tool", "name": getattr(function_call, 'name', None), "state": "call"})
+        elif function_response is not None:
+            frames.append({"type": "tool", "name": getattr(function_response, 'name', None), "state": "result"})
+    return frames
+
+
+def session_owner(session_id: str) -> Optional[str]:
+    """user_id of an existing session, None if there is no such session; blocking"""
+    session = chat.active_sessions.get(session_id)
+    return session.user_id if session is not None else None
+
+
+def session_snapshot(session_id: str) -> Tuple[int, str]:
+    """message_count and escalation status for the ready frame; blocking"""
+    session = chat.active_sessions.get(session_id)
+    return getattr(session, "message_count", 0), chat.dispatcher.status_for_session(session_id)
+
+
+def answer_turn(session_id: str, user_id: str, message: str, on_event) -> Tuple[str, Dict[str, Any]]:
+    """answer_message under the REQUEST_TIMEOUT deadline an HTTP turn gets; blocking"""
+    token = set_deadline(chat.REQUEST_TIMEOUT)
+    try:
+        return chat.answer_message(session_id, user_id, message, on_event)
+    finally:
+        reset_deadline(token)
+
+
+class ChatConnection:
+    """One authenticated socket: its queue of pending messages and of outgoing frames"""
+
+    def __init__(self, server: "ChatSocketServer", websocket: ServerConnection, session_id: str, user_id: str):
+        self.server = server
+        self.websocket = websocket
+        self.session_id = session_id
+        self.user_id = user_id
+        self.pending: asyncio.Queue = asyncio.Queue(maxsize=server.max_pending)
+        self.outbox: asyncio.Queue = asyncio.Queue(maxsize=server.send_queue)
+        self.closing = False
+
+    def send(self, frame: Dict[str, Any]):
+        """Queue a frame; event loop thread only"""
+        if self.closing:
+            return
+        try:
+            self.outbox.put_nowait(frame)
+        except asyncio.QueueFull:
+            if frame["type"] == "delta":
+                metrics.WS_DROPPED_FRAMES.inc()
+                return
+            self.close(CLOSE_TRY_AGAIN, "client is not reading", "slow_client")
+
+    def send_threadsafe(self, frame: Dict[str, Any]):
+        self.server.loop.call_soon_threadsafe(self.send, frame)
+
+    def close(self, code: int, reason: str, label: str):
+        if not self.closing:
+            self.closing = True
+            metrics.WS_CLOSED.inc(label)
+            asyncio.ensure_future(self.websocket.close(code, reason))
+
+    async def write_frames(self):
+        try:
+            while True:
+                frame = await self.outbox.get()
+                # Waits while the socket's write buffer is over its limit
+                await self.websocket.send(json.dumps(frame))
+                metrics.WS_FRAMES.inc("out", frame["type"])
+        except ConnectionClosed:
+            pass
+
+    async def answer_messages(self):
+        while True:
+            await self.answer(await self.pending.get())
+
+    def receive(self, frame: Dict[str, Any]):
+        frame_type = frame.get("type")
+        metrics.WS_FRAMES.inc("in", str(frame_type))
+        if frame_type == "ping":
+            self.send({"type": "pong"})
+        elif frame_type == "message":
+            try:
+                self.pending.put_nowait(frame)
+            except asyncio.QueueFull:
+                self.send({"type": "error", "id": frame.get("id"), "error": "busy",
+                           "retry_after": 1})
+        else:
+            self.send({"type": "error", "id": frame.get("id"), "error": f"Unknown frame type {frame_type!r}"})
+
+    async def answer(self, frame: Dict[str, Any]):
+        message_id = frame.get("id")
+        message = frame.get("message")
+        if not isinstance(message, str) or not message.strip():
+            self.send({"type": "error", "id": message_id, "error": "message is required"})
+            return
+        try:
+            await self.server.loop.run_in_executor(self.server.pool, chat.rate_limiter.check, self.user_id)
+        except AdmissionRejected as rejected:
+            self.send({"type": "error", "id": message_id, "error": rejected.reason,
+                       "retry_after": rejected.retry_after})
+            return
+
+        self.send({"type": "typing", "id": message_id})
+
+        def on_event(event):
+            for runner_frame in runner_frames(event):
+                self.send_threadsafe(dict(runner_frame, id=message_id))
+
+        try:
+            agent_response_text, turn = await self.server.loop.run_in_executor(
+                self.server.pool, answer_turn, self.session_id, self.user_id, message, on_event
+            )
+        except AdmissionRejected as rejected:
+            self.send({"type": "error", "id": message_id, "error": rejected.reason,
+                       "retry_after": rejected.retry_after})
+            return
+        except Exception as e:
+            metrics.ERRORS.inc("ws_message")
+            logger.error(f"Error answering WebSocket message: {e}")
+            self.send({"type": "error", "id": message_id, "error": "Failed to process message"})
+            return
+
+        self.send({
+            "type": "reply",
+            "id": message_id,
+            "agent_response": agent_response_text,
+            "metadata": turn["metadata"],
+            "message_count": turn["message_count"],
+            "timestamp": datetime.now().isoformat()
+        })
+
+
+class ChatSocketServer:
+    """asyncio WebSocket server for chat sessions"""
+
+    def __init__(self, host: str = "0.0.0.0", port: int = 5001, turn_workers: int = 32, max_pending: int = 4,
+                 send_queue: int = 256, ping_interval: float = 20.0, ping_timeout: float = 20.0,
+                 auth_timeout: float = 10.0, max_message_bytes: int = 65536, compression: bool = False,
+                 backlog: int = 1024, escalation_poll: float = 1.0):
+        self.host = host
+        self.port = port
+        self.turn_workers = turn_workers
+        self.max_pending = max_pending
+        self.send_queue = send_queue
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self.auth_timeout = auth_timeout
+        self.max_message_bytes = max_message_bytes
+        self.compression = compression
+        self.backlog = backlog
+        self.escalation_poll = escalation_poll
+        self.pool = ThreadPoolExecutor(max_workers=turn_workers, thread_name_prefix="ws-turn")
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.sessions: Dict[str, Set[ChatConnection]] = {}
+        self.ready = threading.Event()
+
+    @classmethod
+    def from_env(cls) -> "ChatSocketServer":
+        return cls(
+            host=os.getenv("WS_HOST", "0.0.0.0"),
+            port=int(os.getenv("WS_PORT", "5001")),
+            turn_workers=int(os.getenv("WS_TURN_WORKERS", "32")),
+            max_pending=int(os.getenv("WS_MAX_PENDING", "4")),
+            send_queue=int(os.getenv("WS_SEND_QUEUE", "256")),
+            ping_interval=float(os.getenv("WS_PING_INTERVAL", "20")),
+            ping_timeout=float(os.getenv("WS_PING_TIMEOUT", "20")),
+            auth_timeout=float(os.getenv("WS_AUTH_TIMEOUT", "10")),
+            max_message_bytes=int(os.getenv("WS_MAX_MESSAGE_BYTES", "65536")),
+            # permessage-deflate keeps compressor state per connection; off, an idle socket is much smaller
+            compression=os.getenv("WS_COMPRESSION", "0") == "1",
+            backlog=int(os.getenv("WS_BACKLOG", "1024")),
+            escalation_poll=float(os.getenv("WS_ESCALATION_POLL", "1"))
+        )
+
+    async def authenticate(self, websocket: ServerConnection) -> Optional[ChatConnection]:
+        try:
+            frame = json.loads(await asyncio.wait_for(websocket.recv(), self.auth_timeout))
+        except (asyncio.TimeoutError, ValueError, TypeError):
+            frame = None
+        session_id = frame.get("session_id") if isinstance(frame, dict) and frame.get("type") == "auth" else None
+        user_id = frame.get("user_id") if session_id else None
+        if not (isinstance(session_id, str) and isinstance(user_id, str) and session_id and user_id):
+            metrics.WS_CLOSED.inc("auth")
+            await websocket.close(CLOSE_POLICY, "First frame must be auth with session_id and user_id")
+            return None
+
+        owner = await self.loop.run_in_executor(self.pool, session_owner, session_id)
+        if owner != user_id:
+            metrics.WS_CLOSED.inc("auth")
+            await websocket.close(CLOSE_POLICY, "Unknown session, start one with POST /api/chat/start"
+                                  if owner is None else "Invalid user_id for this session")
+            return None
+        return ChatConnection(self, websocket, session_id, user_id)
+
+    async def handler(self, websocket: ServerConnection):
+        connection = await self.authenticate(websocket)
+        if connection is None:
+            return
+
+        message_count, escalation_status = await self.loop.run_in_executor(
+            self.pool, session_snapshot, connection.session_id
+        )
+        self.sessions.setdefault(connection.session_id, set()).add(connection)
+        metrics.WS_CONNECTIONS.inc()
+        connection.send({
+            "type": "ready",
+            "session_id": connection.session_id,
+            "message_count": message_count,
+            "escalation_status": escalation_status
+        })
+        tasks = [asyncio.ensure_future(connection.write_frames()),
+                 asyncio.ensure_future(connection.answer_messages())]
+        try:
+            async for raw in websocket:
+                try:
+                    frame = json.loads(raw)
+                except ValueError:
+                    frame = None
+                if not isinstance(frame, dict):
+                    connection.send({"type": "error", "id": None, "error": "Frames must be JSON objects"})
+                    continue
+                connection.receive(frame)
+        except ConnectionClosed:
+            pass
+        finally:
+            # A turn already handed to the pool still finishes and is recorded in the session
+            for task in tasks:
+                task.cancel()
+            connections = self.sessions.get(connection.session_id)
+            if connections is not None:
+                connections.discard(connection)
+                if not connections:
+                    del self.sessions[connection.session_id]
+            metrics.WS_CONNECTIONS.dec()
+
+    def ticket_changed(self, ticket: Ticket):
+        """Escalation listener; called from whichever thread changed the ticket"""
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.push_ticket, ticket.session_id, ticket.to_dict())
+
+    def push_ticket(self, session_id: str, ticket: Dict[str, Any]):
+        for connection in list(self.sessions.get(session_id, ())):
+            connection.send({"type": "escalation", "ticket": ticket})
+
+    async def follow_escalations(self):
+        """Push ticket changes made by any process, read from the shared dispatcher"""
+        dispatcher = chat.dispatcher
+        _, change_seq = await self.loop.run_in_executor(self.pool, dispatcher.changes_since, -1)
+        while True:
+            await asyncio.sleep(self.escalation_poll)
+            try:
+                tickets, change_seq = await self.loop.run_in_executor(
+                    self.pool, dispatcher.changes_since, change_seq
+                )
+            except Exception as e:
+                logger.warning(f"Escalation poll failed: {e}")
+                continue
+            for ticket in tickets:
+                self.push_ticket(ticket.session_id, ticket.to_dict())
+
+    async def serve_forever(self):
+        self.loop = asyncio.get_running_loop()
+        if chat.dispatcher.shared:
+            # Changes made here show up in the poll as well, so no listener
+            follower = asyncio.ensure_future(self.follow_escalations())
+        else:
+            follower = None
+            chat.dispatcher.on_change(self.ticket_changed)
+        async with serve(
+            self.handler, self.host, self.port,
+            ping_interval=self.ping_interval,
+            ping_timeout=self.ping_timeout,
+            max_size=self.max_message_bytes,
+            compression="deflate" if self.compression else None,
+            backlog=self.backlog
+        ) as server:
+            logger.info(f"WebSocket chat listening on ws://{self.host}:{self.port}")
+            self.ready.set()
+            try:
+                await server.serve_forever()
+            finally:
+                if follower is not None:
+                    follower.cancel()
+
+    def start_in_thread(self) -> threading.Thread:
+        """Serve from a daemon thread with its own event loop; returns once listening"""
+        thread = threading.Thread(target=asyncio.run, args=(self.serve_forever(),), name="ws-server", daemon=True)
+        thread.start()
+        self.ready.wait(10)
+        return thread
+
+
+def main():
+    server = ChatSocketServer.from_env()
+    chat.warm_up(connect=os.getenv("APP_WARMUP", "1") == "1")
+    print(f"WebSocket chat server: ws://{server.host}:{server.port}")
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()